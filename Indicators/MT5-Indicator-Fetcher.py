@@ -1,31 +1,46 @@
-import requests
-from bs4 import BeautifulSoup
 import os
 import re
-import time
-import random
-from urllib.parse import urljoin, urlparse
-import zipfile
-from pathlib import Path
+import hashlib
+import sys
+from urllib.parse import urljoin
+
+# Make the shared crawl engine importable when this script is run directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mql5_codebase.engine import CategoryAdapter, CrawlEngine
+from mql5_codebase.extract import MetadataExtractor
+
+# Statistics on an indicator page, each field's patterns in order of preference
+METADATA_PATTERNS = {
+    'views': [
+        r'Views:\s*(\d+(?:,\d+)*)',
+        r'(\d+(?:,\d+)*)\s*views'
+    ],
+    'rating': [
+        r'Rating:\s*\((\d+(?:\.\d+)?)\s*out\s*of\s*(\d+)\)',
+        r'(\d+(?:\.\d+)?)\s*out\s*of\s*(\d+)',
+        r'Rating:\s*(\d+(?:\.\d+)?)/(\d+)'
+    ],
+    'published': [
+        r'Published:\s*(\d+\s+\w+\s+\d+(?:,\s*\d+:\d+)?)',
+        r'(\d+\s+\w+\s+\d+,?\s*\d+:\d+)'
+    ],
+    'updated': [
+        r'Updated:\s*(\d+\s+\w+\s+\d+(?:,\s*\d+:\d+)?)',
+        r'Last\s+updated:\s*(\d+\s+\w+\s+\d+(?:,\s*\d+:\d+)?)'
+    ],
+    'downloads': [r'Downloads?:\s*(\d+(?:,\d+)*)'],
+}
+METADATA_EXTRACTOR = MetadataExtractor(METADATA_PATTERNS)
 
 class MQL5Scraper:
-    def __init__(self, base_url="https://www.mql5.com"):
-        self.base_url = base_url
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        })
-        # Rate limiting settings
-        self.min_delay = 2.0  # Minimum delay between requests (seconds)
-        self.max_delay = 5.0  # Maximum delay between requests (seconds)
-        self.page_delay = 8.0  # Extra delay between pages (seconds)
-        self.request_count = 0
-        self.start_time = time.time()
+    def __init__(self, base_url="https://www.mql5.com", engine=None):
+        # Share the engine's session and request budget when crawling alongside other categories
+        self.engine = engine or CrawlEngine(base_url)
+        self.base_url = self.engine.base_url
+        self.session = self.engine.session
+        self.adapter = CategoryAdapter('indicators', '/en/code/mt5/indicators', self.scrape_indicator_detail,
+                                       self.engine.download_assets, label='indicators',
+                                       extract=self.extract_indicator_details)
         
         # Set download directory to the same folder as this script
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -39,137 +54,38 @@ class MQL5Scraper:
         return filename[:100]  # Limit length
     
     def smart_delay(self, is_page_request=False):
-        """Implement intelligent delays with randomization to avoid rate limiting"""
-        self.request_count += 1
-        
-        if is_page_request:
-            delay = self.page_delay + random.uniform(2, 5)  # Extra delay for page requests
-        else:
-            delay = random.uniform(self.min_delay, self.max_delay)
-        
-        # Add progressive delay if making many requests
-        if self.request_count > 50:
-            delay += 2.0
-        elif self.request_count > 100:
-            delay += 4.0
-        
-        # Show rate limiting info
-        elapsed_time = time.time() - self.start_time
-        requests_per_minute = (self.request_count / elapsed_time) * 60
-        
-        print(f"Rate limiting: waiting {delay:.1f}s (Request #{self.request_count}, {requests_per_minute:.1f} req/min)")
-        time.sleep(delay)
+        """Wait on the shared engine so every category draws on one request budget"""
+        return self.engine.smart_delay(is_page_request)
     
     def safe_request(self, url, is_page_request=False):
-        """Make a request with rate limiting and error handling"""
-        try:
-            self.smart_delay(is_page_request)
-            response = self.session.get(url, timeout=30)
-            
-            # Check for rate limiting responses
-            if response.status_code == 429:
-                print("Rate limited! Waiting 60 seconds before retrying...")
-                time.sleep(60)
-                response = self.session.get(url, timeout=30)
-            
-            return response
-        except requests.exceptions.RequestException as e:
-            print(f"Request error: {e}")
-            return None
+        """Make a request through the shared engine with rate limiting and error handling"""
+        return self.engine.safe_request(url, is_page_request)
     
     def get_indicator_links(self, page=1):
         """Get all indicator links from a specific page"""
-        url = f"{self.base_url}/en/code/mt5/indicators"
-        if page > 1:
-            url += f"/page{page}"
-            
-        print(f"Fetching page {page}...")
-        response = self.safe_request(url, is_page_request=True)
-        
-        if not response or response.status_code != 200:
-            print(f"Failed to get page {page}: status {response.status_code if response else 'No response'}")
-            return []
-            
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Find all indicator links
-        indicator_links = []
-        links = soup.find_all('a', href=re.compile(r'/en/code/\d+$'))
-        
-        for link in links:
-            href = link.get('href')
-            title = link.get_text(strip=True)
-            if href and title:
-                full_url = urljoin(self.base_url, href)
-                indicator_links.append({
-                    'url': full_url,
-                    'title': title,
-                    'id': href.split('/')[-1]
-                })
-        
-        return indicator_links
+        return self.engine.get_links(self.adapter, page)
     
-    def scrape_indicator_page(self, indicator_url, indicator_title, indicator_id):
-        """Scrape individual indicator page for zip file and description"""
-        print(f"Scraping indicator: {indicator_title}")
-        
-        response = self.safe_request(indicator_url)
-        if not response or response.status_code != 200:
-            print(f"Failed to get indicator page: {response.status_code if response else 'No response'}")
-            return False
-            
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Create folder for this indicator in the script directory
-        folder_name = self.clean_filename(indicator_title)
-        folder_path = os.path.join(self.script_dir, folder_name)
-        os.makedirs(folder_path, exist_ok=True)
-        
-        # Find download link
-        download_link = None
-        zip_links = soup.find_all('a', href=re.compile(r'/en/code/download/\d+\.zip'))
-        if zip_links:
-            download_link = urljoin(self.base_url, zip_links[0].get('href'))
-        
-        # Download zip file if found
-        if download_link:
-            try:
-                print(f"Downloading zip file...")
-                zip_response = self.safe_request(download_link)
-                if zip_response and zip_response.status_code == 200:
-                    zip_filename = os.path.join(folder_path, f"{folder_name}.zip")
-                    with open(zip_filename, 'wb') as f:
-                        f.write(zip_response.content)
-                    print(f"Downloaded: {zip_filename}")
-                else:
-                    print(f"Failed to download zip: {zip_response.status_code if zip_response else 'No response'}")
-            except Exception as e:
-                print(f"Error downloading zip: {e}")
-        
-        # Extract description - look for main content area
-        description_text = ""
-        
+    def extract_description_candidates(self, page):
+        """Collect possible descriptions from a parsed indicator page, best first"""
         # Try to find the main description in various ways
         description_candidates = []
         
         # Look for specific elements that might contain the description
-        main_content = soup.find('div', class_='content')
-        if main_content:
+        paragraphs = page.texts_in('div', 'content', 'p')
+        if paragraphs:
             # Get all paragraph text from main content
-            paragraphs = main_content.find_all('p')
-            for p in paragraphs:
-                text = p.get_text(strip=True)
+            for text in paragraphs:
                 if text and len(text) > 30:  # Only a good amount of text
                     description_candidates.append(text)
         
         # Try to get description from meta description
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        if meta_desc and meta_desc.get('content'):
-            description_candidates.insert(0, meta_desc.get('content'))
+        meta_desc = page.meta('description')
+        if meta_desc:
+            description_candidates.insert(0, meta_desc)
         
         # Look for any div with substantial text that's not navigation/header
         if not description_candidates:
-            all_divs = soup.find_all('div')
+            all_divs = page.soup.find_all('div')
             for div in all_divs:
                 # Skip common navigation/header classes
                 div_class = div.get('class', [])
@@ -180,6 +96,57 @@ class MQL5Scraper:
                 if text and len(text) > 50 and len(text) < 2000:  # Reasonable description length
                     description_candidates.append(text)
         
+        return description_candidates
+    
+    def extract_indicator_details(self, page):
+        """Everything the detail stage needs from a parsed indicator page, as plain values (runs in a worker process when offloaded)"""
+        # Find download link
+        download_link = None
+        zip_links = page.links(re.compile(r'/en/code/download/\d+\.zip'))
+        if zip_links:
+            download_link = urljoin(self.base_url, zip_links[0][0])
+        
+        # Author from the profile link, statistics in one scan of the page text
+        author_links = page.links(re.compile(r'/en/users/[^/]+$'))
+        author_name = (author_links[0][1] or author_links[0][0].split('/')[-1]) if author_links else None
+        try:
+            rating_info = METADATA_EXTRACTOR.extract(page.text()).as_dict()
+        except Exception as e:
+            print(f"Error extracting rating info: {e}")
+            rating_info = {}
+        
+        return {
+            'zip_url': download_link,
+            'description_candidates': self.extract_description_candidates(page),
+            'author': author_name,
+            'rating_info': rating_info,
+        }
+    
+    def scrape_indicator_page(self, indicator_url, indicator_title, indicator_id):
+        """Scrape individual indicator page for zip file and description"""
+        return self.adapter.scrape_page(indicator_url, indicator_title, indicator_id)
+    
+    def scrape_indicator_detail(self, indicator_url, indicator_title, indicator_id):
+        """Scrape an indicator page, save its description and return the item for the download stage"""
+        print(f"Scraping indicator: {indicator_title}")
+        
+        response = self.safe_request(indicator_url)
+        if not response or response.status_code != 200:
+            print(f"Failed to get indicator page: {response.status_code if response else 'No response'}")
+            return None
+            
+        # Parse and extract (in the engine's worker processes when extraction is offloaded)
+        details = self.engine.extract(self.adapter, response.content)
+        download_link = details['zip_url']
+        description_candidates = details['description_candidates']
+        author_name, rating_info = details['author'], details['rating_info']
+        
+        # Create a working folder for this indicator; it is renamed into the script directory once complete
+        folder_name = self.clean_filename(indicator_title)
+        folder_path, final_path = self.engine.prepare_folder(os.path.join(self.script_dir, folder_name), indicator_id)
+        
+        description_text = ""
+        
         # Use the best description candidate
         if description_candidates:
             description_text = description_candidates[0]
@@ -196,56 +163,43 @@ class MQL5Scraper:
                 f.write(f"Indicator: {indicator_title}\n")
                 f.write(f"URL: {indicator_url}\n")
                 f.write(f"ID: {indicator_id}\n")
+                if author_name:
+                    f.write(f"Author: {author_name}\n")
+                if 'views' in rating_info:
+                    f.write(f"Views: {rating_info['views']:,}\n")
+                if 'rating' in rating_info and 'max_rating' in rating_info:
+                    f.write(f"Rating: {rating_info['rating']}/{rating_info['max_rating']}\n")
+                if 'published' in rating_info:
+                    f.write(f"Published: {rating_info['published']}\n")
+                if 'updated' in rating_info:
+                    f.write(f"Updated: {rating_info['updated']}\n")
+                if 'downloads' in rating_info:
+                    f.write(f"Downloads: {rating_info['downloads']:,}\n")
                 f.write("-" * 50 + "\n\n")
                 f.write(description_text)
             print(f"Saved description: {description_filename}")
         except Exception as e:
             print(f"Error saving description: {e}")
         
-        return True
+        # The zip file is fetched by the download stage
+        return {
+            'url': indicator_url,
+            'title': indicator_title,
+            'id': indicator_id,
+            'folder_name': folder_name,
+            'folder_path': folder_path,
+            'final_path': final_path,
+            'metadata_path': description_filename,
+            'page_sha256': hashlib.sha256(response.content).hexdigest(),
+            'zip_url': download_link,
+            'sources': [],
+            'metadata': dict(rating_info, author=author_name, description=description_text)
+        }
     
-    def scrape_all_indicators(self, max_pages=5, start_page=1):
+    def scrape_all_indicators(self, max_pages=5, start_page=1, concurrency=None, since_last_run=False, overlap_pages=1):
         """Scrape all indicators from multiple pages"""
-        print(f"Starting to scrape MQL5 indicators (pages {start_page}-{max_pages})...")
-        
-        total_indicators = 0
-        
-        for page in range(start_page, max_pages + 1):
-            try:
-                indicator_links = self.get_indicator_links(page)
-                
-                if not indicator_links:
-                    print(f"No indicators found on page {page}, stopping...")
-                    break
-                
-                print(f"Found {len(indicator_links)} indicators on page {page}")
-                total_indicators += len(indicator_links)
-                
-                for i, indicator in enumerate(indicator_links, 1):
-                    print(f"[Page {page}, Item {i}/{len(indicator_links)}] Processing: {indicator['title']}")
-                    
-                    success = self.scrape_indicator_page(
-                        indicator['url'],
-                        indicator['title'],
-                        indicator['id']
-                    )
-                    
-                    if success:
-                        print(f"Successfully processed: {indicator['title']}")
-                    else:
-                        print(f"Failed to process: {indicator['title']}")
-                
-                print(f"Completed page {page}. Taking a longer break before next page...")
-                time.sleep(random.uniform(10, 15))  # Longer delay between pages
-                
-            except KeyboardInterrupt:
-                print("\nScraping interrupted by user")
-                break
-            except Exception as e:
-                print(f"Error on page {page}: {e}")
-                continue
-        
-        print(f"\nScraping completed! Processed {total_indicators} indicators.")
+        self.engine.crawl([self.adapter], max_pages=max_pages, start_page=start_page, concurrency=concurrency,
+                          since_last_run=since_last_run, overlap_pages=overlap_pages)
 
 def main():
     scraper = MQL5Scraper()
@@ -265,13 +219,16 @@ def main():
     # Configuration - Conservative settings to avoid rate limiting
     max_pages = 5  # Change this to scrape more pages (start small!)
     start_page = 1  # Change this to start from a different page
+    concurrency = 4  # Items whose detail page and downloads are in flight at once
+    since_last_run = False  # Daily refresh: stop at the first listing page with nothing new (raise max_pages too)
     
     print("RATE LIMITING ENABLED")
     print("This scraper includes multiple rate limiting measures:")
-    print("- Random delays between 2-5 seconds per request")
-    print("- Extended delays of 8-13 seconds between pages")
-    print("- Progressive delays for high request counts")
-    print("- Automatic retry on HTTP 429 (rate limit) responses")
+    print("- Adaptive request rate shared by all workers (speeds up while the server is healthy)")
+    print("- Listing, detail and download stages overlap instead of pausing between pages")
+    print("- Listing pages cost three times as much as other requests")
+    print("- Backs off on HTTP 429/503 responses, honours Retry-After and retries")
+    print("- Learned request rate is saved and reused on the next run")
     print("- Realistic browser headers to avoid detection")
     print()
     
@@ -279,7 +236,8 @@ def main():
     print("Press Ctrl+C to stop at any time")
     print()
     
-    scraper.scrape_all_indicators(max_pages=max_pages, start_page=start_page)
+    scraper.scrape_all_indicators(max_pages=max_pages, start_page=start_page, concurrency=concurrency,
+                                  since_last_run=since_last_run)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,171 @@
+"""End-to-end crawl throughput against the local mock site: items per minute, tail latency, behaviour under throttling
+
+Starts benchmarks/mock_server.py in-process (or uses --base-url), crawls it with the real engine and
+fetchers into a temporary directory, and reports items finished per minute, client-side latency
+percentiles per request kind, the status codes seen and the faults the server injected.
+
+Usage:
+    python benchmarks/bench_crawl.py                                      # clean, fast server
+    python benchmarks/bench_crawl.py --latency 80 --jitter 40             # a realistic round trip with a tail
+    python benchmarks/bench_crawl.py --throttle-rate 0.05 --retry-after 2 # how the limiter backs off
+    python benchmarks/bench_crawl.py --truncate-rate 0.02                 # bodies cut off mid-transfer
+    python benchmarks/bench_crawl.py --concurrency 8 --save run.json
+    python benchmarks/bench_crawl.py --http2 --transport http/2           # HTTPS, one multiplexed connection
+    python benchmarks/bench_crawl.py --max-asset-size 0.01 --download-budget 1   # bandwidth budget mode
+
+The rate limiter's ceiling defaults to 50 req/s here so the crawl stack, not the politeness limit, is
+what gets measured; pass --max-rate 1 to see a production-like crawl.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mql5_codebase import CATEGORIES, CrawlEngine, load_scraper
+from mql5_codebase.bandwidth import megabytes
+from mql5_codebase.engine import request_kind
+from mock_server import add_arguments, server_from_args
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class RequestLog:
+    """Session response hook: latency (time to response headers) and status of every request, by kind"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, response, *args, **kwargs):
+        kind = request_kind(response.url)
+        with self._lock:
+            self.latencies[kind].append(response.elapsed.total_seconds())
+            self.statuses[f"{kind} {response.status_code}"] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('categories', nargs='*', default=list(CATEGORIES))
+    parser.add_argument('--base-url', help='Crawl an already running server instead of starting one')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--max-rate', type=float, default=50.0, help='Rate limiter ceiling in requests per second')
+    parser.add_argument('--parser', default='auto')
+    parser.add_argument('--extract-workers', type=int, default=0,
+                        help='Parse and extract detail pages in worker processes (0: on the crawl threads)')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--transport', choices=('http/1.1', 'http/2'), default='http/1.1',
+                        help="The crawl's HTTP transport (http/2 needs httpx[http2] and a server offering it: --http2)")
+    parser.add_argument('--max-asset-size', type=float, default=None, metavar='MB',
+                        help='Skip ZIPs and source files larger than this')
+    parser.add_argument('--download-budget', type=float, default=None, metavar='MB',
+                        help='Stop downloading once the crawl has received this much')
+    parser.add_argument('--save', metavar='FILE', help='Write the results as JSON')
+    parser.add_argument('--verbose', action='store_true', help="Show the crawl's own output")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server = server_from_args(args)
+        base_url = server.start()
+
+    work_dir = tempfile.mkdtemp(prefix='mql5-crawl-bench-')
+    try:
+        engine = CrawlEngine(base_url, concurrency=args.concurrency, state_dir=os.path.join(work_dir, 'state'),
+                             max_rate=args.max_rate, cache=not args.no_cache, parser=args.parser,
+                             extract_workers=args.extract_workers, http2=args.transport == 'http/2',
+                             max_asset_bytes=megabytes(args.max_asset_size),
+                             max_download_bytes=megabytes(args.download_budget))
+        if server and server.certfile:
+            # Trust the mock's self-signed certificate even where REQUESTS_CA_BUNDLE is set
+            engine.session.verify = server.certfile
+            engine.session.trust_env = False
+        # Start at the ceiling rather than creeping up to it from the conservative default
+        engine.limiter.rate = args.max_rate
+        log = RequestLog()
+        engine.session.hooks['response'].append(log)
+
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+        with output:
+            scrapers = [load_scraper(name, engine) for name in args.categories]
+            for scraper in scrapers:
+                scraper.script_dir = os.path.join(work_dir, 'output', scraper.adapter.name)
+            start = time.perf_counter()
+            engine.crawl([scraper.adapter for scraper in scrapers], max_pages=args.pages)
+            elapsed = time.perf_counter() - start
+
+        states = engine.manifest.counts()
+        done = states.get('done', 0)
+        listed = sum(states.values())
+        results = {
+            'base_url': base_url,
+            'concurrency': args.concurrency,
+            'transport': args.transport,
+            'extract_workers': args.extract_workers,
+            'max_rate': args.max_rate,
+            'elapsed': elapsed,
+            'items_listed': listed,
+            'items_done': done,
+            'items_per_minute': done / elapsed * 60,
+            'requests': engine.request_count,
+            'requests_per_second': engine.request_count / elapsed,
+            'throttled': engine.limiter.throttled,
+            'final_rate': engine.limiter.rate,
+            'metrics': engine.metrics.snapshot(),
+            'statuses': dict(sorted(log.statuses.items())),
+            'latency_ms': {},
+            'server': dict(sorted(server.stats.items())) if server else None,
+        }
+        for kind, values in sorted(log.latencies.items()):
+            values.sort()
+            results['latency_ms'][kind] = {
+                'count': len(values), 'p50': percentile(values, 0.5) * 1000, 'p95': percentile(values, 0.95) * 1000,
+                'p99': percentile(values, 0.99) * 1000, 'max': values[-1] * 1000,
+            }
+    finally:
+        if server:
+            server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"Crawled {base_url} over {args.transport}: {len(args.categories)} categories, "
+          f"{args.concurrency} workers per stage, rate ceiling {args.max_rate:g} req/s")
+    print(f"Items finished: {done} of {listed} listed in {elapsed:.1f}s = {results['items_per_minute']:.0f} items/min")
+    print(f"Requests: {engine.request_count} ({results['requests_per_second']:.1f}/s), "
+          f"{engine.limiter.throttled} throttled, limiter ended at {engine.limiter.rate:.2f} req/s")
+    print()
+    print(f"{'kind':<8} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}   (ms to response headers)")
+    for kind, stats in results['latency_ms'].items():
+        print(f"{kind:<8} {stats['count']:>6} {stats['p50']:>9.1f} {stats['p95']:>9.1f} {stats['p99']:>9.1f} "
+              f"{stats['max']:>9.1f}")
+    print()
+    print(engine.metrics.summary())
+    print(engine.metrics.bandwidth_report())
+    print()
+    print("Statuses: " + ', '.join(f"{key}: {count}" for key, count in results['statuses'].items()))
+    if server:
+        injected = {key: count for key, count in results['server'].items() if key.startswith('injected')}
+        print("Injected: " + (', '.join(f"{key[9:]}: {count}" for key, count in injected.items()) or 'nothing'))
+        print(f"Connections accepted: {results['server'].get('connections', 0)}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""HTTP/1.1 keep-alive pool vs one multiplexed HTTP/2 connection: connections opened, handshake time, throughput
+
+Starts benchmarks/mock_server.py over TLS offering both protocols, as www.mql5.com does, and fetches the
+same mix of detail pages, ZIPs and source files through the engine's session with each transport at
+several concurrency levels. The requests bypass the rate limiter, so the transport is what gets measured.
+Connections and TLS handshake time are counted by the server, so both transports are measured the same way.
+
+Usage:
+    python benchmarks/bench_http2.py                                # 50 ms round trip, 1/4/8/16 requests in flight
+    python benchmarks/bench_http2.py --latency 150 --jitter 50      # a far-away server with a long tail
+    python benchmarks/bench_http2.py --concurrency 8 --items 200 --save http2.json
+
+Needs httpx with HTTP/2 support: pip install 'httpx[http2]'
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mql5_codebase import CATEGORIES, CrawlEngine
+from mql5_codebase.engine import request_kind, wire_bytes
+from mql5_codebase.http2 import http2_available
+from mock_server import Faults, MockCodebase, MockServer
+from bench_crawl import percentile
+
+TRANSPORTS = ('http/1.1', 'http/2')
+
+
+def item_urls(server, items):
+    """Detail page, ZIP and source files of the first `items` items, in the order a crawl requests them"""
+    codebase = server.codebase
+    urls = []
+    ids = [item_id for page in range(1, codebase.pages + 1) for category in CATEGORIES
+           for item_id in codebase.item_ids(category, page)]
+    for item_id in ids[:items]:
+        urls.append(f"{server.base_url}/en/code/{item_id}")
+        urls.append(f"{server.base_url}/en/code/download/{item_id}.zip")
+        urls.extend(f"{server.base_url}/en/code/download/{item_id}/{name}" for name, _ in codebase.sources(item_id))
+    return urls
+
+
+def run(server, transport, concurrency, urls, state_dir):
+    """Fetch every URL with `concurrency` requests in flight; returns the client's and the server's view"""
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        engine = CrawlEngine(server.base_url, concurrency=concurrency, state_dir=state_dir, cache=False,
+                             catalog=False, search_index=False, http2=transport == 'http/2')
+    # Trust the mock's self-signed certificate even where REQUESTS_CA_BUNDLE is set
+    engine.session.verify = server.certfile
+    engine.session.trust_env = False
+
+    def fetch(url):
+        response = engine.session.get(url, timeout=30)
+        content = response.content
+        return request_kind(url), response.status_code, response.elapsed.total_seconds(), \
+            wire_bytes(response, len(content)), getattr(response, 'http_version', 'HTTP/1.1')
+
+    server.stats.clear()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, urls))
+    elapsed = time.perf_counter() - start
+    engine.session.close()
+
+    latencies = sorted(latency for _, _, latency, _, _ in results)
+    body_bytes = sum(size for _, _, _, size, _ in results)
+    stats = server.stats
+    return {
+        'transport': transport,
+        'negotiated': sorted({version for *_, version in results}),
+        'concurrency': concurrency,
+        'requests': len(results),
+        'errors': sum(1 for _, status, *_ in results if status != 200),
+        'elapsed': elapsed,
+        'requests_per_second': len(results) / elapsed,
+        'mb_per_second': body_bytes / elapsed / 1024 / 1024,
+        'ttfb_p50_ms': percentile(latencies, 0.5) * 1000,
+        'ttfb_p95_ms': percentile(latencies, 0.95) * 1000,
+        'connections': stats['connections'],
+        'handshake_ms': stats['tls handshake seconds'] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', default='1,4,8,16', help='Requests in flight, comma-separated levels')
+    parser.add_argument('--items', type=int, default=60, help='Items fetched per run (detail page, ZIP, sources)')
+    parser.add_argument('--latency', type=float, default=50.0, help='Milliseconds the server adds to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Mean extra milliseconds, exponentially distributed')
+    parser.add_argument('--save', metavar='FILE', help='Write the results as JSON')
+    args = parser.parse_args()
+
+    if not http2_available():
+        parser.error("needs httpx with HTTP/2 support: pip install 'httpx[http2]'")
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    pages = args.items // (len(CATEGORIES) * 20) + 1
+    server = MockServer(MockCodebase(pages=pages, items_per_page=20),
+                        Faults(latency=args.latency / 1000, jitter=args.jitter / 1000), http2=True)
+    server.start()
+    state_dir = tempfile.mkdtemp(prefix='mql5-http2-bench-')
+    results = []
+    try:
+        urls = item_urls(server, args.items)
+        for concurrency in levels:
+            for transport in TRANSPORTS:
+                results.append(run(server, transport, concurrency, urls, state_dir))
+    finally:
+        server.stop()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    print(f"{len(urls)} requests for {args.items} items over TLS, {args.latency:g} ms server latency")
+    print()
+    print(f"{'transport':<9} {'in flight':>9} {'conns':>6} {'handshakes ms':>13} {'req/s':>8} {'MB/s':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for result in results:
+        print(f"{result['transport']:<9} {result['concurrency']:>9} {result['connections']:>6} "
+              f"{result['handshake_ms']:>13.1f} {result['requests_per_second']:>8.1f} {result['mb_per_second']:>7.2f} "
+              f"{result['ttfb_p50_ms']:>8.1f} {result['ttfb_p95_ms']:>8.1f} {result['errors']:>7}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'latency_ms': args.latency, 'jitter_ms': args.jitter, 'items': args.items,
+                       'requests': len(urls), 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""Listing pages: full parse versus the anchor-only fast path, per parser backend
+
+Both paths must return the same item links; the fast path skips building a tree for everything
+that is not an item anchor.
+
+Usage:
+    python benchmarks/bench_listing.py [page.html | directory ...] [--repeat N]
+
+Without paths, the pages in the crawl's HTTP cache (.crawl_state/http_cache/bodies) are used, or
+the offline suite's fixtures (benchmarks/fixtures) before the first crawl; only
+pages that link to codebase items are timed.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mql5_codebase.engine import ITEM_LINK_PATTERN
+from mql5_codebase.parsing import HTMLDocument, available_backends, parse_links
+from bench_parsers import DEFAULT_PAGES, load_pages
+
+
+def timed(function, pages, repeat):
+    """Milliseconds per page"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for content in pages:
+            function(content)
+    return (time.perf_counter() - start) / (repeat * len(pages)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*', default=[DEFAULT_PAGES])
+    parser.add_argument('--repeat', type=int, default=5, help='Timed passes over the corpus per backend')
+    args = parser.parse_args()
+
+    pages = [content for _, content in load_pages(args.paths)
+             if HTMLDocument(content, 'html.parser').links(ITEM_LINK_PATTERN)]
+    if not pages:
+        sys.exit(f"No listing pages found in {', '.join(args.paths)}; run a crawl first or pass saved pages")
+
+    print(f"{len(pages)} listing pages")
+    print()
+    print(f"{'backend':<12} {'full tree':>10} {'anchors only':>13} {'speedup':>8}")
+    mismatches = 0
+    for backend in available_backends():
+        def full(content):
+            return HTMLDocument(content, backend).links(ITEM_LINK_PATTERN)
+
+        def fast(content):
+            return parse_links(content, ITEM_LINK_PATTERN, backend)
+
+        mismatches += sum(full(content) != fast(content) for content in pages)
+        old, new = timed(full, pages, args.repeat), timed(fast, pages, args.repeat)
+        print(f"{backend:<12} {old:>7.2f} ms {new:>10.2f} ms {old / new:>7.1f}x")
+
+    print()
+    print("Both paths return the same links" if not mismatches else f"{mismatches} pages differ")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""Per-page cost of pulling statistics out of an item page, before and after the single-pass extractor
+
+Before: soup.get_text() on an html.parser tree (twice on expert advisor pages), then one re.search over
+the whole text per pattern, as the library fetcher used to do. After: the page text computed once by
+the parser backend and the library fetcher's MetadataExtractor.
+
+Usage:
+    python benchmarks/bench_metadata.py [page.html | directory ...] [--repeat N]
+
+Without paths, the pages in the crawl's HTTP cache (.crawl_state/http_cache/bodies) are used, or
+the offline suite's fixtures (benchmarks/fixtures) before the first crawl.
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import contextlib
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mql5_codebase.categories import load_fetcher_module
+from mql5_codebase.parsing import HTMLDocument, resolve_backend
+from bench_parsers import DEFAULT_PAGES, load_pages
+
+
+def legacy_rating_info(page_text):
+    """The cascade of re.search calls the library fetcher ran before MetadataExtractor"""
+    rating_info = {}
+    for pattern in [r'Views?:\s*(\d+(?:,\d+)*)', r'(\d+(?:,\d+)*)\s*views?', r'Viewed\s*(\d+(?:,\d+)*)\s*times?']:
+        match = re.search(pattern, page_text, re.IGNORECASE)
+        if match:
+            rating_info['views'] = int(match.group(1).replace(',', ''))
+            break
+    for pattern in [r'Rating:\s*\((\d+(?:\.\d+)?)\s*out\s*of\s*(\d+)\)', r'(\d+(?:\.\d+)?)\s*out\s*of\s*(\d+)',
+                    r'Rating:\s*(\d+(?:\.\d+)?)/(\d+)', r'★+\s*(\d+(?:\.\d+)?)/(\d+)', r'(\d+(?:\.\d+)?)\s*stars?',
+                    r'Score:\s*(\d+(?:\.\d+)?)', r'Rate:\s*(\d+(?:\.\d+)?)']:
+        match = re.search(pattern, page_text, re.IGNORECASE)
+        if match:
+            rating_info['rating'] = float(match.group(1))
+            if len(match.groups()) > 1:
+                rating_info['max_rating'] = int(match.group(2))
+            break
+    for pattern in [r'Published:\s*(\d{1,2}[\s\/\.-]\w+[\s\/\.-]\d{4})', r'Created:\s*(\d{1,2}[\s\/\.-]\w+[\s\/\.-]\d{4})',
+                    r'Date:\s*(\d{1,2}[\s\/\.-]\w+[\s\/\.-]\d{4})', r'(\d{1,2}\s+\w+\s+\d{4})',
+                    r'(\w+\s+\d{1,2},?\s+\d{4})', r'(\d{4}[\/\-]\d{1,2}[\/\-]\d{1,2})']:
+        match = re.search(pattern, page_text, re.IGNORECASE)
+        if match:
+            rating_info['published'] = match.group(1)
+            break
+    for pattern in [r'Downloads?:\s*(\d+(?:,\d+)*)', r'Downloaded\s*(\d+(?:,\d+)*)\s*times?',
+                    r'(\d+(?:,\d+)*)\s*downloads?']:
+        match = re.search(pattern, page_text, re.IGNORECASE)
+        if match:
+            rating_info['downloads'] = int(match.group(1).replace(',', ''))
+            break
+    for field, pattern in [('favorites', r'Favorites?:\s*(\d+)'), ('comments', r'Comments?:\s*(\d+)')]:
+        match = re.search(pattern, page_text, re.IGNORECASE)
+        if match:
+            rating_info[field] = int(match.group(1))
+    match = re.search(r'Version:\s*([\d\.]+)', page_text, re.IGNORECASE)
+    if match:
+        rating_info['version'] = match.group(1)
+    match = re.search(r'Size:\s*([\d\.]+\s*[KMG]?B)', page_text, re.IGNORECASE)
+    if match:
+        rating_info['file_size'] = match.group(1)
+    return rating_info
+
+
+def timed(function, pages, repeat):
+    """Milliseconds per page"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            function(page)
+    return (time.perf_counter() - start) / (repeat * len(pages)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*', default=[DEFAULT_PAGES])
+    parser.add_argument('--repeat', type=int, default=5, help='Timed passes over the corpus')
+    args = parser.parse_args()
+
+    pages = [content for _, content in load_pages(args.paths)]
+    if not pages:
+        sys.exit(f"No HTML pages found in {', '.join(args.paths)}; run a crawl first or pass saved pages")
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        extractor = load_fetcher_module('libraries').METADATA_EXTRACTOR
+    backend = resolve_backend('auto')
+    texts = [BeautifulSoup(content, 'html.parser').get_text() for content in pages]
+
+    # The extractor only restricts unlabelled fallbacks to the metadata block, so results can differ there
+    differing = sum(legacy_rating_info(text) != extractor.extract(text).as_dict() for text in texts)
+
+    def before(content):
+        soup = BeautifulSoup(content, 'html.parser')
+        soup.get_text()  # extract_author_info
+        return legacy_rating_info(soup.get_text())
+
+    def after(content):
+        return extractor.extract(HTMLDocument(content, backend).text()).as_dict()
+
+    print(f"{len(pages)} pages, average page text {sum(map(len, texts)) // len(texts):,} characters")
+    print()
+    print(f"{'':<36} {'before':>10} {'after':>10} {'speedup':>8}")
+    rows = [
+        ('patterns only', timed(legacy_rating_info, texts, args.repeat),
+         timed(lambda text: extractor.extract(text), texts, args.repeat)),
+        (f"parse + text + patterns ({backend})", timed(before, pages, args.repeat), timed(after, pages, args.repeat)),
+    ]
+    for name, old, new in rows:
+        print(f"{name:<36} {old:>7.3f} ms {new:>7.3f} ms {old / new:>7.1f}x")
+    print()
+    print(f"{len(pages) - differing} of {len(pages)} pages give the same statistics as before")
+
+
+if __name__ == '__main__':
+    main()
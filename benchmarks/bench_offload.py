@@ -0,0 +1,73 @@
+"""Detail-page extraction on the crawl's threads versus in worker processes
+
+Several threads (the detail workers) each parse and extract saved detail pages, either directly
+(all of them sharing one GIL) or through the engine's ExtractionPool, and the pages per second are
+compared. The records must come out identical either way.
+
+Usage:
+    python benchmarks/bench_offload.py [--threads 8] [--workers N] [--batch 8] [--pages 400] [--parser html.parser]
+
+The pages are the offline suite's detail fixtures, repeated until --pages are reached.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mql5_codebase import CrawlEngine, load_scraper
+from mql5_codebase.offload import ExtractionPool
+from mql5_codebase.parsing import resolve_backend
+from suite import load_corpus
+
+
+def run(engine, adapters, pages, threads):
+    """Extract every page from `threads` threads at once; returns (records, seconds)"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        records = list(executor.map(lambda page: engine.extract(adapters[page[0]], page[1]), pages))
+    return records, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8, help='Detail workers extracting at once')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per core)')
+    parser.add_argument('--batch', type=int, default=8, help='Pages per batch sent to a worker process')
+    parser.add_argument('--pages', type=int, default=400, help='Pages to extract per run')
+    parser.add_argument('--parser', default='html.parser', help='Parser backend (default html.parser, the slowest)')
+    args = parser.parse_args()
+
+    details = [(category, content) for category, kind, _, content in load_corpus() if kind == 'detail']
+    pages = [details[i % len(details)] for i in range(args.pages)]
+
+    engine = CrawlEngine(state_dir=tempfile.mkdtemp(prefix='mql5-bench-'), cache=False, blob_store=False,
+                         parser=resolve_backend(args.parser))
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        adapters = {category: load_scraper(category, engine).adapter for category, _ in details}
+
+        inline, inline_time = run(engine, adapters, pages, args.threads)
+
+        engine.extract_pool = ExtractionPool(engine.base_url, engine.parser, args.workers, args.batch)
+        try:
+            run(engine, adapters, pages[:args.threads], args.threads)  # Start the worker processes
+            pooled, pooled_time = run(engine, adapters, pages, args.threads)
+            pool = engine.extract_pool
+        finally:
+            engine.extract_pool.shutdown()
+            engine.extract_pool = None
+
+    print(f"{args.pages} detail pages, {args.threads} threads, {engine.parser} parser")
+    print(f"{'on threads':<32} {args.pages / inline_time:>8.0f} pages/s")
+    print(f"{f'{pool.workers} processes, batches of {pool.batch_size}':<32} {args.pages / pooled_time:>8.0f} pages/s"
+          f"   {inline_time / pooled_time:.1f}x")
+    same = inline == pooled
+    print("Records are identical" if same else "RECORDS DIFFER")
+    return 0 if same else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Compare the HTML parser backends on saved MQL5 pages: same results, and how long each takes
+
+Usage:
+    python benchmarks/bench_parsers.py [page.html | directory ...] [--repeat N]
+
+Without paths, the pages in the crawl's HTTP cache (.crawl_state/http_cache/bodies) are used, or
+the offline suite's fixtures (benchmarks/fixtures) before the first crawl.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mql5_codebase import CATEGORIES, CrawlEngine, load_scraper
+from mql5_codebase.engine import DEFAULT_STATE_DIR, ITEM_LINK_PATTERN
+from mql5_codebase.parsing import HTMLDocument, available_backends
+
+# The crawl's cached pages when there are any, otherwise the fixture corpus of the offline suite
+CACHED_PAGES = os.path.join(DEFAULT_STATE_DIR, 'http_cache', 'bodies')
+DEFAULT_PAGES = CACHED_PAGES if os.path.isdir(CACHED_PAGES) else os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load_pages(paths):
+    """Read every HTML file under the given files and directories"""
+    pages = []
+    for path in paths:
+        files = [path] if os.path.isfile(path) else [os.path.join(root, name)
+                                                     for root, _, names in os.walk(path) for name in sorted(names)]
+        for file_path in files:
+            with open(file_path, 'rb') as f:
+                content = f.read()
+            if b'<html' in content[:4096].lower():
+                pages.append((file_path, content))
+    return pages
+
+
+def make_extractors():
+    """What the crawl pulls out of a page: listing links plus every category's detail extraction"""
+    engine = CrawlEngine(state_dir=tempfile.mkdtemp(), cache=False, blob_store=False)
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        scrapers = {name: load_scraper(name, engine) for name in CATEGORIES}
+
+    return {
+        'listing links': lambda page: page.links(ITEM_LINK_PATTERN),
+        'experts': lambda page: (scrapers['experts'].extract_author_info(page),
+                                 scrapers['experts'].extract_description_and_rating(page)),
+        'indicators': lambda page: scrapers['indicators'].extract_description_candidates(page),
+        'scripts': lambda page: scrapers['scripts'].extract_description_and_rating(page),
+        'libraries': lambda page: scrapers['libraries'].extract_description_and_rating(page),
+    }
+
+
+def run(pages, backend, extractors, extract=True):
+    """Parse every page (and extract from it); returns the results per page"""
+    results = []
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        for _, content in pages:
+            page = HTMLDocument(content, backend)
+            if extract:
+                results.append({name: extractor(page) for name, extractor in extractors.items()})
+            else:
+                results.append(page.links(ITEM_LINK_PATTERN))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*', default=[DEFAULT_PAGES])
+    parser.add_argument('--repeat', type=int, default=5, help='Timed passes over the corpus per backend')
+    args = parser.parse_args()
+
+    pages = load_pages(args.paths)
+    if not pages:
+        sys.exit(f"No HTML pages found in {', '.join(args.paths)}; run a crawl first or pass saved pages")
+
+    backends = available_backends()
+    extractors = make_extractors()
+    print(f"{len(pages)} pages, backends: {', '.join(backends)}")
+
+    # Identical results first: a faster backend is only useful if it extracts exactly the same data
+    baseline = run(pages, 'html.parser', extractors)
+    mismatches = 0
+    for backend in backends:
+        for (path, _), expected, got in zip(pages, baseline, run(pages, backend, extractors)):
+            for name in extractors:
+                if got[name] != expected[name]:
+                    mismatches += 1
+                    print(f"MISMATCH {backend} {name}: {path}")
+
+    print()
+    print(f"{'backend':<12} {'links only':>14} {'full extraction':>16} {'speedup':>8}")
+    reference = None
+    for backend in reversed(backends):
+        timings = []
+        for extract in (False, True):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                run(pages, backend, extractors, extract)
+            timings.append((time.perf_counter() - start) / (args.repeat * len(pages)) * 1000)
+        reference = reference or timings[1]
+        print(f"{backend:<12} {timings[0]:>11.2f} ms {timings[1]:>13.2f} ms {reference / timings[1]:>7.1f}x")
+
+    print()
+    print("All backends extract identical results" if not mismatches else f"{mismatches} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,619 @@
+"""Local stand-in for the MQL5 codebase: listings, item pages, ZIPs and source files, with injected faults
+
+Serves the URLs the crawl requests:
+    /en/code/mt5/<category>[/pageN]     listing pages, newest first
+    /en/code/<id>                       item pages
+    /en/code/download/<id>.zip          the item's ZIP archive
+    /en/code/download/<id>/<file>       single source files
+
+Content is generated (deterministic per item ID) or, with --recorded, taken from saved pages such as the
+offline suite's fixtures, with their item IDs and download links rewritten to the mock's. Latency,
+429/503 responses with or without Retry-After, and bodies cut off mid-transfer can be injected at random
+to see how the whole crawl stack copes. Pages and ZIPs carry ETags and answer If-None-Match with 304.
+
+With --tls the mock speaks HTTPS with a throwaway self-signed certificate; with --http2 it also offers
+HTTP/2 in the TLS handshake, as www.mql5.com does, and serves the clients that take it one multiplexed
+connection each. It counts the connections it accepted and the time their TLS handshakes took. Pages
+and source files are sent gzip- or brotli-compressed to clients that ask for it.
+
+Usage:
+    python benchmarks/mock_server.py --port 8765 --latency 80 --throttle-rate 0.02 --truncate-rate 0.01
+    python -m mql5_codebase --base-url http://127.0.0.1:8765 --max-rate 50
+    python benchmarks/mock_server.py --port 8443 --http2     # https://127.0.0.1:8443, HTTP/2 and HTTP/1.1
+
+benchmarks/bench_crawl.py starts one in-process and measures the crawl against it.
+"""
+import io
+import gzip
+import os
+import re
+import sys
+import time
+import random
+import ssl
+import heapq
+import shutil
+import select
+import hashlib
+import importlib.util
+import zipfile
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mql5_codebase import CATEGORIES
+
+LISTING_PATH = re.compile(r'^/en/code/mt5/([a-z]+)(?:/page(\d+))?$')
+ITEM_PATH = re.compile(r'^/en/code/(\d+)$')
+ZIP_PATH = re.compile(r'^/en/code/download/(\d+)\.zip$')
+SOURCE_PATH = re.compile(r'^/en/code/download/(\d+)/([^/]+)$')
+
+# Item IDs of a category start here, so the category can be told from the ID alone
+ID_BASE = 100000
+
+# Files every generated ZIP carries: the same include shipped by many items, as on the real site
+SHARED_INCLUDE = ('Include/Trade/TradeHelpers.mqh', b'// Shared helpers, identical in every archive\n' * 40)
+
+WORDS = ('moving average crossover adaptive period volatility filter trend signal arrow buffer symbol timeframe '
+         'parameter alert breakout channel grid scalper panel order position risk lot stop').split()
+
+
+@dataclass
+class Faults:
+    """What to inject; rates are probabilities per request"""
+    latency: float = 0.0  # Seconds added to every response
+    jitter: float = 0.0  # Mean of an exponential extra delay on top of latency: a long tail, like a real server
+    throttle_rate: float = 0.0  # Answer 429 Too Many Requests
+    unavailable_rate: float = 0.0  # Answer 503 Service Unavailable
+    retry_after: int = 1  # Retry-After seconds sent with 429/503 (None: send no header)
+    truncate_rate: float = 0.0  # Send the full Content-Length, then close the connection halfway through the body
+
+
+# How listing pages link to other pages: every page, the two either side of the current one, or none
+PAGINATORS = ('full', 'window', 'none')
+
+
+class MockCodebase:
+    """The site's content: which items each listing page holds and what every URL returns"""
+
+    def __init__(self, pages=3, items_per_page=20, recorded_dir=None, paginator='full'):
+        self.pages = pages
+        self.items_per_page = items_per_page
+        self.paginator = paginator
+        self.categories = list(CATEGORIES)
+        self.recorded = self._load_recorded(recorded_dir) if recorded_dir else None
+
+    def _load_recorded(self, recorded_dir):
+        """category -> {'listing': [html], 'detail': [html]} from <dir>/<category>/{listing,detail}_*.html"""
+        recorded = {}
+        for category in self.categories:
+            pages = {'listing': [], 'detail': []}
+            category_dir = os.path.join(recorded_dir, category)
+            if os.path.isdir(category_dir):
+                for name in sorted(os.listdir(category_dir)):
+                    kind = name.split('_', 1)[0]
+                    if name.endswith('.html') and kind in pages:
+                        with open(os.path.join(category_dir, name), encoding='utf-8', errors='replace') as f:
+                            pages[kind].append(f.read())
+            if not pages['listing'] or not pages['detail']:
+                raise ValueError(f"{category_dir} needs at least one listing_*.html and one detail_*.html page")
+            recorded[category] = pages
+        return recorded
+
+    def item_ids(self, category, page):
+        if category not in self.categories or not 1 <= page <= self.pages:
+            return []
+        first = ID_BASE * (self.categories.index(category) + 1) + (page - 1) * self.items_per_page
+        return list(range(first, first + self.items_per_page))
+
+    def category_of(self, item_id):
+        index = item_id // ID_BASE - 1
+        return self.categories[index] if 0 <= index < len(self.categories) else None
+
+    def listing(self, category, page):
+        ids = self.item_ids(category, page)
+        if self.recorded:
+            return self._recorded_listing(category, page, ids)
+        tiles = ''.join(f'<div class="code-tile"><a href="/en/code/{i}"><img src="/i/{i}.png" alt=""></a>'
+                        f'<div class="code-tile__title"><a href="/en/code/{i}">{self._title(i)}</a></div>'
+                        f'<a href="/en/users/author{i % 17}">Author {i % 17}</a></div>\n' for i in ids)
+        pages = ''.join(f'<a href="/en/code/mt5/{category}/page{n}">{n}</a>' for n in self.linked_pages(page))
+        return (f'<html><head><title>MetaTrader 5 {category}</title></head><body><main>\n'
+                f'{tiles}<div class="paginator">{pages}</div></main></body></html>').encode()
+
+    def linked_pages(self, page):
+        """Page numbers the paginator of a listing page links to"""
+        if self.paginator == 'none':
+            return []
+        if self.paginator == 'window':
+            return range(max(1, page - 2), min(self.pages, page + 2) + 1)
+        return range(1, self.pages + 1)
+
+    def _recorded_listing(self, category, page, ids):
+        """A recorded listing page whose item links point at this page's mock IDs, in order
+
+        Items beyond --items-per-page lose their link; a page with fewer items simply lists fewer.
+        """
+        html = self.recorded[category]['listing'][(page - 1) % len(self.recorded[category]['listing'])]
+        mapping = {}
+
+        def replace(match):
+            original = match.group(1)
+            if original not in mapping:
+                if len(mapping) == len(ids):
+                    return '#"'
+                mapping[original] = ids[len(mapping)]
+            return f'/en/code/{mapping[original]}"'
+
+        html = re.sub(r'/en/code/(\d+)"', replace, html)
+        return html.encode()
+
+    def detail(self, item_id):
+        category = self.category_of(item_id)
+        if self.recorded:
+            pages = self.recorded[category]['detail']
+            html = pages[item_id % len(pages)]
+            return re.sub(r'/en/code/download/\d+', f'/en/code/download/{item_id}', html).encode()
+
+        rng = random.Random(item_id)
+        paragraphs = ''.join(f"<p>{self._sentence(rng, rng.randint(8, 40))}</p>\n" for _ in range(rng.randint(3, 8)))
+        files = ''.join(f'<tr><td><a href="/en/code/download/{item_id}/{name}">{name}</a></td>'
+                        f'<td>{len(body) / 1024:.1f} KB</td></tr>' for name, body in self.sources(item_id))
+        return f"""<html><head><title>{self._title(item_id)}</title>
+<meta name="description" content="{self._sentence(rng, 12)}"></head><body><main>
+<h1>{self._title(item_id)}</h1>
+<div class="code-info"><div><span>Author:</span> <a href="/en/users/author{item_id % 17}">Author {item_id % 17}</a></div>
+<div>Views: {rng.randint(100, 99999):,}</div><div>Rating: ({rng.choice(['3.5', '4', '4.5', '5'])} out of 5)</div>
+<div>Published: {rng.randint(1, 28)} March 2021, 12:05</div><div>Downloads: {rng.randint(10, 9999):,}</div></div>
+<div>Need a robot or indicator based on this code? Order it on Freelance <a href="/en/job">Go to Freelance</a></div>
+<div class="content">
+{paragraphs}</div>
+<table>{files}</table>
+<a href="/en/code/download/{item_id}.zip">Download ZIP</a>
+<a href="/en/forum/{item_id}">Go to Discussion</a>
+</main></body></html>""".encode()
+
+    @lru_cache(maxsize=4096)
+    def sources(self, item_id):
+        """(file name, bytes) of the item's listed source files; the last one is sometimes missing from the ZIP"""
+        if self.recorded:
+            html = self.detail(item_id).decode()
+            names = dict.fromkeys(re.findall(rf'/en/code/download/{item_id}/([^"/]+)"', html))
+        else:
+            rng = random.Random(-item_id)
+            stem = f"{self._title(item_id).replace(' ', '')}"
+            names = [f"{stem}.mq5"] + [f"{stem}{n}.mqh" for n in range(rng.randint(0, 2))]
+            if item_id % 5 == 0:
+                names.append('readme.txt')
+        files = []
+        for name in names:
+            rng = random.Random(f"{item_id}/{name}")
+            text = f"// {name} of item {item_id}\n" + ''.join(
+                f"input int Period{n} = {rng.randint(2, 200)};  // {self._sentence(rng, 6)}\n"
+                for n in range(rng.randint(20, 400)))
+            # Some sources come as UTF-16, as MetaEditor saves them
+            body = text.encode('utf-16') if name.endswith('.mq5') and item_id % 2 == 0 else text.encode()
+            files.append((name, body))
+        return tuple(files)
+
+    @lru_cache(maxsize=4096)
+    def zip(self, item_id):
+        sources = self.sources(item_id)
+        if item_id % 5 == 0 and len(sources) > 1:
+            sources = sources[:-1]
+        buf = io.BytesIO()
+        # Fixed timestamps: the same item always gets a byte-identical archive (and ETag)
+        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, body in sources + (SHARED_INCLUDE,):
+                archive.writestr(zipfile.ZipInfo(name, (2021, 3, 1, 12, 0, 0)), body)
+        return buf.getvalue()
+
+    def source(self, item_id, name):
+        for source_name, body in self.sources(item_id):
+            if source_name == name:
+                return body
+        return None
+
+    def _title(self, item_id):
+        rng = random.Random(item_id * 7)
+        return f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {item_id % 1000}"
+
+    def _sentence(self, rng, words):
+        return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def content_coding(accept_encoding):
+    """The coding the mock answers a request's Accept-Encoding with: br (if brotli is installed), gzip or None"""
+    offered = {token.split(';')[0].strip().lower() for token in accept_encoding.split(',')}
+    if 'br' in offered and importlib.util.find_spec('brotli') is not None:
+        return 'br'
+    return 'gzip' if 'gzip' in offered else None
+
+
+@lru_cache(maxsize=1024)
+def encode(body, coding):
+    """A body compressed with a content coding, as the site's front end would send it"""
+    if coding == 'br':
+        import brotli
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def self_signed_cert(directory, host='127.0.0.1'):
+    """(certificate file, key file) of a new self-signed certificate for host, made with the openssl tool"""
+    certfile, keyfile = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1',
+                    '-nodes', '-days', '7', '-subj', f'/CN={host}', '-addext', f'subjectAltName=IP:{host},DNS:localhost',
+                    '-keyout', keyfile, '-out', certfile], check=True, capture_output=True)
+    return certfile, keyfile
+
+
+class H2Connection:
+    """One HTTP/2 connection, served on its own thread
+
+    Streams wait out their injected delay on a timer rather than a thread of their own, so many
+    requests are in flight on the connection at once, as on a real HTTP/2 server.
+    """
+
+    def __init__(self, server, sock):
+        import h2.config
+        import h2.connection
+
+        self.server = server
+        self.sock = sock
+        self.conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+        self.due = []  # (due time, sequence, stream ID, request headers) of requests waiting out their delay
+        self.sending = {}  # stream ID -> (body left to send, whether the stream is reset at the end instead)
+
+    def serve(self):
+        import h2.events
+        import h2.exceptions
+
+        self.conn.initiate_connection()
+        self.flush()
+        sequence = 0
+        while True:
+            timeout = max(0.0, self.due[0][0] - time.monotonic()) if self.due else None
+            if self.sock.pending() or select.select([self.sock], [], [], timeout)[0]:
+                try:
+                    data = self.sock.recv(65536)
+                except OSError:
+                    return
+                if not data:
+                    return
+                try:
+                    events = self.conn.receive_data(data)
+                except h2.exceptions.ProtocolError:
+                    self.flush()
+                    return
+                for event in events:
+                    if isinstance(event, h2.events.RequestReceived):
+                        sequence += 1
+                        heapq.heappush(self.due, (time.monotonic() + self.server.delay(), sequence,
+                                                  event.stream_id, event.headers))
+                    elif isinstance(event, h2.events.StreamReset):
+                        self.sending.pop(event.stream_id, None)
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        self.flush()
+                        return
+            while self.due and self.due[0][0] <= time.monotonic():
+                _, _, stream_id, headers = heapq.heappop(self.due)
+                self.respond(stream_id, headers)
+            self.send_pending()
+            self.flush()
+
+    def respond(self, stream_id, request_headers):
+        import h2.exceptions
+
+        pseudo = {name: value for name, value in request_headers if name.startswith(':')}
+        headers = http.client.HTTPMessage()
+        for name, value in request_headers:
+            if not name.startswith(':'):
+                headers[name] = value
+        status, response_headers, body, truncate = self.server.reply(pseudo[':method'], pseudo[':path'], headers)
+        try:
+            self.conn.send_headers(stream_id, [(':status', str(status))] +
+                                   [(name.lower(), value) for name, value in response_headers], end_stream=not body)
+        except h2.exceptions.ProtocolError:
+            return  # The client reset the stream while its request waited
+        if body:
+            self.sending[stream_id] = (body[:len(body) // 2] if truncate else body, truncate)
+
+    def send_pending(self):
+        """Send as much of every response body as the flow-control windows allow"""
+        from h2.errors import ErrorCodes
+
+        for stream_id, (body, truncate) in list(self.sending.items()):
+            while body:
+                size = min(len(body), self.conn.local_flow_control_window(stream_id), self.conn.max_outbound_frame_size)
+                if size <= 0:
+                    break
+                self.conn.send_data(stream_id, body[:size])
+                body = body[size:]
+            if body:
+                self.sending[stream_id] = (body, truncate)
+                continue
+            del self.sending[stream_id]
+            if truncate:
+                # The client was promised the whole body; the stream is reset halfway
+                self.conn.reset_stream(stream_id, ErrorCodes.INTERNAL_ERROR)
+            else:
+                self.conn.end_stream(stream_id)
+
+    def flush(self):
+        data = self.conn.data_to_send()
+        if data:
+            self.sock.sendall(data)
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    """Counts connections; with TLS, times each handshake and serves those that chose HTTP/2 as H2Connections"""
+
+    daemon_threads = True
+
+    def __init__(self, address, handler, mock, ssl_context=None):
+        self.mock = mock
+        self.ssl_context = ssl_context
+        super().__init__(address, handler)
+
+    def get_request(self):
+        sock, address = super().get_request()
+        if self.ssl_context:
+            # The handshake happens on the connection's own thread (finish_request), not the accept loop
+            sock = self.ssl_context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False)
+        return sock, address
+
+    def finish_request(self, request, client_address):
+        self.mock.count('connections')
+        if self.ssl_context:
+            start = time.perf_counter()
+            try:
+                request.do_handshake()
+            except OSError:
+                self.mock.count('tls handshakes failed')
+                return
+            self.mock.count('tls handshake seconds', time.perf_counter() - start)
+            if request.selected_alpn_protocol() == 'h2':
+                self.mock.count('http2 connections')
+                H2Connection(self.mock, request).serve()
+                return
+        super().finish_request(request, client_address)
+
+
+class MockServer:
+    """A threaded HTTP server for a MockCodebase; counts what it served and what it injected
+
+    tls=True serves HTTPS with a self-signed certificate (certfile is the file clients should trust),
+    or pass (certfile, keyfile). http2=True also offers HTTP/2 over TLS (needs the h2 package).
+    Pages and source files are gzip- or brotli-compressed for clients that accept it, unless compress=False.
+    """
+
+    def __init__(self, codebase=None, faults=None, host='127.0.0.1', port=0, seed=0, tls=False, http2=False,
+                 compress=True):
+        self.codebase = codebase or MockCodebase()
+        self.faults = faults or Faults()
+        self.compress = compress  # Honour Accept-Encoding for pages and source files (ZIPs are sent as they are)
+        self.stats = Counter()  # '<kind> <status>', 'injected <fault>', 'bytes', 'connections', TLS timings
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cert_dir = None
+        self.certfile = None
+        ssl_context = None
+        if tls or http2:
+            if not isinstance(tls, tuple):
+                self._cert_dir = tempfile.mkdtemp(prefix='mql5-mock-tls-')
+                tls = self_signed_cert(self._cert_dir, host)
+            self.certfile = tls[0]
+            ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            ssl_context.load_cert_chain(*tls)
+            ssl_context.set_alpn_protocols(['h2', 'http/1.1'] if http2 else ['http/1.1'])
+        self._httpd = _HTTPServer((host, port), self._handler_class(), self, ssl_context)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"{'https' if self.certfile else 'http'}://{host}:{port}"
+
+    def start(self):
+        """Serve on a background thread; returns the base URL"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._cert_dir:
+            shutil.rmtree(self._cert_dir, ignore_errors=True)
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def roll(self):
+        """A uniform random number from the server's seeded generator"""
+        with self._lock:
+            return self._rng.random()
+
+    def delay(self):
+        faults = self.faults
+        extra = 0.0
+        if faults.jitter:
+            with self._lock:
+                extra = self._rng.expovariate(1 / faults.jitter)
+        return faults.latency + extra
+
+    def route(self, path):
+        """(kind, body, content type) for a path; body None for 404"""
+        codebase = self.codebase
+        match = LISTING_PATH.match(path)
+        if match:
+            category, page = match.group(1), int(match.group(2) or 1)
+            if category not in codebase.categories:
+                return 'listing', None, None
+            return 'listing', codebase.listing(category, page), 'text/html; charset=utf-8'
+        match = ITEM_PATH.match(path)
+        if match:
+            item_id = int(match.group(1))
+            if codebase.category_of(item_id) is None:
+                return 'detail', None, None
+            return 'detail', codebase.detail(item_id), 'text/html; charset=utf-8'
+        match = ZIP_PATH.match(path)
+        if match and codebase.category_of(int(match.group(1))):
+            return 'zip', codebase.zip(int(match.group(1))), 'application/zip'
+        match = SOURCE_PATH.match(path)
+        if match and codebase.category_of(int(match.group(1))):
+            return 'source', codebase.source(int(match.group(1)), match.group(2)), 'application/octet-stream'
+        return 'other', None, None
+
+    def reply(self, method, path, headers):
+        """(status, headers, body, truncate) for a request, after the injected delay
+
+        headers is anything with .get(); truncate means the body should be cut off halfway.
+        """
+        kind, body, content_type = self.route(path.split('?')[0].rstrip('/'))
+        faults = self.faults
+
+        roll = self.roll()
+        if roll < faults.throttle_rate:
+            return self._throttled(kind, 429)
+        if roll < faults.throttle_rate + faults.unavailable_rate:
+            return self._throttled(kind, 503)
+
+        if body is None:
+            self.count(f"{kind} 404")
+            return 404, [('Content-Length', '0')], b'', False
+
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if headers.get('If-None-Match') == etag:
+            self.count(f"{kind} 304")
+            return 304, [('ETag', etag)], b'', False
+
+        coding = content_coding(headers.get('Accept-Encoding') or '') if self.compress and kind != 'zip' else None
+        if coding:
+            self.count('uncompressed bytes', len(body))
+            body = encode(body, coding)
+        response_headers = [('Content-Type', content_type), ('Content-Length', str(len(body))), ('ETag', etag)]
+        if coding:
+            response_headers.append(('Content-Encoding', coding))
+        if method == 'HEAD':
+            self.count(f"{kind} HEAD")
+            return 200, response_headers, b'', False
+        self.count(f"{kind} 200")
+        if self.roll() < faults.truncate_rate:
+            # The client was promised the whole body; the connection (or HTTP/2 stream) drops halfway
+            self.count('injected truncated')
+            return 200, response_headers, body, True
+        self.count('bytes', len(body))
+        return 200, response_headers, body, False
+
+    def _throttled(self, kind, status):
+        self.count(f"{kind} {status}")
+        self.count(f"injected {status}")
+        headers = [('Content-Length', '0')]
+        if self.faults.retry_after is not None:
+            headers.append(('Retry-After', str(self.faults.retry_after)))
+        return status, headers, b'', False
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real site
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self.respond()
+
+            def do_HEAD(self):
+                self.respond()
+
+            def respond(self):
+                time.sleep(server.delay())
+                status, headers, body, truncate = server.reply(self.command, self.path, self.headers)
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                if truncate:
+                    self.wfile.write(body[:len(body) // 2])
+                    self.wfile.flush()
+                    self.close_connection = True
+                elif body:
+                    self.wfile.write(body)
+
+        return Handler
+
+
+def add_arguments(parser):
+    """Content and fault options, shared with benchmarks/bench_crawl.py"""
+    group = parser.add_argument_group('mock site')
+    group.add_argument('--pages', type=int, default=3, help='Listing pages per category')
+    group.add_argument('--items-per-page', type=int, default=20)
+    group.add_argument('--paginator', choices=PAGINATORS, default='full',
+                       help='Listing pages link to every page, to the pages either side of them, or to none')
+    group.add_argument('--recorded', metavar='DIR',
+                       help='Serve saved pages from DIR/<category>/ (e.g. benchmarks/fixtures) instead of generated ones')
+    group.add_argument('--latency', type=float, default=0.0, help='Milliseconds added to every response')
+    group.add_argument('--jitter', type=float, default=0.0, help='Mean extra milliseconds, exponentially distributed')
+    group.add_argument('--throttle-rate', type=float, default=0.0, help='Share of requests answered 429')
+    group.add_argument('--unavailable-rate', type=float, default=0.0, help='Share of requests answered 503')
+    group.add_argument('--retry-after', type=int, default=1,
+                       help='Retry-After seconds on 429/503; negative sends no header')
+    group.add_argument('--truncate-rate', type=float, default=0.0,
+                       help='Share of responses whose body is cut off halfway')
+    group.add_argument('--seed', type=int, default=0, help='Seed for which requests get a fault')
+    group.add_argument('--tls', action='store_true', help='Serve HTTPS with a throwaway self-signed certificate')
+    group.add_argument('--http2', action='store_true', help='Serve HTTPS and offer HTTP/2 (needs pip install h2)')
+    group.add_argument('--no-compression', action='store_true',
+                       help='Ignore Accept-Encoding and send every body uncompressed')
+
+
+def server_from_args(args, host='127.0.0.1', port=0):
+    codebase = MockCodebase(pages=args.pages, items_per_page=args.items_per_page, recorded_dir=args.recorded,
+                            paginator=args.paginator)
+    faults = Faults(latency=args.latency / 1000, jitter=args.jitter / 1000, throttle_rate=args.throttle_rate,
+                    unavailable_rate=args.unavailable_rate,
+                    retry_after=args.retry_after if args.retry_after >= 0 else None,
+                    truncate_rate=args.truncate_rate)
+    return MockServer(codebase, faults, host=host, port=port, seed=args.seed, tls=args.tls, http2=args.http2,
+                      compress=not args.no_compression)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, host=args.host, port=args.port)
+    print(f"Mock MQL5 codebase on {server.base_url} ({args.pages} pages x {args.items_per_page} items per category)")
+    print(f"Crawl it with: python -m mql5_codebase --base-url {server.base_url}")
+    if server.certfile:
+        print(f"Trust its certificate with: REQUESTS_CA_BUNDLE={server.certfile}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print()
+        for key, count in sorted(server.stats.items()):
+            print(f"{key}: {count}")
+
+
+if __name__ == '__main__':
+    main()
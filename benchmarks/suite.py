@@ -0,0 +1,290 @@
+"""Offline benchmark suite: every category's listing and detail extraction over saved pages, checked against golden files
+
+The corpus is benchmarks/fixtures/<category>/: listing_*.html pages go through the engine's listing parser
+(what get_*_links does after the request), detail_*.html pages through the category's extraction:
+extract_author_info and extract_description_and_rating for expert advisors, extract_description_and_rating
+for scripts and libraries, and extract_description_candidates for indicators. What each page yields is
+compared with benchmarks/golden/<category>/<page>.json, so a faster parser or regex that changes the
+extracted data fails the run. Nothing is fetched from mql5.com unless --record is given.
+
+Usage:
+    python benchmarks/suite.py [--parser NAME | --all-parsers] [--repeat N]
+    python benchmarks/suite.py --save before.json             # keep the timings of this run
+    python benchmarks/suite.py --compare before.json          # ... and compare a later run with them
+    python benchmarks/suite.py --update-golden                # after an intended change in extraction
+    python benchmarks/suite.py --record scripts https://www.mql5.com/en/code/12345
+
+Exit status is 1 when any extraction differs from its golden file or a stage got slower than
+--threshold compared with --compare.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mql5_codebase import CATEGORIES, CrawlEngine, load_scraper
+from mql5_codebase.engine import ITEM_LINK_PATTERN
+from mql5_codebase.parsing import HTMLDocument, available_backends, resolve_backend
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures')
+GOLDEN_DIR = os.path.join(BENCH_DIR, 'golden')
+
+
+def detail_stages(scrapers):
+    """Per category, the extraction steps run on a detail page: stage name -> function(page)"""
+    return {
+        'experts': {
+            'extract_author_info': scrapers['experts'].extract_author_info,
+            'extract_description_and_rating': scrapers['experts'].extract_description_and_rating,
+        },
+        'indicators': {
+            'extract_description_candidates': scrapers['indicators'].extract_description_candidates,
+        },
+        'scripts': {
+            'extract_description_and_rating': scrapers['scripts'].extract_description_and_rating,
+        },
+        'libraries': {
+            'extract_description_and_rating': scrapers['libraries'].extract_description_and_rating,
+        },
+    }
+
+
+def load_corpus(fixtures_dir=FIXTURES_DIR):
+    """[(category, kind, name, content)] for every saved page; kind is 'listing' or 'detail'"""
+    corpus = []
+    for category in CATEGORIES:
+        category_dir = os.path.join(fixtures_dir, category)
+        if not os.path.isdir(category_dir):
+            continue
+        for file_name in sorted(os.listdir(category_dir)):
+            kind = file_name.split('_', 1)[0]
+            if not file_name.endswith('.html') or kind not in ('listing', 'detail'):
+                continue
+            with open(os.path.join(category_dir, file_name), 'rb') as f:
+                corpus.append((category, kind, file_name[:-len('.html')], f.read()))
+    return corpus
+
+
+def as_json(value):
+    """Extraction results with tuples turned into lists, as they read back from a golden file"""
+    return json.loads(json.dumps(value))
+
+
+class Suite:
+    """Run the corpus through one engine and its four scrapers"""
+
+    def __init__(self):
+        self.engine = CrawlEngine(state_dir=tempfile.mkdtemp(prefix='mql5-bench-'), cache=False, blob_store=False)
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            self.scrapers = {name: load_scraper(name, self.engine) for name in CATEGORIES}
+        self.stages = detail_stages(self.scrapers)
+
+    def run_page(self, category, kind, content, backend):
+        """stage name -> result for one page"""
+        self.engine.parser = backend
+        if kind == 'listing':
+            return {'parse_listing': self.engine.parse_listing(self.scrapers[category].adapter, content)}
+        page = HTMLDocument(content, backend)
+        return {stage: function(page) for stage, function in self.stages[category].items()}
+
+    def check(self, corpus, backend):
+        """Golden-file mismatches as (category, page, stage) for one backend"""
+        mismatches = []
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            for category, kind, name, content in corpus:
+                golden = read_golden(category, name)
+                got = as_json(self.run_page(category, kind, content, backend))
+                if golden is None:
+                    mismatches.append((category, name, 'no golden file'))
+                    continue
+                for stage in sorted(set(golden) | set(got)):
+                    if golden.get(stage) != got.get(stage):
+                        mismatches.append((category, name, stage))
+        return mismatches
+
+    def time_stages(self, corpus, backend, repeat):
+        """'<category>/<stage>' -> best-of-repeat milliseconds per page, parsing included
+
+        Detail stages are timed on a freshly parsed page each pass, the way the crawl sees them; 'parse'
+        is the cost of building the document alone, so each stage's own cost is its time minus that.
+        """
+        timings = {}
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            for category in CATEGORIES:
+                listings = [content for c, kind, _, content in corpus if c == category and kind == 'listing']
+                details = [content for c, kind, _, content in corpus if c == category and kind == 'detail']
+                if listings:
+                    adapter = self.scrapers[category].adapter
+                    self.engine.parser = backend
+                    timings[f"{category}/parse_listing"] = best_of(
+                        repeat, listings, lambda content: self.engine.parse_listing(adapter, content))
+                if details:
+                    timings[f"{category}/parse"] = best_of(
+                        repeat, details, lambda content: HTMLDocument(content, backend).text())
+                    for stage, function in self.stages[category].items():
+                        timings[f"{category}/{stage}"] = best_of(
+                            repeat, details, lambda content: function(HTMLDocument(content, backend)))
+        return timings
+
+
+def best_of(repeat, pages, function):
+    """Fastest of `repeat` passes over the pages, in milliseconds per page
+
+    The minimum rather than the mean: background noise only ever makes a pass slower.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for content in pages:
+            function(content)
+        elapsed = (time.perf_counter() - start) / len(pages) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def golden_path(category, name):
+    return os.path.join(GOLDEN_DIR, category, f"{name}.json")
+
+
+def read_golden(category, name):
+    try:
+        with open(golden_path(category, name), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def update_golden(suite, corpus):
+    """Write what html.parser extracts from every page as the expected output"""
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        results = [(category, name, suite.run_page(category, kind, content, 'html.parser'))
+                   for category, kind, name, content in corpus]
+    for category, name, result in results:
+        path = golden_path(category, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(as_json(result), f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write('\n')
+    print(f"Wrote {len(results)} golden files to {GOLDEN_DIR}")
+
+
+def record(category, urls):
+    """Save live pages into the fixture corpus through the engine (rate limit and all)"""
+    engine = CrawlEngine(state_dir=tempfile.mkdtemp(prefix='mql5-record-'), cache=False, blob_store=False)
+    category_dir = os.path.join(FIXTURES_DIR, category)
+    os.makedirs(category_dir, exist_ok=True)
+    for url in urls:
+        response = engine.safe_request(url, is_page_request=True)
+        if not response or response.status_code != 200:
+            print(f"Failed to record {url}: status {response.status_code if response else 'No response'}")
+            continue
+        if ITEM_LINK_PATTERN.search(url):
+            name = f"detail_{url.rstrip('/').split('/')[-1]}"
+        else:
+            name = 'listing_' + (re.sub(r'\W+', '_', url.rstrip('/').split('/')[-1]) or 'page1')
+        path = os.path.join(category_dir, f"{name}.html")
+        with open(path, 'wb') as f:
+            f.write(response.content)
+        print(f"Recorded {url} -> {os.path.relpath(path)}")
+    print("Review the pages, then run with --update-golden to record what they should extract")
+
+
+def compare(timings, baseline, threshold):
+    """Stages slower than the baseline by more than threshold (a fraction); prints the comparison"""
+    regressions = []
+    print()
+    print(f"{'stage':<56} {'baseline':>10} {'now':>10} {'change':>8}")
+    for key in sorted(timings):
+        if key not in baseline:
+            continue
+        change = timings[key] / baseline[key] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(key)
+            flag = '  SLOWER'
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{key:<56} {baseline[key]:>7.3f} ms {timings[key]:>7.3f} ms {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--parser', default='auto', help='Parser backend to time (default: fastest installed)')
+    parser.add_argument('--all-parsers', action='store_true', help='Check and time every installed backend')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed passes over the corpus per stage')
+    parser.add_argument('--save', metavar='FILE', help='Write the timings to a JSON file')
+    parser.add_argument('--compare', metavar='FILE', help='Compare the timings with ones saved by --save')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='Slowdown against --compare that counts as a regression (default 0.15 = 15%%)')
+    parser.add_argument('--update-golden', action='store_true',
+                        help='Rewrite the golden files from the current extraction instead of checking them')
+    parser.add_argument('--record', nargs='+', metavar=('CATEGORY', 'URL'),
+                        help='Fetch pages from the site into the fixture corpus of a category, then exit')
+    args = parser.parse_args()
+
+    if args.record:
+        category, urls = args.record[0], args.record[1:]
+        if category not in CATEGORIES or not urls:
+            parser.error(f"--record needs a category ({', '.join(CATEGORIES)}) and at least one URL")
+        record(category, urls)
+        return 0
+
+    corpus = load_corpus()
+    if not corpus:
+        sys.exit(f"No fixture pages in {FIXTURES_DIR}")
+
+    suite = Suite()
+    if args.update_golden:
+        update_golden(suite, corpus)
+        return 0
+
+    try:
+        backends = available_backends() if args.all_parsers else [resolve_backend(args.parser)]
+    except ValueError as e:
+        parser.error(str(e))
+
+    listings = sum(1 for _, kind, _, _ in corpus if kind == 'listing')
+    print(f"{listings} listing and {len(corpus) - listings} detail pages, backends: {', '.join(backends)}")
+
+    # Correctness first: a faster extraction that returns different data is not an improvement
+    mismatches = 0
+    for backend in backends:
+        for category, name, stage in suite.check(corpus, backend):
+            mismatches += 1
+            print(f"MISMATCH {backend} {category}/{name}: {stage}")
+
+    timings = {}
+    for backend in backends:
+        for key, ms in suite.time_stages(corpus, backend, args.repeat).items():
+            timings[f"{backend}/{key}"] = ms
+
+    print()
+    print(f"{'stage':<56} {'per page':>10}")
+    for key, ms in timings.items():
+        print(f"{key:<56} {ms:>7.3f} ms")
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(timings, json.load(f)['timings'], args.threshold)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'backends': backends, 'repeat': args.repeat, 'timings': timings}, f, indent=2)
+
+    print()
+    print("Extraction matches the golden files" if not mismatches else f"{mismatches} golden-file mismatches")
+    if regressions:
+        print(f"{len(regressions)} stages slower than {args.compare} by more than {args.threshold:.0%}")
+    return 1 if mismatches or regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
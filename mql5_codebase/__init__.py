@@ -0,0 +1,5 @@
+"""Shared crawl engine for the MQL5 codebase fetchers"""
+from .engine import CategoryAdapter, CrawlEngine
+from .categories import CATEGORIES, load_scraper
+
+__all__ = ['CategoryAdapter', 'CrawlEngine', 'CATEGORIES', 'load_scraper']
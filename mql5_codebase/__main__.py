@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import argparse
+
+from .bandwidth import megabytes
+from .catalog import FORMATS, compact
+from .categories import CATEGORIES, load_scraper
+from .engine import DEFAULT_STATE_DIR, CrawlEngine
+from .manifest import CrawlManifest
+from .metrics import MetricsDumper, MetricsServer
+from .parsing import BACKENDS
+from .planner import ListingPlanner, format_shard, parse_shard
+from .retry import RetryPolicy
+
+
+def print_dedup_report(manifest):
+    """Summarise identical files shared between item folders"""
+    report = manifest.dedup_report()
+    mb = 1024 * 1024
+    print("Deduplication report")
+    print("=" * 50)
+    print(f"Files in item folders: {report['files']} ({report['logical_bytes'] / mb:.1f} MB)")
+    print(f"Distinct contents:     {report['unique_files']} ({report['unique_bytes'] / mb:.1f} MB)")
+    print(f"Stored once, linked:   {report['saved_bytes'] / mb:.1f} MB saved")
+    if report['top_duplicates']:
+        print()
+        print("Most duplicated files:")
+        for dup in report['top_duplicates']:
+            print(f"  {dup['name']}: {dup['copies']} copies in {dup['items']} items, "
+                  f"{dup['size'] / 1024:.1f} KB each ({dup['sha256'][:12]})")
+
+
+def page_limit(value):
+    """--max-pages: a page number, or 'all' to find each category's last page first"""
+    if value == 'all':
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a page number or 'all', got {value!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m mql5_codebase',
+        description='Crawl several MQL5 codebase categories in one process on one connection pool')
+    parser.add_argument('categories', nargs='*', default=list(CATEGORIES),
+                        help=f"Categories to crawl (default: all of {', '.join(CATEGORIES)})")
+    parser.add_argument('--max-pages', type=page_limit, default=None,
+                        help="Last listing page to scrape, or 'all' to find each category's last page first "
+                             "(default 4, or no limit with --since-last-run)")
+    parser.add_argument('--plan', metavar='FILE', default=None,
+                        help='Scrape the last pages found by python -m mql5_codebase.planner --save FILE')
+    parser.add_argument('--shard', type=parse_shard, default=None, metavar='I/N',
+                        help='Scrape only shard I of N: every N-th listing page (one shard per machine)')
+    parser.add_argument('--start-page', type=int, default=None, help='Listing page to start from (default 1)')
+    parser.add_argument('--max-requests', type=int, default=None,
+                        help='Global request budget shared by all categories')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Items whose detail page and downloads are in flight at once (shared politeness budget)')
+    parser.add_argument('--max-rate', type=float, default=1.0,
+                        help='Ceiling for the adaptive request rate in requests per second')
+    parser.add_argument('--http2', action='store_true',
+                        help="Share one multiplexed HTTP/2 connection between requests (needs pip install 'httpx[http2]')")
+    parser.add_argument('--max-retries', type=int, default=None,
+                        help='Retries per request for every kind of error (default: per error class, see README)')
+    parser.add_argument('--no-circuit-breaker', action='store_true',
+                        help='Keep sending when most recent requests fail instead of pausing the crawl')
+    parser.add_argument('--max-asset-size', type=float, default=None, metavar='MB',
+                        help='Skip ZIPs and source files larger than this (by their Content-Length)')
+    parser.add_argument('--download-budget', type=float, default=None, metavar='MB',
+                        help='Stop downloading ZIPs and source files once the run has received this much')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always download in full instead of revalidating cached pages and ZIPs')
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help='Size limit of the on-disk HTTP cache in MB')
+    parser.add_argument('--since-last-run', action='store_true',
+                        help='Stop paging a category once its listing pages only hold items from earlier runs')
+    parser.add_argument('--overlap-pages', type=int, default=1,
+                        help='Fully known listing pages to check before --since-last-run stops paging')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='Start from --start-page even if the last crawl with the same pages was interrupted')
+    parser.add_argument('--no-blob-store', action='store_true',
+                        help='Do not unpack ZIPs into item folders or share identical files through hardlinks')
+    parser.add_argument('--download-sources', action='store_true',
+                        help='Fetch every source file separately even when the ZIP already contains it')
+    parser.add_argument('--parser', default='auto', choices=('auto',) + BACKENDS,
+                        help='HTML parser backend (default: fastest installed of selectolax, lxml, html.parser)')
+    parser.add_argument('--extract-workers', type=int, default=0,
+                        help='Parse and extract detail pages in this many worker processes (0: on the crawl threads)')
+    parser.add_argument('--extract-batch', type=int, default=8,
+                        help='Detail pages sent to a worker process at once (at most --concurrency)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve crawl metrics on http://127.0.0.1:PORT/metrics (Prometheus) and /metrics.json')
+    parser.add_argument('--metrics-file', default=None,
+                        help='Write a JSON snapshot of the crawl metrics to this file periodically')
+    parser.add_argument('--metrics-interval', type=float, default=30.0,
+                        help='Seconds between --metrics-file snapshots')
+    parser.add_argument('--no-catalog', action='store_true',
+                        help='Do not record finished items in the catalog (.crawl_state/catalog)')
+    parser.add_argument('--catalog-format', default='auto', choices=('auto',) + FORMATS,
+                        help='Catalog file format (default: parquet when pyarrow is installed, else jsonl)')
+    parser.add_argument('--no-search-index', action='store_true',
+                        help='Do not add finished items to the full-text index (python -m mql5_codebase.search)')
+    parser.add_argument('--compact-catalog', action='store_true',
+                        help='Merge the catalog into one file per category, then exit without crawling')
+    parser.add_argument('--dedup-report', action='store_true',
+                        help='Print how much content item folders share, then exit without crawling')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Scrape items again even if the manifest marks them as done')
+    parser.add_argument('--base-url', default='https://www.mql5.com')
+    args = parser.parse_args(argv)
+
+    plan = None
+    if args.plan:
+        if args.max_pages is not None:
+            parser.error('--plan already sets the last page of each category; leave out --max-pages')
+        with open(args.plan, encoding='utf-8') as f:
+            plan = json.load(f)
+        # A category the planner could not reach (last page null) is left out
+        args.max_pages = {name: last for name, last in plan['last_pages'].items() if last is not None}
+        args.categories = [name for name in args.categories if name in args.max_pages]
+    if args.start_page is None:
+        args.start_page = plan['start_page'] if plan else 1
+    if args.max_pages is None:
+        args.max_pages = sys.maxsize if args.since_last_run else 4
+
+    if args.dedup_report:
+        print_dedup_report(CrawlManifest(os.path.join(DEFAULT_STATE_DIR, 'manifest.sqlite')))
+        return
+
+    if args.compact_catalog:
+        root = os.path.join(DEFAULT_STATE_DIR, 'catalog')
+        for category, records in compact(root, args.catalog_format).items():
+            print(f"{category}: {records} items")
+        return
+
+    unknown = [name for name in args.categories if name not in CATEGORIES]
+    if unknown:
+        parser.error(f"unknown categories: {', '.join(unknown)}")
+
+    print("MQL5 Codebase Scraper")
+    print("=" * 50)
+    print(f"Categories: {', '.join(args.categories)}")
+    print("All categories share one session, one connection pool and one request budget")
+    print()
+
+    engine = CrawlEngine(args.base_url, max_requests=args.max_requests, concurrency=args.concurrency,
+                         max_rate=args.max_rate, cache=not args.no_cache,
+                         cache_max_bytes=args.cache_size * 1024 * 1024, refresh=args.refresh,
+                         blob_store=not args.no_blob_store, sources_from_zip=not args.download_sources,
+                         parser=args.parser, extract_workers=args.extract_workers,
+                         extract_batch=args.extract_batch, catalog=not args.no_catalog,
+                         catalog_format=args.catalog_format, search_index=not args.no_search_index,
+                         http2=args.http2, circuit_breaker=not args.no_circuit_breaker,
+                         retry_policy=RetryPolicy.with_retries(args.max_retries) if args.max_retries is not None else None,
+                         max_asset_bytes=megabytes(args.max_asset_size),
+                         max_download_bytes=megabytes(args.download_budget))
+    scrapers = [load_scraper(name, engine) for name in args.categories]
+
+    if args.max_pages == 'all':
+        print("Finding the last listing page of each category...")
+        planned = ListingPlanner(engine).plan([scraper.adapter for scraper in scrapers])
+        args.max_pages = {name: last for name, (last, _) in planned.items() if last is not None}
+        print()
+
+    if args.since_last_run:
+        print(f"Scraping new items from page {args.start_page} until nothing new is listed")
+    elif isinstance(args.max_pages, dict):
+        print(f"Scraping pages {args.start_page} to " +
+              ', '.join(f"{last} ({name})" for name, last in args.max_pages.items()))
+    else:
+        print(f"Scraping pages {args.start_page} to {args.max_pages}")
+    if args.shard:
+        first = args.start_page + args.shard[0]
+        print(f"Shard {format_shard(args.shard)}: listing pages {first}, {first + args.shard[1]}, "
+              f"{first + 2 * args.shard[1]}, ...")
+    print("Press Ctrl+C to stop after the items in progress (twice to stop at once); the next run resumes")
+    print()
+
+    exporters = []
+    if args.metrics_port is not None:
+        exporters.append(MetricsServer(engine.metrics, args.metrics_port).start())
+        print(f"Metrics: {exporters[-1].url}")
+    if args.metrics_file:
+        exporters.append(MetricsDumper(engine.metrics, args.metrics_file, args.metrics_interval).start())
+        print(f"Metrics: writing {args.metrics_file} every {args.metrics_interval:g}s")
+
+    try:
+        engine.crawl([scraper.adapter for scraper in scrapers], max_pages=args.max_pages, start_page=args.start_page,
+                     since_last_run=args.since_last_run, overlap_pages=args.overlap_pages,
+                     resume=not args.no_resume, shard=args.shard)
+    finally:
+        for exporter in exporters:
+            exporter.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import threading
+import importlib.util
+
+MB = 1024 * 1024
+
+
+def brotli_available():
+    """Whether a brotli decoder is installed (requests and httpx both decode br bodies with it)"""
+    return any(importlib.util.find_spec(name) is not None for name in ('brotli', 'brotlicffi'))
+
+
+def accept_encoding():
+    """Accept-Encoding for every request: brotli first when its bodies can be decoded, then gzip"""
+    return 'br, gzip' if brotli_available() else 'gzip'
+
+
+def megabytes(value):
+    """Bytes for a size given in MB on the command line (None stays None)"""
+    return None if value is None else int(value * MB)
+
+
+def format_size(size):
+    """A byte count for messages: KB below a megabyte, MB above"""
+    return f"{size / 1024:.0f} KB" if size < MB else f"{size / MB:.1f} MB"
+
+
+def content_length(response):
+    """The Content-Length a response declared, or None (chunked, or not a number)"""
+    try:
+        return int(response.headers['Content-Length'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class AssetTooLarge(Exception):
+    """A ZIP or source file larger than the largest asset the run downloads"""
+
+    def __init__(self, size, limit):
+        super().__init__(f"{format_size(size)} is over the {format_size(limit)} asset limit")
+        self.size = size
+
+
+class ByteBudgetExhausted(Exception):
+    """Downloading an asset would take the run over its byte budget"""
+
+
+class Reservation:
+    """The bytes one download holds in a ByteBudget"""
+
+    def __init__(self, size):
+        self.known = size is not None  # A declared Content-Length is reserved whole before the body is read
+        self.bytes = size or 0  # ...otherwise the reservation grows with the wire bytes that arrive
+
+
+class ByteBudget:
+    """Per-run cap on the bytes ZIP and source downloads take on the wire, and on any one asset
+
+    A download reserves its Content-Length before its body is read, and settles the bytes it really
+    took afterwards (a retried or cut-off body counts what arrived). A body of unknown length reserves
+    its wire bytes as they arrive instead, so concurrent downloads cannot overshoot the cap together
+    whether their length is known or not.
+    """
+
+    def __init__(self, max_bytes=None, max_asset_bytes=None):
+        self.max_bytes = max_bytes  # None: no cap for the run
+        self.max_asset_bytes = max_asset_bytes  # None: no size limit per asset
+        self.used = 0
+        self.skipped = 0  # Assets not downloaded for their size
+        self._lock = threading.Lock()
+
+    @property
+    def exhausted(self):
+        return self.max_bytes is not None and self.used >= self.max_bytes
+
+    def admit(self, size):
+        """Reserve a download's declared size (None if unknown); returns its Reservation
+
+        Raises AssetTooLarge for an asset over the limit, ByteBudgetExhausted when the run is out of bytes.
+        """
+        with self._lock:
+            if self.exhausted:
+                raise ByteBudgetExhausted(f"all {format_size(self.max_bytes)} of the download budget are used")
+            if size is None:
+                return Reservation(None)
+            if self.max_asset_bytes is not None and size > self.max_asset_bytes:
+                self.skipped += 1
+                raise AssetTooLarge(size, self.max_asset_bytes)
+            if self.max_bytes is not None and self.used + size > self.max_bytes:
+                raise ByteBudgetExhausted(f"{format_size(size)} would take the run over its "
+                                          f"{format_size(self.max_bytes)} download budget")
+            self.used += size
+            return Reservation(size)
+
+    def check(self, reservation, received):
+        """Reserve the wire bytes a body of unknown length has taken so far
+
+        Raises once it grows past the asset limit, or past what the budget has left after every other
+        download's reservation.
+        """
+        if reservation.known:
+            return
+        with self._lock:
+            if self.max_asset_bytes is not None and received > self.max_asset_bytes:
+                self.skipped += 1
+                raise AssetTooLarge(received, self.max_asset_bytes)
+            grown = received - reservation.bytes
+            if self.max_bytes is not None and grown > 0 and self.used + grown > self.max_bytes:
+                raise ByteBudgetExhausted(f"the {format_size(self.max_bytes)} download budget ran out mid-download")
+            self.used += grown
+            reservation.bytes = received
+
+    def settle(self, reservation, received):
+        """Replace a download's reservation with the bytes it took on the wire"""
+        with self._lock:
+            self.used += received - reservation.bytes
+            reservation.bytes = received
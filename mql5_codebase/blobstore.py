@@ -0,0 +1,136 @@
+import os
+import shutil
+import hashlib
+import time
+import threading
+
+# Bodies are copied into the store in pieces of this size
+CHUNK_SIZE = 64 * 1024
+
+# Blobs written or reused less than this long before the run started are never collected: another
+# crawl sharing the store may have stored them and not linked them yet (it also covers coarse mtimes)
+GC_GRACE = 60
+
+
+class BlobStore:
+    """Content-addressed file store keyed by SHA-256; item folders hold hardlinks into it
+
+    The same .mqh include shipped by a hundred items is written to disk once. Where hardlinks are not
+    possible (another file system) files are copied, which still works but saves nothing.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.stored = 0  # New blobs written this run
+        self.reused = 0  # Files that matched a blob already on disk
+        self.bytes_saved = 0  # Bytes not written (or freed) thanks to a matching blob
+        self.started = time.time()  # Blobs touched since then may still be waiting for their link
+        self._lock = threading.Lock()
+
+    def path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def _tmp_path(self):
+        return os.path.join(self.tmp_dir, f"{threading.get_ident()}.tmp")
+
+    def _touch(self, blob_path):
+        """Mark an existing blob as in use so garbage collection elsewhere leaves it; False if there is none"""
+        try:
+            os.utime(blob_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _count(self, reused, size):
+        with self._lock:
+            if reused:
+                self.reused += 1
+                self.bytes_saved += size
+            else:
+                self.stored += 1
+
+    def add_stream(self, fileobj):
+        """Store the contents of a readable file object; returns (sha256, size)"""
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = self._tmp_path()
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        except BaseException:
+            # A member that fails its CRC check must not end up in the store
+            os.remove(tmp_path)
+            raise
+        sha256 = digest.hexdigest()
+
+        blob_path = self.path(sha256)
+        if self._touch(blob_path):
+            os.remove(tmp_path)
+            self._count(True, size)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(tmp_path, blob_path)
+            self._count(False, size)
+        return sha256, size
+
+    def adopt(self, path, sha256):
+        """Deduplicate a file already on disk: swap it for a link to a matching blob, or make it the blob"""
+        blob_path = self.path(sha256)
+        if self._touch(blob_path):
+            if not os.path.samefile(blob_path, path):
+                self.link(sha256, path)
+                self._count(True, os.path.getsize(blob_path))
+            return
+
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        tmp_path = self._tmp_path()
+        try:
+            os.link(path, tmp_path)
+        except OSError:
+            shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, blob_path)
+        self._count(False, os.path.getsize(blob_path))
+
+    def link(self, sha256, dest):
+        """Place a blob at dest, replacing whatever is there"""
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp_path = f"{dest}.link"
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        try:
+            os.link(self.path(sha256), tmp_path)
+        except OSError:
+            shutil.copyfile(self.path(sha256), tmp_path)
+        os.replace(tmp_path, dest)
+
+    def collect_garbage(self):
+        """Delete blobs no item folder links to any more; returns (blobs removed, bytes freed)
+
+        A blob another process has just stored is unlinked too until that process links it, so blobs
+        written or reused since shortly before this run started are kept for a later run to collect.
+        """
+        cutoff = self.started - GC_GRACE
+        removed = freed = 0
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if prefix == 'tmp' or not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                blob_path = os.path.join(prefix_dir, name)
+                try:
+                    stat = os.stat(blob_path)
+                    if stat.st_nlink > 1 or stat.st_mtime >= cutoff:
+                        continue
+                    os.remove(blob_path)
+                except FileNotFoundError:
+                    continue  # Collected by another process meanwhile
+                removed += 1
+                freed += stat.st_size
+        return removed, freed
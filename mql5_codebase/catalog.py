@@ -0,0 +1,187 @@
+import os
+import gzip
+import json
+import time
+import threading
+import importlib.util
+
+# Columns of a catalog record, in order; the types are those of the Parquet schema
+CATALOG_FIELDS = (
+    ('id', 'string'),
+    ('category', 'string'),
+    ('title', 'string'),
+    ('url', 'string'),
+    ('author', 'string'),
+    ('rating', 'float64'),
+    ('max_rating', 'int64'),
+    ('views', 'int64'),
+    ('downloads', 'int64'),
+    ('favorites', 'int64'),
+    ('comments', 'int64'),
+    ('published', 'string'),
+    ('updated', 'string'),
+    ('version', 'string'),
+    ('file_size', 'string'),
+    ('description', 'string'),
+    ('page_sha256', 'string'),
+    ('files', 'files'),  # [{name, sha256, size}] of everything in the item folder
+    ('scraped_at', 'float64'),  # Unix time the item was finished
+)
+
+FORMATS = ('parquet', 'jsonl')
+
+
+def parquet_available():
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def catalog_record(item, category, files):
+    """One catalog row from a finished item and its {name: (sha256, size)} files"""
+    metadata = item.get('metadata') or {}
+    record = {name: None for name, _ in CATALOG_FIELDS}
+    record.update({key: value for key, value in metadata.items() if key in record})
+    record.update({
+        'id': str(item['id']),
+        'category': category,
+        'title': item.get('title'),
+        'url': item.get('url'),
+        'page_sha256': item.get('page_sha256'),
+        'files': [{'name': name, 'sha256': sha256, 'size': size} for name, (sha256, size) in sorted(files.items())],
+        'scraped_at': time.time(),
+    })
+    return record
+
+
+def _arrow_schema():
+    """Parquet schema of a part file; the category is not a column but the partition directory"""
+    import pyarrow as pa
+    types = {
+        'string': pa.string(),
+        'float64': pa.float64(),
+        'int64': pa.int64(),
+        'files': pa.list_(pa.struct([('name', pa.string()), ('sha256', pa.string()), ('size', pa.int64())])),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in CATALOG_FIELDS if name != 'category'])
+
+
+class CatalogWriter:
+    """Structured record of every finished item, written as a dataset partitioned by category
+
+    <root>/category=<name>/part-*.parquet with pyarrow installed, otherwise gzip-compressed JSON lines
+    (part-*.jsonl.gz) with the same fields. Records are buffered and written a batch at a time, so a
+    run adds a handful of files per category; compact() merges them into one file per category.
+    """
+
+    def __init__(self, root, format='auto', batch_size=500):
+        if format in (None, 'auto'):
+            format = 'parquet' if parquet_available() else 'jsonl'
+        if format not in FORMATS:
+            raise ValueError(f"Unknown catalog format {format!r}, choose from auto, {', '.join(FORMATS)}")
+        if format == 'parquet' and not parquet_available():
+            raise ValueError("Writing the catalog as Parquet needs pyarrow (pip install pyarrow)")
+        self.root = root
+        self.format = format
+        self.batch_size = batch_size
+        self.written = 0
+        self._run = time.strftime('%Y%m%d-%H%M%S')
+        self._parts = 0
+        self._pending = {}  # category -> records not yet written
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            pending = self._pending.setdefault(record['category'], [])
+            pending.append(record)
+            batch = self._pending.pop(record['category']) if len(pending) >= self.batch_size else None
+            if batch:
+                self._write(record['category'], batch)
+
+    def flush(self):
+        """Write every buffered record"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            for category, records in pending.items():
+                self._write(category, records)
+
+    def _write(self, category, records):
+        directory = os.path.join(self.root, f"category={category}")
+        os.makedirs(directory, exist_ok=True)
+        self._parts += 1
+        extension = 'parquet' if self.format == 'parquet' else 'jsonl.gz'
+        path = os.path.join(directory, f"part-{self._run}-{os.getpid()}-{self._parts:05d}.{extension}")
+        write_part(path, records, self.format)
+        self.written += len(records)
+
+
+def write_part(path, records, format):
+    """Write one part file atomically (a reader never sees a half-written part)"""
+    tmp_path = f"{path}.tmp"
+    if format == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(records, schema=_arrow_schema())
+        pq.write_table(table, tmp_path, compression='zstd')
+    else:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False))
+                f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def _part_files(root, category=None):
+    """(category, path) of every part file under the catalog root"""
+    if not os.path.isdir(root):
+        return
+    for directory in sorted(os.listdir(root)):
+        if not directory.startswith('category='):
+            continue
+        name = directory[len('category='):]
+        if category and name != category:
+            continue
+        for file_name in sorted(os.listdir(os.path.join(root, directory))):
+            if file_name.endswith(('.parquet', '.jsonl.gz')):
+                yield name, os.path.join(root, directory, file_name)
+
+
+def read_catalog(root, category=None):
+    """Every record in the catalog (both formats), as dicts; the latest record per item wins with compact()"""
+    for name, path in _part_files(root, category):
+        if path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            for record in pq.read_table(path).to_pylist():
+                record['category'] = name
+                yield record
+        else:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)
+
+
+def compact(root, format='auto'):
+    """Merge each category's part files into one, keeping only the latest record of every item
+
+    Returns {category: records kept}.
+    """
+    if format in (None, 'auto'):
+        format = 'parquet' if parquet_available() else 'jsonl'
+    parts = {}
+    for name, path in _part_files(root):
+        parts.setdefault(name, []).append(path)
+
+    kept = {}
+    for category, paths in parts.items():
+        latest = {}
+        for record in read_catalog(root, category):
+            current = latest.get(record['id'])
+            if current is None or (record['scraped_at'] or 0) >= (current['scraped_at'] or 0):
+                latest[record['id']] = record
+        records = sorted(latest.values(), key=lambda record: record['id'])
+        extension = 'parquet' if format == 'parquet' else 'jsonl.gz'
+        path = os.path.join(root, f"category={category}", f"part-compacted-{time.strftime('%Y%m%d-%H%M%S')}.{extension}")
+        write_part(path, records, format)
+        for old_path in paths:
+            if old_path != path:
+                os.remove(old_path)
+        kept[category] = len(records)
+    return kept
@@ -0,0 +1,34 @@
+import os
+import sys
+import importlib.util
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Category name -> (fetcher script relative to the repository root, scraper class name)
+CATEGORIES = {
+    'experts': (os.path.join('Expert Advisors', 'MT5 Expert Advisor Fetcher.py'), 'MQL5ExpertAdvisorScraper'),
+    'indicators': (os.path.join('Indicators', 'MT5-Indicator-Fetcher.py'), 'MQL5Scraper'),
+    'scripts': (os.path.join('Scripts', 'MT5-Script-Fetcher.py'), 'MQL5ScriptScraper'),
+    'libraries': (os.path.join('Libraries', 'MT5-Library-Fetcher.py'), 'MQL5LibraryScraper'),
+}
+
+
+def load_fetcher_module(category):
+    """Import a category's fetcher script (the file names are not valid module names)"""
+    module_name = f"mql5_fetcher_{category}"
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    script_path, _ = CATEGORIES[category]
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(REPO_ROOT, script_path))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_scraper(category, engine):
+    """Create a category's scraper bound to a shared crawl engine"""
+    module = load_fetcher_module(category)
+    scraper_class = getattr(module, CATEGORIES[category][1])
+    return scraper_class(engine.base_url, engine=engine)
@@ -0,0 +1,741 @@
+"""Spread one crawl over several worker processes or machines through a leased work queue
+
+Usage:
+    python -m mql5_codebase.coordinator serve --host 0.0.0.0 --port 8765       # on the coordinator machine
+    export MQL5_QUEUE_TOKEN=<the token serve printed>                          # everywhere below
+    python -m mql5_codebase.coordinator seed --queue http://coordinator:8765 --max-requests 20000
+    python -m mql5_codebase.coordinator work --queue http://coordinator:8765   # on every worker machine
+    python -m mql5_codebase.coordinator status --queue http://coordinator:8765
+
+The queue server only answers requests carrying its shared token (--token or MQL5_QUEUE_TOKEN; serve
+makes one up if neither is set), and only queues units whose URLs are on the crawl's base host.
+
+--queue also takes the path of the queue's SQLite file, so workers on one machine can share it
+without a server (seed and work then both point at e.g. .crawl_state/queue.sqlite).
+
+Work units are listing pages and items. A worker leases a unit for a limited time and renews the lease
+while it works on it. A unit whose lease runs out (its worker crashed or lost the network) goes back
+to the queue for another worker, so no work is lost. Requests come out of one budget shared by every
+worker. Without --max-pages, seed finds the last listing page of each category first (see planner),
+so every listing page is queued up front and workers list pages side by side.
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import socket
+import secrets
+import sqlite3
+import argparse
+import threading
+import contextlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+
+from .bandwidth import megabytes
+from .categories import CATEGORIES, load_scraper
+from .engine import DEFAULT_STATE_DIR, CrawlEngine
+from .planner import ListingPlanner, listing_pages
+from .shutdown import drain_on_signal
+
+# Seconds a worker holds a unit before it is handed to someone else; renewed every third of that
+DEFAULT_LEASE = 300.0
+
+# A unit that failed this many times is set aside as 'failed' instead of being retried
+MAX_ATTEMPTS = 5
+
+# Requests a worker draws from the global budget at a time
+BUDGET_BLOCK = 10
+
+# Seconds a worker waits before calling an unavailable queue again, doubling up to the maximum
+QUEUE_RETRY_DELAY = 1.0
+QUEUE_RETRY_MAX = 60.0
+
+# What a queue call raises while the coordinator or the shared SQLite file is unavailable (or answers garbage)
+QUEUE_ERRORS = (requests.exceptions.RequestException, sqlite3.Error, ValueError, KeyError)
+
+# Unit states, in the order a unit moves through them
+UNIT_STATES = ('pending', 'leased', 'done', 'failed')
+
+# WorkQueue methods a RemoteQueue may call on the server
+RPC_METHODS = ('add', 'lease', 'renew', 'complete', 'fail', 'release', 'reserve_requests', 'return_requests',
+               'set_budget', 'status', 'idle')
+
+# Environment variable holding the queue server's shared token, for every command
+TOKEN_ENV = 'MQL5_QUEUE_TOKEN'
+
+
+def listing_units(categories, max_pages, start_page=1):
+    """One unit per listing page of each category, page 1 of every category first
+
+    max_pages is the last page of every category or {category: last page}.
+    """
+    if not isinstance(max_pages, dict):
+        max_pages = dict.fromkeys(categories, max_pages)
+    last_pages = {category: max_pages.get(category, 0) for category in categories}
+    return [{'key': f"listing:{category}:{page}", 'kind': 'listing', 'category': category, 'payload': {'page': page}}
+            for category, page in listing_pages(last_pages, start_page)]
+
+
+def item_unit(category, link, page=None):
+    return {'key': f"item:{link['id']}", 'kind': 'item', 'category': category, 'payload': dict(link, page=page)}
+
+
+def check_unit(unit, base_url):
+    """Raise ValueError unless a unit is a listing page or an item of a known category on base_url's host
+
+    Units come from the network when the queue is served over HTTP; an item's id must be all digits
+    and its title a string, since both end up in paths on the worker's disk.
+    """
+    if not isinstance(unit, dict) or not isinstance(unit.get('key'), str) or not isinstance(unit.get('payload'), dict):
+        raise ValueError("a unit is an object with a key string and a payload object")
+    if unit.get('category') not in CATEGORIES:
+        raise ValueError(f"unknown category {unit.get('category')!r}")
+    payload = unit['payload']
+    if unit.get('kind') == 'listing':
+        if not isinstance(payload.get('page'), int) or payload['page'] < 1:
+            raise ValueError(f"bad listing page {payload.get('page')!r}")
+    elif unit.get('kind') == 'item':
+        url = urlsplit(str(payload.get('url', '')))
+        base = urlsplit(base_url)
+        if url.scheme not in ('http', 'https') or url.netloc != base.netloc:
+            raise ValueError(f"item URL {payload.get('url')!r} is not on {base.netloc}")
+        # The id and title name the item's folder and files
+        if not isinstance(payload.get('id'), str) or not payload['id'].isdigit():
+            raise ValueError(f"bad item id {payload.get('id')!r}")
+        if not isinstance(payload.get('title'), str):
+            raise ValueError(f"bad item title {payload.get('title')!r}")
+    else:
+        raise ValueError(f"unknown unit kind {unit.get('kind')!r}")
+
+
+class WorkQueue:
+    """Leased work units and the global request budget, in SQLite (WAL)
+
+    Several processes may open the same file. Every state change is one short IMMEDIATE transaction,
+    so two workers never lease the same unit.
+    """
+
+    def __init__(self, path, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS units (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                category TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                lease_expires REAL,
+                error TEXT,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS units_state ON units (state, kind);
+            CREATE TABLE IF NOT EXISTS budget (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                max_requests INTEGER,
+                used INTEGER NOT NULL DEFAULT 0
+            );
+            INSERT OR IGNORE INTO budget (id, max_requests, used) VALUES (1, NULL, 0);
+        ''')
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    def add(self, units):
+        """Queue units ({key, kind, category, payload}); ones already queued, in any state, are left alone"""
+        now = time.time()
+        with self._transaction() as db:
+            before = db.total_changes
+            db.executemany('''INSERT OR IGNORE INTO units (key, kind, category, payload, updated_at)
+                              VALUES (?, ?, ?, ?, ?)''',
+                           [(unit['key'], unit['kind'], unit['category'], json.dumps(unit['payload']), now)
+                            for unit in units])
+            return db.total_changes - before
+
+    def lease(self, worker, ttl=DEFAULT_LEASE):
+        """Hand the next pending unit to a worker for `ttl` seconds, or None if nothing is pending
+
+        Expired leases are reclaimed first; a unit whose worker kept dying on it is set aside once it has
+        used up its attempts, as if it had failed. Items go out before listing pages, so the backlog of
+        listed items stays short.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.execute('''UPDATE units SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                          owner = NULL, error = 'lease expired', updated_at = ?
+                          WHERE state = 'leased' AND lease_expires < ?''', (self.max_attempts, now, now))
+            row = db.execute('''SELECT key, kind, category, payload, attempts FROM units WHERE state = 'pending'
+                                ORDER BY kind = 'listing', rowid LIMIT 1''').fetchone()
+            if not row:
+                return None
+            key, kind, category, payload, attempts = row
+            db.execute('''UPDATE units SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1,
+                          updated_at = ? WHERE key = ?''', (worker, now + ttl, now, key))
+        return {'key': key, 'kind': kind, 'category': category, 'payload': json.loads(payload),
+                'attempts': attempts + 1}
+
+    def renew(self, keys, worker, ttl=DEFAULT_LEASE):
+        """Extend a worker's leases; returns the keys it still holds (a lost lease was reclaimed by now)"""
+        now = time.time()
+        held = []
+        with self._transaction() as db:
+            for key in keys:
+                cursor = db.execute('''UPDATE units SET lease_expires = ? WHERE key = ? AND owner = ? AND state = 'leased' ''',
+                                    (now + ttl, key, worker))
+                if cursor.rowcount:
+                    held.append(key)
+        return held
+
+    def complete(self, key, worker):
+        """The unit's work is done; accepted from any worker, since doing an item twice is harmless"""
+        with self._transaction() as db:
+            db.execute('''UPDATE units SET state = 'done', owner = ?, lease_expires = NULL, error = NULL, updated_at = ?
+                          WHERE key = ? AND state != 'done' ''', (worker, time.time(), key))
+
+    def fail(self, key, worker, error=None):
+        """The unit failed: back to the queue, or set aside once it has used up its attempts"""
+        with self._transaction() as db:
+            db.execute('''UPDATE units SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                          owner = NULL, lease_expires = NULL, error = ?, updated_at = ?
+                          WHERE key = ? AND owner = ? AND state = 'leased' ''',
+                       (self.max_attempts, error, time.time(), key, worker))
+
+    def release(self, key, worker):
+        """Give a unit back untried (the worker is stopping), without counting an attempt"""
+        with self._transaction() as db:
+            db.execute('''UPDATE units SET state = 'pending', owner = NULL, lease_expires = NULL,
+                          attempts = MAX(attempts - 1, 0), updated_at = ?
+                          WHERE key = ? AND owner = ? AND state = 'leased' ''', (time.time(), key, worker))
+
+    def set_budget(self, max_requests):
+        """Cap the requests all workers together may make (None = unlimited); requests already made still count"""
+        with self._transaction() as db:
+            db.execute('UPDATE budget SET max_requests = ? WHERE id = 1', (max_requests,))
+
+    def reserve_requests(self, count):
+        """Take up to `count` requests from the global budget; returns how many were granted"""
+        with self._transaction() as db:
+            max_requests, used = db.execute('SELECT max_requests, used FROM budget WHERE id = 1').fetchone()
+            granted = count if max_requests is None else max(0, min(count, max_requests - used))
+            db.execute('UPDATE budget SET used = used + ? WHERE id = 1', (granted,))
+        return granted
+
+    def return_requests(self, count):
+        """Give back reserved requests a worker did not make"""
+        with self._transaction() as db:
+            db.execute('UPDATE budget SET used = MAX(used - ?, 0) WHERE id = 1', (count,))
+
+    def idle(self):
+        """True once no unit is pending or leased: the crawl is over"""
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM units WHERE state IN ('pending', 'leased') LIMIT 1").fetchone()
+        return row is None
+
+    def status(self):
+        """Unit counts by kind and state, the budget, and the leases each worker holds"""
+        with self._lock:
+            counts = self._db.execute('SELECT kind, state, COUNT(*) FROM units GROUP BY kind, state').fetchall()
+            max_requests, used = self._db.execute('SELECT max_requests, used FROM budget WHERE id = 1').fetchone()
+            owners = self._db.execute('''SELECT owner, COUNT(*) FROM units WHERE state = 'leased'
+                                         GROUP BY owner ORDER BY owner''').fetchall()
+            failed = self._db.execute('''SELECT key, attempts, error FROM units WHERE state = 'failed'
+                                         ORDER BY updated_at DESC LIMIT 10''').fetchall()
+        units = {}
+        for kind, state, count in counts:
+            units.setdefault(kind, {})[state] = count
+        return {
+            'units': units,
+            'budget': {'max_requests': max_requests, 'used': used},
+            'leases': dict(owners),
+            'failed': [{'key': key, 'attempts': attempts, 'error': error} for key, attempts, error in failed],
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class QueueServer:
+    """Serve a WorkQueue to workers on other machines: POST /<method> with the arguments as a JSON object
+
+    Every request must carry `Authorization: Bearer <token>`. Units queued through add() must be on
+    base_url's host, since workers fetch whatever URL an item unit holds.
+    """
+
+    def __init__(self, queue, port, host='127.0.0.1', token=None, base_url='https://www.mql5.com'):
+        if not token:
+            raise ValueError("the queue server needs a shared token")
+        self.queue = queue
+        queue_ref = queue
+        expected = f"Bearer {token}".encode()
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _authorized(self):
+                if hmac.compare_digest(self.headers.get('Authorization', '').encode(), expected):
+                    return True
+                self._reply(401, {'error': 'missing or wrong token'})
+                return False
+
+            def do_GET(self):
+                if not self._authorized():
+                    return
+                if self.path.split('?')[0] != '/status':
+                    self.send_error(404)
+                    return
+                self._reply(200, {'result': queue_ref.status()})
+
+            def do_POST(self):
+                if not self._authorized():
+                    return
+                method = self.path.strip('/')
+                if method not in RPC_METHODS:
+                    self.send_error(404)
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    arguments = json.loads(self.rfile.read(length) or b'{}')
+                    if not isinstance(arguments, dict):
+                        raise ValueError("the body must be a JSON object of arguments")
+                    if method == 'add':
+                        if not isinstance(arguments.get('units'), list):
+                            raise ValueError("units must be a list")
+                        for unit in arguments['units']:
+                            check_unit(unit, base_url)
+                    result = getattr(queue_ref, method)(**arguments)
+                except (TypeError, ValueError) as e:
+                    self._reply(400, {'error': str(e)})
+                    return
+                except sqlite3.Error as e:
+                    self._reply(500, {'error': str(e)})
+                    return
+                self._reply(200, {'result': result})
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class RemoteQueue:
+    """WorkQueue client for a QueueServer, with the same methods"""
+
+    def __init__(self, url, token=None, retries=5):
+        self.url = url.rstrip('/')
+        self.retries = retries
+        self.session = requests.Session()
+        if token:
+            self.session.headers['Authorization'] = f"Bearer {token}"
+
+    def _call(self, method, **arguments):
+        # The coordinator may be restarting: retry connection failures with a growing pause
+        for attempt in range(self.retries):
+            try:
+                response = self.session.post(f"{self.url}/{method}", json=arguments, timeout=30)
+                break
+            except requests.exceptions.ConnectionError:
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(2 ** attempt)
+        response.raise_for_status()
+        return response.json()['result']
+
+    def add(self, units):
+        return self._call('add', units=units)
+
+    def lease(self, worker, ttl=DEFAULT_LEASE):
+        return self._call('lease', worker=worker, ttl=ttl)
+
+    def renew(self, keys, worker, ttl=DEFAULT_LEASE):
+        return self._call('renew', keys=keys, worker=worker, ttl=ttl)
+
+    def complete(self, key, worker):
+        return self._call('complete', key=key, worker=worker)
+
+    def fail(self, key, worker, error=None):
+        return self._call('fail', key=key, worker=worker, error=error)
+
+    def release(self, key, worker):
+        return self._call('release', key=key, worker=worker)
+
+    def set_budget(self, max_requests):
+        return self._call('set_budget', max_requests=max_requests)
+
+    def reserve_requests(self, count):
+        return self._call('reserve_requests', count=count)
+
+    def return_requests(self, count):
+        return self._call('return_requests', count=count)
+
+    def idle(self):
+        return self._call('idle')
+
+    def status(self):
+        return self._call('status')
+
+    def close(self):
+        self.session.close()
+
+
+def open_queue(spec, token=None):
+    """A RemoteQueue for an http(s) URL, otherwise a WorkQueue on the SQLite file at that path"""
+    if spec.startswith(('http://', 'https://')):
+        return RemoteQueue(spec, token)
+    return WorkQueue(spec)
+
+
+class SharedBudget:
+    """The coordinator's global request budget as seen by one worker (CrawlEngine.shared_budget)
+
+    Requests are drawn in blocks so a worker does not ask the coordinator before every request; the
+    unused rest of its block goes back when the worker stops.
+    """
+
+    def __init__(self, queue, block=BUDGET_BLOCK):
+        self.queue = queue
+        self.block = block
+        self.exhausted = False
+        self._left = 0
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Spend one request; False once the global budget is used up"""
+        with self._lock:
+            if not self._left and not self.exhausted:
+                self._left = self.queue.reserve_requests(self.block)
+                self.exhausted = not self._left
+            if not self._left:
+                return False
+            self._left -= 1
+            return True
+
+    def close(self):
+        with self._lock:
+            left, self._left = self._left, 0
+        if left:
+            self.queue.return_requests(left)
+
+
+class CrawlWorker:
+    """Lease units from a queue and run them on a CrawlEngine until the queue is empty
+
+    A listing unit fetches its page and queues the items on it. An item unit is the existing
+    scrape_page(url, title, id): the detail page, then the ZIP and sources. Units are idempotent, so a
+    unit reclaimed from a slow worker and run twice does no harm.
+    """
+
+    def __init__(self, queue, engine, worker_id=None, lease=DEFAULT_LEASE, poll=5.0, output_dir=None):
+        self.queue = queue
+        self.engine = engine
+        self.output_dir = output_dir  # Item folders go to <output_dir>/<category> instead of next to the fetchers
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease = lease
+        self.poll = poll  # Seconds between looks at the queue while other workers still hold units
+        self.counts = Counter()
+        self._scrapers = {}
+        self._held = {}  # key -> unit this worker is working on
+        self._stopped = threading.Event()  # Lease nothing new; units in progress still finish
+        self._aborted = False  # Stopped at once: units in progress were handed back
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+
+    def _adapter(self, category):
+        with self._lock:
+            if category not in self._scrapers:
+                scraper = load_scraper(category, self.engine)
+                if self.output_dir:
+                    scraper.script_dir = os.path.join(self.output_dir, category)
+                self._scrapers[category] = scraper
+            return self._scrapers[category].adapter
+
+    def run(self, threads=None):
+        """Work until the queue is empty, the budget is spent or stop() is called; returns unit counts
+
+        SIGINT or SIGTERM calls stop(); a second one hands the units in progress back to the queue at once.
+        """
+        threads = threads or self.engine.concurrency
+        self.engine.shared_budget = SharedBudget(self.queue)
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+        workers = [threading.Thread(target=self._work, daemon=True) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        try:
+            with drain_on_signal(self.stop):
+                for thread in workers:
+                    while thread.is_alive():
+                        thread.join(0.5)
+        except KeyboardInterrupt:
+            print("\nStopping at once: units in progress go back to the queue")
+            self._aborted = True
+            self._stopped.set()
+            with self._lock:
+                held = list(self._held)
+            for key in held:
+                self.queue.release(key, self.worker_id)
+        finally:
+            self._stopped.set()
+            self._finished.set()
+            self.engine.shared_budget.close()
+            self.engine.limiter.save()
+            if self.engine.catalog:
+                self.engine.catalog.flush()
+        return dict(self.counts)
+
+    def stop(self, reason=None):
+        """Lease no new units and return once the ones in progress are finished"""
+        if not self._stopped.is_set():
+            print(f"\nStopping{f' on {reason}' if reason else ''}: finishing the units in progress "
+                  f"(press Ctrl+C again to stop at once)...")
+        self._stopped.set()
+
+    def _heartbeat(self):
+        interval = self.lease / 3
+        wait = interval
+        failures = 0
+        while not self._finished.wait(wait):
+            wait = interval
+            with self._lock:
+                keys = list(self._held)
+            if not keys:
+                continue
+            try:
+                held = set(self.queue.renew(keys, self.worker_id, self.lease))
+            except QUEUE_ERRORS as e:
+                # Try again well before the leases run out, backing off while the queue stays unavailable
+                wait = min(interval, QUEUE_RETRY_DELAY * 2 ** failures)
+                failures += 1
+                print(f"Could not renew leases: {e}; retrying in {wait:.0f}s")
+                continue
+            failures = 0
+            for key in keys:
+                if key not in held:
+                    print(f"Lease on {key} expired; another worker may run it too")
+
+    def _queue_call(self, what, call, *args):
+        """call(*args), retried with a growing pause while the queue is unavailable; None once stopped"""
+        delay = QUEUE_RETRY_DELAY
+        while True:
+            try:
+                return call(*args)
+            except QUEUE_ERRORS as e:
+                print(f"Could not {what}: {e}; retrying in {delay:.0f}s")
+            if self._stopped.wait(delay):
+                return None
+            delay = min(QUEUE_RETRY_MAX, delay * 2)
+
+    def _work(self):
+        while not self._stopped.is_set():
+            if self.engine.budget_exhausted():
+                print("Global request budget exhausted, stopping")
+                return
+            if self.engine.stopping.is_set():
+                # The engine drains itself once the download byte budget is used up
+                print("Download byte budget used up, stopping")
+                return
+            unit = self._queue_call('lease a unit', self.queue.lease, self.worker_id, self.lease)
+            if unit is None:
+                if self._stopped.is_set() or self._queue_call('check the queue', self.queue.idle):
+                    return
+                self._stopped.wait(self.poll)
+                continue
+
+            with self._lock:
+                self._held[unit['key']] = unit
+            error = None
+            try:
+                success = self._run_unit(unit)
+            except Exception as e:
+                success, error = False, f"{type(e).__name__}: {e}"
+
+            try:
+                if self._aborted:
+                    continue  # Handed back by run()
+                # The unit stays held (and its lease renewed) until the queue has taken the outcome
+                if success:
+                    self._queue_call(f"complete {unit['key']}", self.queue.complete, unit['key'], self.worker_id)
+                    self.counts[f"{unit['kind']} done"] += 1
+                elif self.engine.budget_exhausted() or self.engine.stopping.is_set():
+                    # Not the unit's fault: leave it for a run with budget left
+                    self._queue_call(f"release {unit['key']}", self.queue.release, unit['key'], self.worker_id)
+                else:
+                    self._queue_call(f"fail {unit['key']}", self.queue.fail, unit['key'], self.worker_id, error)
+                    self.counts[f"{unit['kind']} failed"] += 1
+            finally:
+                with self._lock:
+                    self._held.pop(unit['key'], None)
+
+    def _run_unit(self, unit):
+        """Do one unit's work; True on success"""
+        # Whoever can write to the queue must not be able to point the crawl elsewhere
+        check_unit(unit, self.engine.base_url)
+        adapter = self._adapter(unit['category'])
+        payload = unit['payload']
+        if unit['kind'] == 'listing':
+            links = self.engine.fetch_listing(adapter, payload['page'])
+            if links is None:
+                return False
+            added = self.queue.add([item_unit(adapter.name, link, payload['page']) for link in links])
+            print(f"{adapter.label} page {payload['page']}: {len(links)} items, {added} new to the queue")
+            return True
+
+        if not self.engine.refresh and self.engine.manifest.is_done(payload['id']):
+            return True
+        self.engine.manifest.mark_listed(adapter.name, payload, payload.get('page'))
+        print(f"[{unit['key']}] Processing: {payload['title']}")
+        return bool(adapter.scrape_page(payload['url'], payload['title'], payload['id']))
+
+
+def print_status(status):
+    print(f"{'kind':<8} " + ' '.join(f"{state:>8}" for state in UNIT_STATES))
+    for kind, states in sorted(status['units'].items()):
+        print(f"{kind:<8} " + ' '.join(f"{states.get(state, 0):>8}" for state in UNIT_STATES))
+    budget = status['budget']
+    print(f"Requests: {budget['used']} of {budget['max_requests'] if budget['max_requests'] is not None else 'unlimited'}")
+    for owner, count in status['leases'].items():
+        print(f"  {owner}: {count} leased")
+    for failed in status['failed']:
+        print(f"  failed {failed['key']} after {failed['attempts']} attempts: {failed['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Coordinate a crawl across several workers')
+    commands = parser.add_subparsers(dest='command', required=True)
+    default_queue = os.path.join(DEFAULT_STATE_DIR, 'queue.sqlite')
+
+    serve = commands.add_parser('serve', help='Serve a queue file to workers on other machines')
+    serve.add_argument('--queue', default=default_queue, help='SQLite file holding the queue')
+    serve.add_argument('--host', default='127.0.0.1',
+                       help='Interface to listen on (0.0.0.0 for workers on other machines)')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--base-url', default='https://www.mql5.com', help='The only site units may point at')
+
+    seed = commands.add_parser('seed', help="Queue the listing pages of a crawl and set its request budget")
+    seed.add_argument('categories', nargs='*', default=list(CATEGORIES))
+    seed.add_argument('--queue', default=default_queue, help='Queue server URL or SQLite file')
+    seed.add_argument('--max-pages', type=int, default=None,
+                      help="Last listing page to queue (default: find each category's last page)")
+    seed.add_argument('--start-page', type=int, default=1)
+    seed.add_argument('--max-requests', type=int, default=None, help='Requests all workers together may make')
+    seed.add_argument('--max-rate', type=float, default=1.0, help='Request rate while finding the last pages')
+    seed.add_argument('--base-url', default='https://www.mql5.com')
+
+    work = commands.add_parser('work', help='Run units from the queue until it is empty')
+    work.add_argument('--queue', default=default_queue, help='Queue server URL or SQLite file')
+    work.add_argument('--concurrency', type=int, default=4, help='Units in progress at once')
+    work.add_argument('--max-rate', type=float, default=1.0,
+                      help="This worker's rate ceiling in requests per second (split the site's limit between workers)")
+    work.add_argument('--lease', type=float, default=DEFAULT_LEASE, help='Lease length in seconds')
+    work.add_argument('--state-dir', default=None, help='Local crawl state (cache, manifest, blobs)')
+    work.add_argument('--output-dir', default=None,
+                      help='Save items under OUTPUT_DIR/<category> (default: next to each fetcher script)')
+    work.add_argument('--http2', action='store_true', help="Use one HTTP/2 connection (needs httpx[http2])")
+    work.add_argument('--max-asset-size', type=float, default=None, metavar='MB',
+                      help='Skip ZIPs and source files larger than this')
+    work.add_argument('--download-budget', type=float, default=None, metavar='MB',
+                      help="Stop once this worker's downloads have received this much")
+    work.add_argument('--no-cache', action='store_true')
+    work.add_argument('--parser', default='auto')
+    work.add_argument('--refresh', action='store_true')
+    work.add_argument('--base-url', default='https://www.mql5.com')
+
+    status = commands.add_parser('status', help='Show the progress of the queue')
+    status.add_argument('--queue', default=default_queue, help='Queue server URL or SQLite file')
+    status.add_argument('--json', action='store_true')
+    for command in (serve, seed, work, status):
+        command.add_argument('--token', default=os.environ.get(TOKEN_ENV),
+                             help=f"The queue server's shared token (default: ${TOKEN_ENV})")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        token = args.token or secrets.token_urlsafe(24)
+        server = QueueServer(WorkQueue(args.queue), args.port, args.host, token, args.base_url)
+        print(f"Serving {args.queue} at {server.url}")
+        if not args.token:
+            print(f"Token (pass it to seed, work and status as {TOKEN_ENV} or --token): {token}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    queue = open_queue(args.queue, args.token)
+    if args.command == 'seed':
+        unknown = [name for name in args.categories if name not in CATEGORIES]
+        if unknown:
+            parser.error(f"unknown categories: {', '.join(unknown)}")
+        max_pages = args.max_pages
+        if max_pages is None:
+            # The probes are not counted against the workers' budget
+            engine = CrawlEngine(args.base_url, max_rate=args.max_rate, catalog=False, search_index=False)
+            planned = ListingPlanner(engine).plan([load_scraper(name, engine).adapter for name in args.categories])
+            max_pages = {name: last for name, (last, _) in planned.items() if last is not None}
+        added = queue.add(listing_units(args.categories, max_pages, args.start_page))
+        queue.set_budget(args.max_requests)
+        print(f"Queued {added} listing pages; request budget {args.max_requests or 'unlimited'}")
+    elif args.command == 'work':
+        engine = CrawlEngine(args.base_url, concurrency=args.concurrency, state_dir=args.state_dir,
+                             max_rate=args.max_rate, cache=not args.no_cache, parser=args.parser, refresh=args.refresh,
+                             http2=args.http2, max_asset_bytes=megabytes(args.max_asset_size),
+                             max_download_bytes=megabytes(args.download_budget))
+        worker = CrawlWorker(queue, engine, lease=args.lease, output_dir=args.output_dir)
+        print(f"Worker {worker.worker_id}: {args.concurrency} units at a time from {args.queue}")
+        counts = worker.run(args.concurrency)
+        print(f"Worker {worker.worker_id} finished: " + (', '.join(f"{count} {key}" for key, count in sorted(counts.items()))
+                                                        or 'nothing to do'))
+        print(engine.metrics.summary())
+        print(engine.metrics.bandwidth_report())
+    else:
+        if args.json:
+            print(json.dumps(queue.status(), indent=2))
+        else:
+            print_status(queue.status())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
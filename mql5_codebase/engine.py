@@ -0,0 +1,1009 @@
+import os
+import re
+import codecs
+import time
+import shutil
+import asyncio
+import sqlite3
+import hashlib
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .bandwidth import AssetTooLarge, ByteBudget, ByteBudgetExhausted, accept_encoding, content_length
+from .blobstore import BlobStore
+from .catalog import CatalogWriter, catalog_record
+from .http2 import HTTP2Adapter
+from .httpcache import HTTPCache
+from .index import SearchIndex
+from .manifest import CrawlManifest, file_sha256
+from .metrics import CrawlMetrics
+from .offload import ExtractionPool
+from .parsing import HTMLDocument, parse_links, resolve_backend
+from .planner import format_shard, in_shard
+from .ratelimit import AdaptiveRateLimiter
+from .retry import FAILURE_CLASSES, CircuitBreaker, LatencyTimeouts, RetryPolicy, classify_exception, classify_status
+from .shutdown import drain_on_signal
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': accept_encoding(),
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+# Crawl state (learned rate, caches, manifests) lives next to the fetchers by default
+DEFAULT_STATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.crawl_state')
+
+# Codebase item pages look like /en/code/12345
+ITEM_LINK_PATTERN = re.compile(r'/en/code/\d+$')
+
+# Downloads: /en/code/download/12345.zip and /en/code/download/12345/File.mq5
+DOWNLOAD_PATH = '/en/code/download/'
+
+# Source files saved as UTF-8 text; anything else is written byte for byte
+TEXT_EXTENSIONS = ('.txt', '.mq5', '.mq4', '.mqh')
+
+# Downloads are written to disk in pieces of this size instead of being held in memory
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def request_kind(url):
+    """What a codebase URL fetches: 'listing', 'detail', 'zip' or 'source'"""
+    path = urlsplit(url).path
+    if ITEM_LINK_PATTERN.search(path):
+        return 'detail'
+    if DOWNLOAD_PATH in path:
+        return 'zip' if path.endswith('.zip') else 'source'
+    return 'listing'
+
+
+def wire_bytes(response, default=None):
+    """Body bytes a response took on the wire (compressed size for gzip), after its body was read"""
+    try:
+        return response.raw.tell()
+    except (AttributeError, OSError, ValueError):
+        return len(response.content) if default is None else default
+
+
+class CategoryAdapter:
+    """Describe one codebase category (listing URL, link regex, page stages) to the engine"""
+
+    def __init__(self, name, listing_path, scrape_detail, download_assets, label=None, link_pattern=ITEM_LINK_PATTERN,
+                 extract=None):
+        self.name = name
+        self.listing_path = listing_path
+        self.scrape_detail = scrape_detail  # scrape_detail(url, title, id) -> item dict or None
+        self.download_assets = download_assets  # download_assets(item) -> True on success
+        self.extract = extract  # extract(page) -> dict of plain values found on a detail page (picklable)
+        self.label = label or name
+        self.link_pattern = link_pattern
+
+    def listing_url(self, base_url, page=1):
+        """Build the listing URL for a page of this category"""
+        url = f"{base_url}{self.listing_path}"
+        if page > 1:
+            url += f"/page{page}"
+        return url
+
+    def scrape_page(self, url, title, item_id):
+        """Run the detail and download stages for one item back to back"""
+        item = self.scrape_detail(url, title, item_id)
+        if not item:
+            return False
+        item['category'] = self.name
+        return self.download_assets(item)
+
+
+class CrawlEngine:
+    """Shared session, request budget and crawl loop for every codebase category"""
+
+    def __init__(self, base_url="https://www.mql5.com", max_requests=None, concurrency=1, state_dir=None,
+                 max_rate=1.0, cache=True, cache_max_bytes=1024 ** 3, refresh=False, blob_store=True,
+                 sources_from_zip=True, parser='auto', extract_workers=0, extract_batch=8, catalog=True,
+                 catalog_format='auto', catalog_dir=None, search_index=True, http2=False, retry_policy=None,
+                 circuit_breaker=True, max_download_bytes=None, max_asset_bytes=None):
+        self.base_url = base_url
+        # One keep-alive session (and connection pool) for every category in the run
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        # Send through httpx so concurrent requests share one multiplexed HTTP/2 connection (needs httpx[http2])
+        self.http2 = http2
+        self.concurrency = concurrency  # Items whose detail page and downloads may be in flight at once
+        self._size_pool(concurrency)
+        self.state_dir = state_dir or DEFAULT_STATE_DIR
+        # Rate limiting settings: one adaptive token bucket shared by every worker and category
+        self.page_cost = 3.0  # Listing pages are heavier for the server, so they cost more tokens
+        self.limiter = AdaptiveRateLimiter(max_rate=max_rate,
+                                           state_path=os.path.join(self.state_dir, 'rate_limiter.json'))
+        # Failed requests are retried with jittered backoff per error class; a failure spike pauses every worker
+        self.retry = retry_policy or RetryPolicy()
+        self.breaker = CircuitBreaker() if circuit_breaker else None
+        # Timeouts from the latencies seen per request kind, and download deadlines from their size
+        self.timeouts = LatencyTimeouts()
+        # Conditional-GET cache: unchanged pages and ZIPs come back as 304s and are served from disk
+        self.cache = HTTPCache(os.path.join(self.state_dir, 'http_cache'), max_bytes=cache_max_bytes) if cache else None
+        # Manifest of every item by codebase ID: finished items are skipped on the next run
+        self.manifest = CrawlManifest(os.path.join(self.state_dir, 'manifest.sqlite'))
+        self.refresh = refresh  # Re-scrape items the manifest already marks as done
+        # Content-addressed store: ZIP members and downloads are kept once and hardlinked into item folders
+        self.blobs = BlobStore(os.path.join(self.state_dir, 'blobs')) if blob_store else None
+        # Structured record of every finished item (Parquet or gzip JSONL), partitioned by category
+        self.catalog = CatalogWriter(catalog_dir or os.path.join(self.state_dir, 'catalog'),
+                                     catalog_format) if catalog else None
+        # Full-text index of titles, authors, descriptions and source, updated as items finish
+        self.search = SearchIndex(os.path.join(self.state_dir, 'search.sqlite')) if search_index else None
+        # Take source files out of the downloaded ZIP and only fetch the ones it lacks
+        self.sources_from_zip = sources_from_zip
+        # HTML parser backend for every page: selectolax, lxml or html.parser ('auto' = fastest installed)
+        self.parser = resolve_backend(parser)
+        # Worker processes that parse and extract detail pages during a crawl (0 = on the crawl's threads)
+        self.extract_workers = extract_workers
+        self.extract_batch = extract_batch
+        self.extract_pool = None
+        # Latency, bytes, status codes, sleep vs work time, parse time and queue depths for the run
+        self.metrics = CrawlMetrics()
+        self.max_requests = max_requests  # Global request budget for the run (None = unlimited)
+        # Bandwidth budget: ZIPs and source files over max_asset_bytes are skipped, and downloads stop
+        # once the run has taken max_download_bytes
+        self.bandwidth = (ByteBudget(max_download_bytes, max_asset_bytes)
+                          if max_download_bytes is not None or max_asset_bytes is not None else None)
+        self.shared_budget = None  # Budget shared with other crawl workers (coordinator.SharedBudget), if any
+        self.request_count = 0
+        self.start_time = time.time()
+        self.stopping = threading.Event()  # Set by stop(): finish the items in progress, start nothing new
+        self._claimed_folders = {}  # Final folder path -> ID of the item in flight that will move into it
+        self._lock = threading.Lock()
+
+    def _size_pool(self, concurrency):
+        """Keep enough pooled keep-alive connections for every worker (HTTP/2 mostly needs just one)"""
+        if self.http2:
+            adapter = HTTP2Adapter(max_connections=max(10, concurrency))
+        else:
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(10, concurrency))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def budget_exhausted(self):
+        """Check whether the global request budget has been used up"""
+        if self.shared_budget and self.shared_budget.exhausted:
+            return True
+        return self.max_requests is not None and self.request_count >= self.max_requests
+
+    def smart_delay(self, is_page_request=False):
+        """Wait for a token from the shared rate limiter; False once the budget is used up"""
+        if self.shared_budget and not self.shared_budget.take():
+            return False
+        with self._lock:
+            if self.budget_exhausted():
+                return False
+            self.request_count += 1
+            request_number = self.request_count
+
+        wait = self.limiter.reserve(self.page_cost if is_page_request else 1.0)
+
+        # Show rate limiting info
+        elapsed_time = max(time.time() - self.start_time, 1e-6)
+        requests_per_minute = (request_number / elapsed_time) * 60
+
+        print(f"Rate limiting: waiting {wait:.1f}s (Request #{request_number}, {requests_per_minute:.1f} req/min, "
+              f"limit {self.limiter.rate * 60:.1f} req/min)")
+        time.sleep(wait)
+        self.metrics.add_sleep(wait)
+        return True
+
+    def safe_request(self, url, is_page_request=False, stream=False):
+        """Make a request with rate limiting, retries and error handling; stream leaves the body unread
+
+        Throttling, server errors, timeouts, connection failures and cut-off bodies are retried after
+        a jittered exponential backoff set per error class (see retry.RetryPolicy). Returns the last
+        response when retries run out on an error status, or None when there is no response at all.
+        """
+        kind = request_kind(url)
+        attempt = 0
+        while True:
+            if not self.smart_delay(is_page_request):
+                print(f"Request budget exhausted, skipping {url}")
+                return None
+            probe = None
+            if self.breaker:
+                waited, probe = self.breaker.wait()
+                self.metrics.add_sleep(waited)
+
+            sent_at = time.monotonic()
+            try:
+                response = self._get(url, stream)
+            except requests.exceptions.RequestException as e:
+                response = None
+                error_class = classify_exception(e)
+                problem = f"Request error: {e}"
+            else:
+                self.limiter.on_response(response.status_code, response.headers.get('Retry-After'), sent_at)
+                error_class = classify_status(response.status_code)
+                problem = f"HTTP {response.status_code} for {url}"
+            if self.breaker:
+                self.breaker.record(error_class not in FAILURE_CLASSES, probe)
+
+            if error_class is None:
+                if response is None:
+                    print(problem)
+                return response
+            delay = self.retry.delay(error_class, attempt)
+            if delay is None:
+                print(f"{problem} (giving up after {attempt + 1} attempts)")
+                return response
+
+            if response is not None:
+                response.close()
+            if error_class == 'throttled':
+                print(f"Rate limited ({response.status_code})! Retrying after "
+                      f"{self.limiter.pause_remaining() + delay:.0f}s...")
+            else:
+                print(f"{problem}; retrying in {delay:.1f}s ({error_class}, retry {attempt + 1})")
+            self.metrics.observe_retry(kind, error_class)
+            time.sleep(delay)
+            self.metrics.add_sleep(delay)
+            attempt += 1
+
+    def _get(self, url, stream=False):
+        """GET through the conditional-request cache: a 304 is answered from the stored body
+
+        Streamed responses are not stored here; download_file hands the finished file to the cache.
+        """
+        if not self.cache:
+            return self._send(url, stream)
+
+        response = self._send(url, stream, self.cache.conditional_headers(url))
+        if response.status_code == 304:
+            response.close()
+            cached = self.cache.cached_response(url, response, stream=stream)
+            if cached is not None:
+                print(f"Not modified, using cached copy: {url}")
+                self.metrics.add_saved('not_modified', content_length(cached) or 0)
+                return cached
+            # The stored body vanished between the lookup and the 304, so fetch it in full
+            response = self._send(url, stream)
+
+        if response.status_code == 200 and not stream:
+            self.cache.store(url, response)
+        return response
+
+    def _send(self, url, stream=False, headers=None):
+        """One GET on the shared session, recorded in the metrics by request kind
+
+        The latency is to the end of the body, or to the headers for a streamed response, whose body
+        bytes download_file adds once it has read them. The timeout follows the latencies seen so far.
+        """
+        kind = request_kind(url)
+        start = time.monotonic()
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeouts.timeout(kind), stream=stream)
+        except requests.exceptions.RequestException:
+            self.metrics.observe_error(kind, time.monotonic() - start)
+            raise
+        latency = time.monotonic() - start
+        received = 0 if stream else wire_bytes(response)
+        self.metrics.observe_request(kind, latency, response.status_code, received)
+        if not stream and len(response.content) > received:
+            self.metrics.add_saved('compression', len(response.content) - received)
+        self.timeouts.observe(kind, latency)
+        return response
+
+    def parse(self, content):
+        """Parse a page with the configured backend"""
+        return HTMLDocument(content, self.parser)
+
+    def extract(self, adapter, content):
+        """Parse a detail page and run its category's extraction, in a worker process when the pool is up"""
+        if self.extract_pool is None:
+            return adapter.extract(self.parse(content))
+        return self.extract_pool.extract(adapter.name, content)
+
+    def get_links(self, adapter, page=1):
+        """Get all item links for a category from a specific listing page"""
+        return self.fetch_listing(adapter, page) or []
+
+    def fetch_listing(self, adapter, page=1):
+        """Item links on a listing page, [] for a page without items, or None if the page could not be fetched"""
+        url = adapter.listing_url(self.base_url, page)
+
+        print(f"Fetching {adapter.label} page {page}...")
+        response = self.safe_request(url, is_page_request=True)
+
+        if not response or response.status_code != 200:
+            print(f"Failed to get page {page}: status {response.status_code if response else 'No response'}")
+            return None
+
+        return self.parse_listing(adapter, response.content)
+
+    def parse_listing(self, adapter, content):
+        """Item records ({url, title, id}) on a listing page, in page order"""
+        start = time.perf_counter()
+        # Only the item anchors are parsed; each item is listed once (its image link repeats the URL)
+        item_links = []
+        seen = set()
+        for href, title in parse_links(content, adapter.link_pattern, self.parser):
+            item_id = href.split('/')[-1]
+            if not title or item_id in seen:
+                continue
+            seen.add(item_id)
+            item_links.append({
+                'url': urljoin(self.base_url, href),
+                'title': title,
+                'id': item_id
+            })
+
+        self.metrics.observe_parse('listing', time.perf_counter() - start)
+        return item_links
+
+    def prepare_folder(self, final_path, item_id):
+        """Create an empty working folder for an item; finish_item renames it to its final path
+
+        Items in flight whose titles clean to the same name are not in the manifest yet, so final paths
+        are also claimed for the run; the working folder is named by item ID so they never share one.
+        """
+        item_id = str(item_id)
+        owner = self.manifest.folder_owner(final_path)
+        with self._lock:
+            if owner not in (None, item_id) or self._claimed_folders.get(final_path, item_id) != item_id:
+                # Another item with the same cleaned title already owns this folder
+                final_path = f"{final_path} ({item_id})"
+            self._claimed_folders[final_path] = item_id
+
+        parent, name = os.path.split(final_path)
+        work_path = os.path.join(parent, f".{name}.{item_id}.partial")
+        # Leftovers from an interrupted run are never trusted
+        shutil.rmtree(work_path, ignore_errors=True)
+        os.makedirs(work_path)
+        return work_path, final_path
+
+    def finish_item(self, item):
+        """Hash an item's files and atomically move its working folder into place"""
+        work_path = item['folder_path']
+        final_path = item['final_path']
+
+        # Downloads were hashed while they streamed in; only the rest (information file) is read back
+        hashed = item.get('file_hashes', {})
+        files = {}
+        for root, dirs, names in os.walk(work_path):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, work_path).replace(os.sep, '/')
+                if relative in hashed:
+                    files[relative] = hashed[relative]
+                else:
+                    files[relative] = (file_sha256(path), os.path.getsize(path))
+
+        # Swap the folders with renames so a half-written folder never sits at the final path
+        parent, name = os.path.split(final_path)
+        old_path = None
+        if os.path.exists(final_path):
+            old_path = os.path.join(parent, f".{name}.old")
+            shutil.rmtree(old_path, ignore_errors=True)
+            os.replace(final_path, old_path)
+        os.replace(work_path, final_path)
+        if old_path:
+            shutil.rmtree(old_path, ignore_errors=True)
+
+        self.manifest.mark_done(item['id'], final_path, files)
+        if self.catalog and item.get('category'):
+            self.catalog.add(catalog_record(item, item['category'], files))
+        if self.search and item.get('category'):
+            try:
+                self.search.update_item(item['id'], item['category'], item.get('title'), item.get('url'), final_path,
+                                        files, (item.get('metadata') or {}).get('author'))
+            except (OSError, sqlite3.Error) as e:
+                # The item is saved either way; python -m mql5_codebase.search --sync catches up later
+                print(f"Could not index {item['id']} for search: {e}")
+        print(f"Saved {len(files)} files to {final_path}")
+
+    def download_file(self, url, path, text=False):
+        """Stream a download into path, hashing it on the way; returns (sha256, size) or None
+
+        The body goes to a temp file in fixed-size chunks, is fsynced and then renamed over path, so a
+        partial download never appears under its real name. A body that is cut off, stalls, or takes
+        longer than its size allows (LatencyTimeouts.deadline) is downloaded again as the retry policy
+        allows. Text files that arrive in another encoding are converted to UTF-8 in a second pass over
+        the local file.
+
+        With a byte budget, every attempt is counted against it; AssetTooLarge or ByteBudgetExhausted is
+        raised for a download the budget refuses.
+        """
+        kind = request_kind(url)
+        tmp_path = f"{path}.download"
+        attempt = 0
+        while True:
+            response = self.safe_request(url, stream=True)
+            if not response or response.status_code != 200:
+                print(f"Failed to download {os.path.basename(path)}: "
+                      f"{response.status_code if response else 'No response'}")
+                if response:
+                    response.close()
+                return None
+
+            metered = self.bandwidth is not None and not getattr(response, 'from_cache', False)
+            reservation = None
+            try:
+                if metered:
+                    reservation = self.bandwidth.admit(content_length(response))
+                digest, size, head = self._write_body(response, tmp_path, kind, reservation)
+            except requests.exceptions.RequestException as e:
+                response.close()
+                self._remove_partial(tmp_path)
+                error_class = classify_exception(e)
+                if self.breaker and error_class in FAILURE_CLASSES:
+                    self.breaker.record(False)
+                delay = self.retry.delay(error_class, attempt)
+                if delay is None:
+                    print(f"Failed to download {os.path.basename(path)}: {e}")
+                    return None
+                print(f"Download of {os.path.basename(path)} broke off ({e}); retrying in {delay:.1f}s")
+                self.metrics.observe_retry(kind, error_class)
+                time.sleep(delay)
+                self.metrics.add_sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                response.close()
+                self._remove_partial(tmp_path)
+                raise
+            finally:
+                if reservation is not None:
+                    self.bandwidth.settle(reservation, wire_bytes(response, 0))
+            response.close()
+            break
+
+        if not getattr(response, 'from_cache', False):
+            received = wire_bytes(response, size)
+            self.metrics.add_bytes(kind, received)
+            if size > received:
+                self.metrics.add_saved('compression', size - received)
+            if self.cache:
+                self.cache.store_file(url, response, tmp_path)
+
+        result = (digest.hexdigest(), size)
+        encoding = self._text_encoding(head, response.headers.get('Content-Type', '')) if text else None
+        if encoding:
+            result = self._transcode_to_utf8(tmp_path, encoding) or result
+        os.replace(tmp_path, path)
+        return result
+
+    def _write_body(self, response, tmp_path, kind, reservation=None):
+        """Write a streamed body to tmp_path and fsync it; returns (sha256 digest, size, first bytes)
+
+        Raises requests' Timeout if the body takes longer than its Content-Length allows. With its
+        reservation in the byte budget, a body of unknown length is stopped once the wire bytes it has
+        taken are more than the budget can reserve.
+        """
+        expected = content_length(response) or 0
+        deadline = self.timeouts.deadline(kind, expected)
+        start = time.monotonic()
+        digest = hashlib.sha256()
+        size = 0
+        head = b''
+        with open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                if not head:
+                    head = chunk[:4]
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+                if reservation is not None:
+                    self.bandwidth.check(reservation, wire_bytes(response, size))
+                if deadline and time.monotonic() - start > deadline:
+                    raise requests.exceptions.Timeout(f"only {size} of {expected} bytes after {deadline:.0f}s")
+            f.flush()
+            os.fsync(f.fileno())
+        return digest, size, head
+
+    def _remove_partial(self, tmp_path):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+    def extract_zip(self, zip_path, folder_path, file_hashes):
+        """Unpack a ZIP's members into the item folder as hardlinks into the blob store
+
+        Members already in the store (shared includes and helpers) are not written again. Unsafe
+        paths and names that clash with files already in the folder are skipped.
+        """
+        extracted = 0
+        with zipfile.ZipFile(zip_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                parts = [part for part in info.filename.replace('\\', '/').split('/') if part not in ('', '.')]
+                if not parts or '..' in parts or os.path.isabs(info.filename) or ':' in parts[0]:
+                    print(f"Skipping unsafe ZIP member: {info.filename}")
+                    continue
+                relative = '/'.join(parts)
+                dest = os.path.join(folder_path, *parts)
+                if os.path.exists(dest):
+                    continue
+
+                try:
+                    file_hashes[relative] = self._extract_member(archive, info, dest)
+                except zipfile.BadZipFile as e:
+                    print(f"Skipping damaged ZIP member {info.filename}: {e}")
+                    continue
+                extracted += 1
+        return extracted
+
+    def _extract_member(self, archive, info, dest):
+        """Write one ZIP member to dest, through the blob store when there is one; returns (sha256, size)
+
+        zipfile checks the member's CRC-32 and size while it is read and raises BadZipFile on a mismatch.
+        """
+        with archive.open(info) as member:
+            if self.blobs:
+                sha256, size = self.blobs.add_stream(member)
+                self.blobs.link(sha256, dest)
+                return sha256, size
+
+            digest = hashlib.sha256()
+            size = 0
+            tmp_path = f"{dest}.download"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    for chunk in iter(lambda: member.read(DOWNLOAD_CHUNK_SIZE), b''):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            os.replace(tmp_path, dest)
+            return digest.hexdigest(), size
+
+    def sources_from_archive(self, zip_path, item, file_hashes):
+        """Take an item's listed source files out of its ZIP; returns the file names it covered
+
+        Files the ZIP lacks, that appear in it more than once with different contents, or that fail the
+        archive's CRC/size check are left for the download stage to fetch one by one.
+        """
+        folder_path = item['folder_path']
+        derived = set()
+        with zipfile.ZipFile(zip_path) as archive:
+            members = {}
+            for info in archive.infolist():
+                if not info.is_dir():
+                    members.setdefault(info.filename.replace('\\', '/').split('/')[-1], []).append(info)
+
+            for source in item.get('sources', []):
+                filename = source['filename']
+                infos = members.get(filename)
+                if not infos or len({(info.CRC, info.file_size) for info in infos}) > 1:
+                    continue
+
+                dest = os.path.join(folder_path, filename)
+                if filename not in file_hashes:
+                    try:
+                        sha256, size = self._extract_member(archive, infos[0], dest)
+                    except (zipfile.BadZipFile, zipfile.LargeZipFile, OSError) as e:
+                        print(f"{filename} in the ZIP is damaged ({e}), downloading it instead")
+                        continue
+                    if size != infos[0].file_size:
+                        continue
+                    file_hashes[filename] = (sha256, size)
+
+                if filename.endswith(TEXT_EXTENSIONS):
+                    self._store_as_utf8(dest, filename, file_hashes)
+                derived.add(filename)
+        return derived
+
+    def _store_as_utf8(self, path, name, file_hashes):
+        """Convert a local text file to UTF-8 like a downloaded one, if it is in another encoding"""
+        with open(path, 'rb') as f:
+            head = f.read(4)
+        encoding = self._text_encoding(head)
+        if not encoding:
+            return
+        # The blob stays as it was in the ZIP: the converted copy replaces the link with a new file
+        result = self._transcode_to_utf8(path, encoding)
+        if result:
+            file_hashes[name] = result
+            if self.blobs:
+                self.blobs.adopt(path, result[0])
+
+    def _text_encoding(self, head, content_type=''):
+        """Encoding a text file must be converted from, or None if its bytes are already UTF-8"""
+        if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            encoding = 'utf-16'
+        else:
+            match = re.search(r'charset=["\']?([\w.:-]+)', content_type, re.I)
+            if not match:
+                return None
+            encoding = match.group(1)
+        try:
+            name = codecs.lookup(encoding).name
+        except LookupError:
+            return None
+        return None if name in ('utf-8', 'ascii') else name
+
+    def _transcode_to_utf8(self, path, encoding):
+        """Rewrite a downloaded file as UTF-8 in place; returns its new (sha256, size), or None to keep it as is"""
+        decoder = codecs.getincrementaldecoder(encoding)()
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = f"{path}.utf8"
+        try:
+            with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                for chunk in iter(lambda: src.read(DOWNLOAD_CHUNK_SIZE), b''):
+                    data = decoder.decode(chunk).encode('utf-8')
+                    dst.write(data)
+                    digest.update(data)
+                    size += len(data)
+                data = decoder.decode(b'', final=True).encode('utf-8')
+                dst.write(data)
+                digest.update(data)
+                size += len(data)
+                dst.flush()
+                os.fsync(dst.fileno())
+        except UnicodeDecodeError:
+            # Not really text in that encoding: keep the bytes exactly as downloaded
+            os.remove(tmp_path)
+            return None
+        os.replace(tmp_path, path)
+        return digest.hexdigest(), size
+
+    def download_assets(self, item):
+        """Download an item's ZIP archive and source files, then move its folder into place
+
+        Assets over the byte budget's size limit are skipped and the item still finishes; once the run's
+        byte budget is used up the item is left unfinished for the next run.
+        """
+        folder_path = item['folder_path']
+        file_hashes = item.setdefault('file_hashes', {})
+        sources = item.get('sources', [])
+        complete = True
+
+        # Download ZIP file if found
+        if item.get('zip_url'):
+            try:
+                print(f"Downloading ZIP file for {item['title']}...")
+                zip_name = f"{item['folder_name']}.zip"
+                zip_filename = os.path.join(folder_path, zip_name)
+                result = self.download_file(item['zip_url'], zip_filename)
+                if result:
+                    file_hashes[zip_name] = result
+                    self.manifest.mark_zip_fetched(item['id'], result[0])
+                    print(f"Downloaded: {zip_filename}")
+                    if self.blobs:
+                        self.blobs.adopt(zip_filename, result[0])
+                        try:
+                            extracted = self.extract_zip(zip_filename, folder_path, file_hashes)
+                            print(f"Extracted {extracted} files from {zip_name}")
+                        except zipfile.BadZipFile as e:
+                            print(f"Could not extract {zip_name}: {e}")
+                    if self.sources_from_zip and sources:
+                        try:
+                            derived = self.sources_from_archive(zip_filename, item, file_hashes)
+                        except zipfile.BadZipFile as e:
+                            print(f"Could not read {zip_name}, downloading source files instead: {e}")
+                            derived = set()
+                        if derived:
+                            print(f"Took {len(derived)} of {len(sources)} source files from {zip_name}")
+                            sources = [source for source in sources if source['filename'] not in derived]
+                else:
+                    complete = False
+            except AssetTooLarge as e:
+                # Sources are still fetched one by one below
+                print(f"Skipping {zip_name}: {e}")
+                self.metrics.add_saved('skipped', e.size)
+            except ByteBudgetExhausted as e:
+                self._budget_exhausted(e)
+                complete = False
+                sources = []
+            except Exception as e:
+                print(f"Error downloading ZIP: {e}")
+                complete = False
+        else:
+            print(f"No ZIP download link found for {item['title']}")
+
+        # Download individual source files
+        for source in sources:
+            try:
+                print(f"Downloading source file: {source['filename']}")
+                source_filename = os.path.join(folder_path, source['filename'])
+                result = self.download_file(source['url'], source_filename,
+                                            text=source['filename'].endswith(TEXT_EXTENSIONS))
+                if result:
+                    file_hashes[source['filename']] = result
+                    if self.blobs:
+                        self.blobs.adopt(source_filename, result[0])
+                    print(f"Downloaded: {source_filename}")
+                else:
+                    complete = False
+            except AssetTooLarge as e:
+                print(f"Skipping {source['filename']}: {e}")
+                self.metrics.add_saved('skipped', e.size)
+            except ByteBudgetExhausted as e:
+                self._budget_exhausted(e)
+                complete = False
+                break
+            except Exception as e:
+                print(f"Error downloading {source['filename']}: {e}")
+                complete = False
+
+        # Incomplete items stay in their working folder and are redone on the next run
+        if not complete:
+            return False
+
+        self.finish_item(item)
+        return True
+
+    def _budget_exhausted(self, error):
+        """Drain the crawl once the byte budget refuses a download; the unfinished items wait for the next run"""
+        print(f"Byte budget: {error}")
+        self.stop('download byte budget')
+
+    def stop(self, reason=None):
+        """Drain the crawl: queued items are dropped, items already being scraped or downloaded finish"""
+        if not self.stopping.is_set():
+            print(f"\nStopping{f' on {reason}' if reason else ''}: finishing the items in progress "
+                  f"(press Ctrl+C again to stop at once)...")
+        self.stopping.set()
+
+    def crawl(self, adapters, max_pages=5, start_page=1, concurrency=None, since_last_run=False, overlap_pages=1,
+              resume=True, shard=None):
+        """Scrape one or more categories through the listing -> detail -> download pipeline
+
+        max_pages is the last listing page of every category, or {category: last page} as planned by
+        planner.ListingPlanner (a category missing from it is not listed). With shard=(index, count),
+        only every count-th listing page is crawled, so `count` crawls split the listing between them.
+
+        With since_last_run, a category stops paging once more than `overlap_pages` listing pages in a row
+        hold nothing but items finished by earlier runs (listings are ordered newest first).
+
+        SIGINT or SIGTERM drains the crawl (see stop()). With resume, a category whose previous crawl with
+        the same pages was cut short picks up where it stopped: the unfinished items of the pages it had
+        listed are queued straight from the manifest, and listing continues after the last of them.
+        """
+        concurrency = concurrency or self.concurrency
+        if concurrency > self.concurrency:
+            self._size_pool(concurrency)
+
+        labels = ', '.join(adapter.label for adapter in adapters)
+        pages = (f"pages {start_page}-{max(max_pages.values(), default=0)} as planned" if isinstance(max_pages, dict)
+                 else f"pages {start_page}-{max_pages}")
+        if shard:
+            pages += f", shard {format_shard(shard)}"
+        print(f"Starting to scrape MQL5 {labels} ({pages}, {concurrency} workers per stage, "
+              f"{self.parser} parser{', HTTP/2' if self.http2 else ''})...")
+
+        totals = {adapter.name: 0 for adapter in adapters}
+
+        if self.extract_workers:
+            self.extract_pool = ExtractionPool(self.base_url, self.parser, self.extract_workers,
+                                               min(self.extract_batch, concurrency))
+            print(f"Parsing detail pages in {self.extract_pool.workers} worker processes "
+                  f"(batches of up to {self.extract_pool.batch_size})")
+
+        self.stopping.clear()
+        try:
+            with drain_on_signal(self.stop):
+                asyncio.run(self._crawl(adapters, max_pages, start_page, concurrency, totals,
+                                        since_last_run, overlap_pages, resume, shard))
+        except KeyboardInterrupt:
+            print("\nScraping interrupted by user")
+        finally:
+            self.limiter.save()
+            if self.extract_pool:
+                pool, self.extract_pool = self.extract_pool, None
+                pool.shutdown()
+                print(f"Extraction pool: {pool.pages} pages in {pool.batches} batches")
+            if self.catalog:
+                self.catalog.flush()
+
+        if self.cache:
+            print(f"HTTP cache: {self.cache.hits} not-modified responses served from disk, "
+                  f"{self.cache.misses} full downloads")
+        if self.catalog and self.catalog.written:
+            print(f"Catalog: {self.catalog.written} records in {self.catalog.root} ({self.catalog.format})")
+        if self.blobs:
+            # Blobs only the store itself links to belong to files that have since been replaced
+            removed, freed = self.blobs.collect_garbage()
+            print(f"Blob store: {self.blobs.stored} new files, {self.blobs.reused} duplicates linked "
+                  f"({self.blobs.bytes_saved / 1024 / 1024:.1f} MB not stored twice), "
+                  f"{removed} unused blobs removed ({freed / 1024 / 1024:.1f} MB)")
+
+        print(self.metrics.summary())
+        print(self.metrics.bandwidth_report())
+        if self.bandwidth:
+            cap = self.bandwidth.max_bytes
+            print(f"Byte budget: {self.bandwidth.used / 1024 / 1024:.1f} MB of "
+                  f"{f'{cap / 1024 / 1024:g} MB' if cap is not None else 'unlimited'} downloaded, "
+                  f"{self.bandwidth.skipped} assets over the size limit skipped")
+        summary = ', '.join(f"{count} {adapter.label}" for adapter, count in zip(adapters, totals.values()))
+        if self.stopping.is_set():
+            print(f"\nScraping stopped after listing {summary}; the next run resumes where this one stopped.")
+        else:
+            print(f"\nScraping completed! Processed {summary}.")
+        return totals
+
+    async def _crawl(self, adapters, max_pages, start_page, concurrency, totals, since_last_run, overlap_pages,
+                     resume, shard):
+        """Run listing, detail and download stages side by side, joined by bounded queues"""
+        # Blocking requests/BeautifulSoup work runs on worker threads; asyncio only schedules it
+        workers = 2 * concurrency + len(adapters)
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=workers))
+
+        # Bounded queues give backpressure: listing stalls while detail workers are busy, so memory stays flat
+        detail_queue = asyncio.Queue(maxsize=2 * concurrency)
+        download_queue = asyncio.Queue(maxsize=2 * concurrency)
+        self.metrics.set_gauge('queue_depth', detail_queue.qsize, queue='detail')
+        self.metrics.set_gauge('queue_depth', download_queue.qsize, queue='download')
+        self.metrics.set_gauge('rate_limit_requests_per_second', lambda: self.limiter.rate)
+        if self.breaker:
+            self.metrics.set_gauge('circuit_breaker_open', lambda: int(self.breaker.is_open))
+
+        detail_workers = [asyncio.create_task(self._detail_worker(detail_queue, download_queue))
+                          for _ in range(concurrency)]
+        download_workers = [asyncio.create_task(self._download_worker(download_queue))
+                            for _ in range(concurrency)]
+
+        try:
+            # Page N+1 of each category is listed while page N's items are still in the later stages
+            last_pages = {adapter.name: max_pages.get(adapter.name, 0) if isinstance(max_pages, dict) else max_pages
+                          for adapter in adapters}
+            await asyncio.gather(*(self._list_pages(adapter, last_pages[adapter.name], start_page, detail_queue,
+                                                    totals, since_last_run, overlap_pages, resume, shard)
+                                   for adapter in adapters))
+            await detail_queue.join()
+            await download_queue.join()
+        finally:
+            for task in detail_workers + download_workers:
+                task.cancel()
+            await asyncio.gather(*detail_workers, *download_workers, return_exceptions=True)
+            self.metrics.remove_gauge('queue_depth', queue='detail')
+            self.metrics.remove_gauge('queue_depth', queue='download')
+
+    async def _list_pages(self, adapter, max_pages, start_page, detail_queue, totals, since_last_run, overlap_pages,
+                          resume, shard=None):
+        """Listing stage: walk one category's pages (of its shard) and queue every item for the detail stage"""
+        known_pages = 0  # Consecutive listing pages with nothing new on them
+
+        first_page = await self._resume(adapter, start_page, max_pages, detail_queue, totals, resume, shard)
+        if first_page is None:
+            return
+
+        for page in range(first_page, max_pages + 1):
+            if shard and not in_shard(page, shard, start_page):
+                continue
+            if self.stopping.is_set():
+                return
+            if self.budget_exhausted():
+                print(f"Request budget exhausted, stopping {adapter.label}...")
+                return
+
+            try:
+                item_links = await asyncio.to_thread(self.fetch_listing, adapter, page)
+            except Exception as e:
+                print(f"Error on {adapter.label} page {page}: {e}")
+                continue
+
+            if self.stopping.is_set():
+                return
+            if item_links is None:
+                # Left unfinished, so the next run resumes at this page
+                print(f"Could not list page {page}, stopping {adapter.label}...")
+                return
+            if not item_links:
+                print(f"No {adapter.label} found on page {page}, stopping {adapter.label}...")
+                self.manifest.finish_checkpoint(adapter.name)
+                return
+
+            print(f"Found {len(item_links)} {adapter.label} on page {page}")
+            totals[adapter.name] += len(item_links)
+            done_ids = set() if self.refresh else self.manifest.done_ids(item['id'] for item in item_links)
+
+            if since_last_run and len(done_ids) == len(item_links):
+                known_pages += 1
+                if known_pages > overlap_pages:
+                    print(f"Page {page} only has {adapter.label} from earlier runs, stopping {adapter.label}...")
+                    self.manifest.finish_checkpoint(adapter.name)
+                    return
+                print(f"Page {page} has nothing new ({known_pages}/{overlap_pages} overlap pages), checking the next page...")
+                self.manifest.advance_checkpoint(adapter.name, page)
+                continue
+            known_pages = 0
+
+            for i, item in enumerate(item_links, 1):
+                if item['id'] in done_ids:
+                    print(f"Already downloaded, skipping: {item['title']}")
+                    continue
+                self.manifest.mark_listed(adapter.name, item, page)
+
+                # Blocks while the detail queue is full
+                await detail_queue.put((adapter, f"{adapter.label} page {page}, Item {i}/{len(item_links)}", item))
+                if self.stopping.is_set():
+                    return
+
+            # Every item of the page is in the manifest: a resumed crawl takes them from there
+            self.manifest.advance_checkpoint(adapter.name, page)
+            print(f"Queued {adapter.label} page {page}, listing the next page...")
+
+        self.manifest.finish_checkpoint(adapter.name)
+
+    async def _resume(self, adapter, start_page, max_pages, detail_queue, totals, resume, shard=None):
+        """Start a category's checkpoint, or pick up an interrupted one; returns the first page left to list
+
+        An interrupted crawl's unfinished items are queued in the order they were listed. Returns None
+        if the crawl is stopped while they are being queued.
+        """
+        shard_name = format_shard(shard) if shard else None
+        checkpoint = self.manifest.checkpoint(adapter.name) if resume else None
+        if (not checkpoint or checkpoint['finished'] or checkpoint['last_page'] is None
+                or (checkpoint['start_page'], checkpoint['max_pages'], checkpoint['shard'])
+                != (start_page, max_pages, shard_name)):
+            self.manifest.start_checkpoint(adapter.name, start_page, max_pages, shard_name)
+            return start_page
+
+        last_page = checkpoint['last_page']
+        since = checkpoint['started_at'] if self.refresh else None
+        links = [link for link in self.manifest.unfinished_items(adapter.name, start_page, last_page, since)
+                 if not shard or in_shard(link['page'], shard, start_page)]
+        print(f"Resuming {adapter.label}: {len(links)} unfinished items from pages {start_page}-{last_page}, "
+              f"then listing from page {last_page + 1}")
+        totals[adapter.name] += len(links)
+        for i, link in enumerate(links, 1):
+            if self.stopping.is_set():
+                return None
+            await detail_queue.put((adapter, f"{adapter.label} resumed item {i}/{len(links)} (page {link['page']})", link))
+        return last_page + 1
+
+    def _scrape_detail(self, adapter, link):
+        """Run an adapter's detail stage; the time it spends off the network is the page's parse time"""
+        start = time.perf_counter()
+        io_start = self.metrics.io_time()
+        item = adapter.scrape_detail(link['url'], link['title'], link['id'])
+        if item:
+            item['category'] = adapter.name
+            self.metrics.observe_parse('detail', time.perf_counter() - start - (self.metrics.io_time() - io_start))
+        return item
+
+    async def _detail_worker(self, detail_queue, download_queue):
+        """Detail stage: fetch item pages, save their information and hand them to the download stage"""
+        while True:
+            adapter, position, link = await detail_queue.get()
+            try:
+                # Draining: items not started yet stay 'listed' in the manifest for the next run
+                if self.budget_exhausted() or self.stopping.is_set():
+                    continue
+
+                print(f"[{position}] Processing: {link['title']}")
+                item = await asyncio.to_thread(self._scrape_detail, adapter, link)
+
+                if item:
+                    self.manifest.mark_metadata_written(item, item.get('metadata_path'))
+                    await download_queue.put((adapter, item))
+                else:
+                    print(f"Failed to process: {link['title']}")
+            except Exception as e:
+                print(f"Error processing {link['title']}: {e}")
+            finally:
+                detail_queue.task_done()
+
+    async def _download_worker(self, download_queue):
+        """Download stage: fetch each item's ZIP archive and source files"""
+        while True:
+            adapter, item = await download_queue.get()
+            try:
+                success = await asyncio.to_thread(adapter.download_assets, item)
+
+                if success:
+                    print(f"Successfully processed: {item['title']}")
+                else:
+                    print(f"Failed to process: {item['title']}")
+            except Exception as e:
+                print(f"Error downloading files for {item['title']}: {e}")
+            finally:
+                download_queue.task_done()
@@ -0,0 +1,95 @@
+import re
+from dataclasses import dataclass, fields
+
+# Fields whose values are counts written with thousands separators ("1,234")
+COUNT_FIELDS = ('views', 'downloads', 'favorites', 'comments')
+
+# Characters of page text kept either side of the statistic labels
+BLOCK_MARGIN = 300
+
+# Characters before a colon that may hold a label such as "Last updated"
+LABEL_WINDOW = 30
+
+# Leading label of a pattern like r'File\s+Size:\s*(...)'
+LABEL_PREFIX = re.compile(r'^([A-Za-z][A-Za-z\\s+?]*):')
+
+
+@dataclass
+class PageMetadata:
+    """Statistics found on a codebase item page; None where the page does not show them"""
+    views: int = None
+    rating: float = None
+    max_rating: int = None
+    published: str = None
+    updated: str = None
+    downloads: int = None
+    favorites: int = None
+    comments: int = None
+    version: str = None
+    file_size: str = None
+
+    def as_dict(self):
+        """The fields that were found, as the rating_info dict the information files are written from"""
+        return {field.name: getattr(self, field.name) for field in fields(self)
+                if getattr(self, field.name) is not None}
+
+
+class MetadataExtractor:
+    """Fill a PageMetadata from page text, scanning the whole text only once
+
+    `patterns` maps each field to its regexes in order of preference, exactly like the cascades of
+    re.search they replace: the first pattern that matches wins. The single pass over the page finds
+    the statistic labels ("Views:", "Published:", ...) by their colons; the patterns then only run over
+    the metadata block around those labels instead of over the whole page. Pages without any label
+    fall back to searching the whole text.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = {field: [re.compile(pattern, re.IGNORECASE) for pattern in field_patterns]
+                         for field, field_patterns in patterns.items()}
+        # "Views?:" -> "Views?": the label words, matched just before a colon
+        labels = sorted({match.group(1) for field_patterns in patterns.values() for pattern in field_patterns
+                         for match in [LABEL_PREFIX.match(pattern)] if match})
+        self._label = re.compile(f"(?:{'|'.join(labels)})\\s*$", re.IGNORECASE) if labels else None
+
+    def metadata_block(self, text):
+        """The stretch of text from the first to the last statistic label, with a margin, or None"""
+        if self._label is None:
+            return None
+        first = last = None
+        colon = text.find(':')
+        while colon != -1:
+            if self._label.search(text, max(0, colon - LABEL_WINDOW), colon):
+                if first is None:
+                    first = colon
+                last = colon
+            colon = text.find(':', colon + 1)
+        if first is None:
+            return None
+        return text[max(0, first - LABEL_WINDOW - BLOCK_MARGIN):last + BLOCK_MARGIN]
+
+    def extract(self, text):
+        """Return the PageMetadata found in a page's text"""
+        block = self.metadata_block(text)
+        if block is None:
+            block = text
+
+        metadata = PageMetadata()
+        for field, field_patterns in self.patterns.items():
+            for pattern in field_patterns:
+                match = pattern.search(block)
+                if match:
+                    self._assign(metadata, field, match.groups())
+                    break
+        return metadata
+
+    def _assign(self, metadata, field, groups):
+        value = groups[0]
+        if field in COUNT_FIELDS:
+            setattr(metadata, field, int(value.replace(',', '')))
+        elif field == 'rating':
+            metadata.rating = float(value)
+            if len(groups) > 1:
+                metadata.max_rating = int(groups[1])
+        else:
+            setattr(metadata, field, value)
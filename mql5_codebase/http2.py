@@ -0,0 +1,182 @@
+import os
+import ssl
+import asyncio
+import threading
+import importlib.util
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Headers that only mean something to one HTTP/1.1 connection; HTTP/2 forbids them
+HOP_BY_HOP_HEADERS = frozenset(('connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade'))
+
+
+def http2_available():
+    """Whether httpx and its HTTP/2 support (h2) are installed"""
+    return importlib.util.find_spec('httpx') is not None and importlib.util.find_spec('h2') is not None
+
+
+def _translate(error):
+    """The requests exception the rest of the crawl expects for an httpx one"""
+    import httpx
+
+    if isinstance(error, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(str(error))
+    if isinstance(error, httpx.TimeoutException):
+        return requests.exceptions.ReadTimeout(str(error))
+    if isinstance(error, (httpx.InvalidURL, httpx.UnsupportedProtocol)):
+        return requests.exceptions.InvalidURL(str(error))
+    if isinstance(error, httpx.DecodingError):
+        return requests.exceptions.ContentDecodingError(str(error))
+    if isinstance(error, (httpx.ReadError, httpx.RemoteProtocolError)):
+        # The connection or stream broke after the response started, like a cut-off HTTP/1.1 body
+        return requests.exceptions.ChunkedEncodingError(str(error))
+    return requests.exceptions.ConnectionError(str(error))
+
+
+def ssl_context(verify=True, cert=None):
+    """An SSL context for requests' verify (True, False or a CA bundle file/directory) and cert arguments"""
+    if isinstance(verify, str):
+        context = ssl.create_default_context(**{'capath' if os.path.isdir(verify) else 'cafile': verify})
+    else:
+        context = ssl.create_default_context()
+        if not verify:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+    if isinstance(cert, tuple):
+        context.load_cert_chain(*cert)
+    elif cert:
+        context.load_cert_chain(cert)
+    return context
+
+
+class _StreamedBody:
+    """The raw body of a requests.Response read from an httpx response on the adapter's event loop
+
+    Chunks come out decoded (gzip/deflate, and br when brotli is installed); tell() counts the bytes
+    that came over the wire, as urllib3's does.
+    """
+
+    def __init__(self, adapter, response):
+        self._adapter = adapter
+        self._response = response
+        self._chunks = None
+
+    def stream(self, chunk_size=None, decode_content=True):
+        import httpx
+
+        chunks = self._response.aiter_bytes(chunk_size)
+        while True:
+            try:
+                yield self._adapter.run(chunks.__anext__())
+            except StopAsyncIteration:
+                return
+            except httpx.HTTPError as e:
+                raise _translate(e) from e
+
+    def read(self, amt=None, decode_content=True):
+        if self._chunks is None:
+            self._chunks = self.stream(amt)
+        return next(self._chunks, b'')
+
+    def tell(self):
+        return self._response.num_bytes_downloaded
+
+    def close(self):
+        if not self._response.is_closed:
+            self._adapter.run(self._response.aclose())
+
+    def release_conn(self):
+        self.close()
+
+
+class HTTP2Adapter(BaseAdapter):
+    """A requests transport that sends through httpx, so concurrent requests share one HTTP/2 connection
+
+    Mounted on a requests.Session in place of the usual HTTPAdapter: everything above it (cache,
+    metrics, streaming downloads, error handling) keeps working with requests.Response objects. Servers
+    that do not offer HTTP/2 (no h2 in the TLS handshake, or plain http://) are spoken to over HTTP/1.1.
+
+    httpx's synchronous HTTP/2 connection is not safe to share between threads, so the connection
+    belongs to one event loop on a thread of its own; the crawl's threads hand it their requests and
+    read the bodies back from it chunk by chunk.
+    """
+
+    def __init__(self, max_connections=10, http1=True):
+        super().__init__()
+        if not http2_available():
+            raise ValueError("HTTP/2 needs httpx with h2 (pip install 'httpx[http2]')")
+        self.max_connections = max_connections
+        self.http1 = http1  # False: speak HTTP/2 even over plain http:// (prior knowledge, for test servers)
+        self._clients = {}  # (verify, cert) -> httpx.AsyncClient
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def run(self, coroutine):
+        """Run a coroutine on the connection's event loop and wait for its result"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='http2-connection', daemon=True)
+                self._thread.start()
+            loop = self._loop
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    def _client(self, verify, cert):
+        import httpx
+
+        key = (verify, cert)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                limits = httpx.Limits(max_connections=self.max_connections,
+                                      max_keepalive_connections=self.max_connections)
+                client = httpx.AsyncClient(http1=self.http1, http2=True, verify=ssl_context(verify, cert),
+                                           limits=limits)
+                self._clients[key] = client
+        return client
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        import httpx
+
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            timeout = httpx.Timeout(read, connect=connect)
+        else:
+            timeout = httpx.Timeout(timeout)
+        headers = [(name, value) for name, value in request.headers.items()
+                   if name.lower() not in HOP_BY_HOP_HEADERS]
+
+        client = self._client(verify, cert)
+        try:
+            sent = self.run(client.send(client.build_request(request.method, request.url, headers=headers,
+                                                             content=request.body, timeout=timeout), stream=True))
+        except httpx.HTTPError as e:
+            raise _translate(e) from e
+
+        response = requests.Response()
+        response.status_code = sent.status_code
+        response.reason = sent.reason_phrase
+        response.headers = CaseInsensitiveDict(sent.headers.items())
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _StreamedBody(self, sent)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.http_version = sent.http_version
+        return response
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+            loop, thread, self._loop, self._thread = self._loop, self._thread, None, None
+        if loop is None:
+            return
+        for client in clients:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
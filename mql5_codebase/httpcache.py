@@ -0,0 +1,200 @@
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class HTTPCache:
+    """On-disk response bodies plus their ETag/Last-Modified validators, evicted LRU by size and age"""
+
+    def __init__(self, cache_dir, max_bytes=1024 ** 3, max_age_days=90):
+        self.cache_dir = cache_dir
+        self.bodies_dir = os.path.join(cache_dir, 'bodies')
+        self.max_bytes = max_bytes  # Total size of stored bodies before least recently used ones go
+        self.max_age = max_age_days * 86400  # Entries not revalidated for this long are dropped
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+        os.makedirs(self.bodies_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite'), check_same_thread=False)
+        self._db.execute('''CREATE TABLE IF NOT EXISTS entries (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_type TEXT,
+            size INTEGER NOT NULL,
+            stored_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+        self._db.commit()
+        self.evict()
+
+    def _body_path(self, url):
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.bodies_dir, digest[:2], digest)
+
+    def _entry(self, url):
+        row = self._db.execute('SELECT etag, last_modified, content_type, size FROM entries WHERE url = ?',
+                               (url,)).fetchone()
+        if row and not os.path.exists(self._body_path(url)):
+            # Body went missing: forget the validators so the server sends the full response
+            self._db.execute('DELETE FROM entries WHERE url = ?', (url,))
+            self._db.commit()
+            return None
+        return row
+
+    def conditional_headers(self, url):
+        """Validators to send with a GET for a URL we already hold"""
+        with self._lock:
+            entry = self._entry(url)
+        if not entry:
+            return {}
+
+        etag, last_modified, _, _ = entry
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def _cacheable(self, response):
+        """Only 200s that carry a validator are worth keeping"""
+        if response.status_code != 200:
+            return False
+        if not (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+            return False
+        return 'no-store' not in response.headers.get('Cache-Control', '')
+
+    def _index(self, url, response, size):
+        now = time.time()
+        with self._lock:
+            previous = self._db.execute('SELECT size FROM entries WHERE url = ?', (url,)).fetchone()
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             (url, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                              response.headers.get('Content-Type'), size, now, now))
+            self._db.commit()
+            self.total_bytes += size - (previous[0] if previous else 0)
+            over_budget = self.total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def store(self, url, response):
+        """Keep a 200 response's body if the server gave us a validator to revalidate it with"""
+        self.misses += 1
+        if not self._cacheable(response):
+            return False
+
+        body = response.content
+        path = self._body_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+        self._index(url, response, len(body))
+        return True
+
+    def store_file(self, url, response, file_path):
+        """Keep a streamed response whose body was already written to file_path, hardlinking it where possible"""
+        self.misses += 1
+        if not self._cacheable(response):
+            return False
+
+        path = self._body_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        try:
+            # Same file system: the cache entry costs no extra space and no copy
+            os.link(file_path, tmp_path)
+        except OSError:
+            shutil.copyfile(file_path, tmp_path)
+        os.replace(tmp_path, path)
+
+        self._index(url, response, os.path.getsize(path))
+        return True
+
+    def cached_response(self, url, not_modified, stream=False):
+        """Turn a 304 into the full 200 response we stored earlier, or None if the body is gone
+
+        With stream, the body is left on disk and read through iter_content like a network response.
+        """
+        with self._lock:
+            entry = self._entry(url)
+            if entry:
+                self._db.execute('UPDATE entries SET last_used = ? WHERE url = ?', (time.time(), url))
+                self._db.commit()
+        if not entry:
+            return None
+
+        try:
+            if stream:
+                body_file = open(self._body_path(url), 'rb')
+            else:
+                with open(self._body_path(url), 'rb') as f:
+                    body = f.read()
+        except OSError:
+            return None
+
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = url
+        response.request = not_modified.request
+        response.headers = CaseInsensitiveDict(not_modified.headers)
+        if entry[2]:
+            response.headers['Content-Type'] = entry[2]
+        if stream:
+            response.headers['Content-Length'] = str(os.fstat(body_file.fileno()).st_size)
+            response.raw = body_file
+        else:
+            response.headers['Content-Length'] = str(len(body))
+            response._content = body
+        response.from_cache = True
+        self.hits += 1
+        return response
+
+    def evict(self):
+        """Drop entries older than max_age, then least recently used ones until under max_bytes"""
+        with self._lock:
+            cutoff = time.time() - self.max_age
+            doomed = [url for (url,) in self._db.execute('SELECT url FROM entries WHERE last_used < ?', (cutoff,))]
+
+            total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries WHERE last_used >= ?',
+                                     (cutoff,)).fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._db.execute('SELECT url, size FROM entries WHERE last_used >= ? ORDER BY last_used',
+                                        (cutoff,))
+                for url, size in rows.fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    doomed.append(url)
+                    total -= size
+
+            for url in doomed:
+                self._db.execute('DELETE FROM entries WHERE url = ?', (url,))
+                try:
+                    os.remove(self._body_path(url))
+                except OSError:
+                    pass
+            if doomed:
+                self._db.commit()
+            self.total_bytes = total
+        return len(doomed)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,233 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Files whose text goes into the index, by column
+SOURCE_EXTENSIONS = ('.mq5', '.mq4', '.mqh')
+DESCRIPTION_EXTENSIONS = ('.txt',)
+
+# Only the start of very large files is indexed
+MAX_FILE_BYTES = 2 * 1024 * 1024
+
+# BM25 weight of each indexed column: title, author, description, source
+COLUMN_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+# Identifiers in source, and the words inside them: TrailingStop -> Trailing, Stop; iMA -> i, MA
+IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+WORD_PATTERN = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+
+def tokenize_source(text):
+    """MQL5 source as space-separated search tokens
+
+    Every identifier is kept whole and followed by the words it is made of, so both `TrailingStop`
+    and `trailing stop` find a function called TrailingStop. Comments are kept; operators, literals
+    and punctuation are dropped.
+    """
+    tokens = []
+    for identifier in IDENTIFIER_PATTERN.findall(text):
+        tokens.append(identifier)
+        words = WORD_PATTERN.findall(identifier)
+        if len(words) > 1:
+            tokens.extend(words)
+    return ' '.join(tokens)
+
+
+def read_text(path):
+    """A downloaded text file as str (the engine converts sources to UTF-8, but not every file went through it)"""
+    with open(path, 'rb') as f:
+        data = f.read(MAX_FILE_BYTES)
+    if data.startswith((b'\xff\xfe', b'\xfe\xff')):
+        return data.decode('utf-16', errors='replace')
+    return data.decode('utf-8-sig', errors='replace')
+
+
+def fingerprint(title, files):
+    """Hash of the title and indexed files an item's document is built from; files maps name -> (sha256, size)"""
+    digest = hashlib.sha256()
+    digest.update(f"{title}\0".encode('utf-8'))
+    for name, (sha256, _) in sorted(files.items()):
+        if name.lower().endswith(SOURCE_EXTENSIONS + DESCRIPTION_EXTENSIONS):
+            digest.update(f"{name}\0{sha256}\0".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def plain_query(query):
+    """A query as FTS5 syntax that matches all its words, for input that is not valid FTS5"""
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"' for word in words)
+
+
+class SearchIndex:
+    """SQLite FTS5 index with one document per finished item, kept up to date incrementally
+
+    An item's document is rebuilt only when its fingerprint changes: its title and the hashes of its
+    description and source files, taken from the manifest, so unchanged items are never read back.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS items (
+                docid INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                category TEXT NOT NULL,
+                title TEXT,
+                url TEXT,
+                folder TEXT,
+                fingerprint TEXT NOT NULL,
+                indexed_at REAL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+                title, author, description, source, tokenize = 'unicode61 remove_diacritics 2'
+            );
+        ''')
+        # rank (and ORDER BY rank) is BM25 with the column weights
+        self._db.execute("INSERT INTO documents (documents, rank) VALUES ('rank', ?)",
+                         (f"bm25({', '.join(map(str, COLUMN_WEIGHTS))})",))
+        self._db.commit()
+
+    def update_item(self, item_id, category, title, url, folder, files, author=None):
+        """(Re)index one finished item if anything it is built from changed; returns True if it was indexed"""
+        item_id = str(item_id)
+        current = fingerprint(title, files)
+        with self._lock:
+            row = self._db.execute('SELECT docid, fingerprint FROM items WHERE id = ?', (item_id,)).fetchone()
+        if row and row[1] == current:
+            return False
+
+        descriptions = []
+        sources = []
+        for name in sorted(files):
+            lower = name.lower()
+            if not lower.endswith(SOURCE_EXTENSIONS + DESCRIPTION_EXTENSIONS):
+                continue
+            try:
+                text = read_text(os.path.join(folder, name))
+            except OSError:
+                continue
+            if lower.endswith(SOURCE_EXTENSIONS):
+                # The file name goes in too, so an item can be found by the include files it ships
+                sources.append(tokenize_source(name) + '\n' + tokenize_source(text))
+            else:
+                descriptions.append(text)
+
+        document = (title, author, '\n'.join(descriptions), '\n'.join(sources))
+        with self._lock:
+            if row:
+                docid = row[0]
+                self._db.execute('DELETE FROM documents WHERE rowid = ?', (docid,))
+                self._db.execute('''UPDATE items SET category = ?, title = ?, url = ?, folder = ?, fingerprint = ?,
+                                    indexed_at = ? WHERE docid = ?''',
+                                 (category, title, url, folder, current, time.time(), docid))
+            else:
+                docid = self._db.execute('''INSERT INTO items (id, category, title, url, folder, fingerprint, indexed_at)
+                                            VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                                         (item_id, category, title, url, folder, current, time.time())).lastrowid
+            self._db.execute('INSERT INTO documents (rowid, title, author, description, source) VALUES (?, ?, ?, ?, ?)',
+                             (docid,) + document)
+            self._db.commit()
+        return True
+
+    def remove_item(self, item_id):
+        with self._lock:
+            row = self._db.execute('SELECT docid FROM items WHERE id = ?', (str(item_id),)).fetchone()
+            if row:
+                self._db.execute('DELETE FROM documents WHERE rowid = ?', (row[0],))
+                self._db.execute('DELETE FROM items WHERE docid = ?', (row[0],))
+                self._db.commit()
+
+    def sync(self, manifest, authors=None):
+        """Bring the index in line with every finished item in a manifest
+
+        `authors` maps item ID -> author name (from the catalog). Returns (indexed, unchanged, removed).
+        """
+        authors = authors or {}
+        indexed = unchanged = 0
+        done = set()
+        for item in manifest.done_items():
+            if not item['folder'] or not os.path.isdir(item['folder']):
+                continue
+            done.add(item['id'])
+            if self.update_item(item['id'], item['category'], item['title'], item['url'], item['folder'],
+                                item['files'], authors.get(item['id'])):
+                indexed += 1
+            else:
+                unchanged += 1
+
+        with self._lock:
+            stale = [row[0] for row in self._db.execute('SELECT id FROM items') if row[0] not in done]
+        for item_id in stale:
+            self.remove_item(item_id)
+        return indexed, unchanged, len(stale)
+
+    def search(self, query, limit=20, category=None):
+        """Best matches first: dicts with the item's id, category, title, url, folder, score and a snippet"""
+        sql = '''SELECT i.id, i.category, i.title, i.url, i.folder, documents.rank,
+                         snippet(documents, -1, '[', ']', '...', 16)
+                  FROM documents JOIN items i ON i.docid = documents.rowid
+                  WHERE documents MATCH ?'''
+        params = [query]
+        if category:
+            sql += ' AND i.category = ?'
+            params.append(category)
+        sql += ' ORDER BY documents.rank LIMIT ?'
+        params.append(limit)
+
+        with self._lock:
+            try:
+                rows = self._db.execute(sql, params).fetchall()
+            except sqlite3.OperationalError:
+                # Not valid FTS5 syntax (a stray quote, a bare operator): search the words instead
+                params[0] = plain_query(query)
+                if not params[0]:
+                    return []
+                rows = self._db.execute(sql, params).fetchall()
+        # BM25 is lower for better matches; flip it so a higher score means a better match
+        return [{'id': item_id, 'category': item_category, 'title': title, 'url': url, 'folder': folder,
+                 'score': -score, 'snippet': snippet}
+                for item_id, item_category, title, url, folder, score, snippet in rows]
+
+    def count(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def rebuild(self):
+        """Forget every document so the next sync indexes everything again"""
+        with self._lock:
+            self._db.execute('DELETE FROM documents')
+            self._db.execute('DELETE FROM items')
+            self._db.commit()
+
+    def optimize(self):
+        """Merge the FTS5 index segments (worth doing after a large sync)"""
+        with self._lock:
+            self._db.execute("INSERT INTO documents (documents) VALUES ('optimize')")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def catalog_authors(root):
+    """Item ID -> author from the catalog, latest record winning"""
+    from .catalog import read_catalog
+    authors = {}
+    latest = {}
+    for record in read_catalog(root):
+        scraped_at = record.get('scraped_at') or 0
+        if record.get('author') and scraped_at >= latest.get(record['id'], 0):
+            authors[record['id']] = record['author']
+            latest[record['id']] = scraped_at
+    return authors
+
+
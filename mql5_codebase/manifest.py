@@ -0,0 +1,218 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Item states, in the order an item moves through the crawl
+STATES = ('listed', 'metadata_written', 'zip_fetched', 'done')
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Hash a file without reading it into memory in one go"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CrawlManifest:
+    """SQLite (WAL) record of every codebase item, keyed by codebase ID, and how far it got"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS items (
+                id TEXT PRIMARY KEY,
+                category TEXT NOT NULL,
+                title TEXT,
+                url TEXT,
+                page INTEGER,
+                state TEXT NOT NULL,
+                folder TEXT,
+                page_sha256 TEXT,
+                metadata_sha256 TEXT,
+                zip_sha256 TEXT,
+                listed_at REAL,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS items_category_state ON items (category, state);
+            CREATE TABLE IF NOT EXISTS files (
+                item_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (item_id, name)
+            );
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                category TEXT PRIMARY KEY,
+                start_page INTEGER NOT NULL,
+                max_pages INTEGER NOT NULL,
+                last_page INTEGER,
+                finished INTEGER NOT NULL DEFAULT 0,
+                started_at REAL,
+                updated_at REAL,
+                shard TEXT
+            );
+        ''')
+        # Manifests from before sharded crawls have no shard column
+        columns = {row[1] for row in self._db.execute('PRAGMA table_info(checkpoints)')}
+        if 'shard' not in columns:
+            self._db.execute('ALTER TABLE checkpoints ADD COLUMN shard TEXT')
+        self._db.commit()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            self._db.execute(sql, params)
+            self._db.commit()
+
+    def state(self, item_id):
+        """Current state of an item, or None if it has never been listed"""
+        with self._lock:
+            row = self._db.execute('SELECT state FROM items WHERE id = ?', (str(item_id),)).fetchone()
+        return row[0] if row else None
+
+    def is_done(self, item_id):
+        return self.state(item_id) == 'done'
+
+    def done_ids(self, item_ids):
+        """The subset of item IDs that were completely ingested by an earlier run"""
+        item_ids = [str(item_id) for item_id in item_ids]
+        if not item_ids:
+            return set()
+        placeholders = ', '.join('?' * len(item_ids))
+        with self._lock:
+            rows = self._db.execute(f"SELECT id FROM items WHERE state = 'done' AND id IN ({placeholders})", item_ids)
+            return {row[0] for row in rows}
+
+    def folder_owner(self, folder):
+        """ID of the item whose files live in a folder, if any"""
+        with self._lock:
+            row = self._db.execute('SELECT id FROM items WHERE folder = ?', (folder,)).fetchone()
+        return row[0] if row else None
+
+    def mark_listed(self, category, link, page):
+        """Record an item seen on a listing page without losing progress from earlier runs"""
+        now = time.time()
+        self._execute('''INSERT INTO items (id, category, title, url, page, state, listed_at, updated_at)
+                         VALUES (?, ?, ?, ?, ?, 'listed', ?, ?)
+                         ON CONFLICT (id) DO UPDATE SET title = excluded.title, url = excluded.url,
+                                                        page = excluded.page, listed_at = excluded.listed_at''',
+                      (str(link['id']), category, link['title'], link['url'], page, now, now))
+
+    def mark_metadata_written(self, item, metadata_path=None):
+        """The detail page was fetched and its information file written"""
+        metadata_sha256 = file_sha256(metadata_path) if metadata_path and os.path.exists(metadata_path) else None
+        self._execute('''UPDATE items SET state = 'metadata_written', page_sha256 = ?, metadata_sha256 = ?,
+                                          updated_at = ? WHERE id = ?''',
+                      (item.get('page_sha256'), metadata_sha256, time.time(), str(item['id'])))
+
+    def mark_zip_fetched(self, item_id, zip_sha256):
+        self._execute("UPDATE items SET state = 'zip_fetched', zip_sha256 = ?, updated_at = ? WHERE id = ?",
+                      (zip_sha256, time.time(), str(item_id)))
+
+    def mark_done(self, item_id, folder, files):
+        """The item's folder is complete and in place; files maps file name -> (sha256, size)"""
+        with self._lock:
+            self._db.execute('DELETE FROM files WHERE item_id = ?', (str(item_id),))
+            self._db.executemany('INSERT INTO files VALUES (?, ?, ?, ?)',
+                                 [(str(item_id), name, sha256, size) for name, (sha256, size) in files.items()])
+            self._db.execute("UPDATE items SET state = 'done', folder = ?, updated_at = ? WHERE id = ?",
+                             (folder, time.time(), str(item_id)))
+            self._db.commit()
+
+    def counts(self, category=None):
+        """Number of items in each state"""
+        sql = 'SELECT state, COUNT(*) FROM items'
+        params = ()
+        if category:
+            sql += ' WHERE category = ?'
+            params = (category,)
+        with self._lock:
+            return dict(self._db.execute(sql + ' GROUP BY state', params).fetchall())
+
+    def checkpoint(self, category):
+        """Where the last crawl of a category got to: {start_page, max_pages, shard, last_page, finished, started_at}"""
+        with self._lock:
+            row = self._db.execute('''SELECT start_page, max_pages, shard, last_page, finished, started_at
+                                      FROM checkpoints WHERE category = ?''', (category,)).fetchone()
+        if not row:
+            return None
+        start_page, max_pages, shard, last_page, finished, started_at = row
+        return {'start_page': start_page, 'max_pages': max_pages, 'shard': shard, 'last_page': last_page,
+                'finished': bool(finished), 'started_at': started_at}
+
+    def start_checkpoint(self, category, start_page, max_pages, shard=None):
+        """A new crawl of a category begins; nothing of it is listed yet. shard is e.g. '2/4' for a sharded crawl"""
+        now = time.time()
+        self._execute('''INSERT OR REPLACE INTO checkpoints (category, start_page, max_pages, shard, last_page,
+                                                             finished, started_at, updated_at)
+                         VALUES (?, ?, ?, ?, NULL, 0, ?, ?)''', (category, start_page, max_pages, shard, now, now))
+
+    def advance_checkpoint(self, category, page):
+        """Every item on listing page `page` is queued or done"""
+        self._execute('''UPDATE checkpoints SET last_page = MAX(COALESCE(last_page, 0), ?), updated_at = ?
+                         WHERE category = ?''', (page, time.time(), category))
+
+    def finish_checkpoint(self, category):
+        """The category's listing ran to its end, so there is nothing to resume"""
+        self._execute('UPDATE checkpoints SET finished = 1, updated_at = ? WHERE category = ?', (time.time(), category))
+
+    def unfinished_items(self, category, first_page, last_page, since=None):
+        """Links ({url, title, id, page}) listed on pages first_page..last_page that are not done, in listing order
+
+        With `since`, items finished before that time count as unfinished too (a refresh run redoes them).
+        """
+        sql = '''SELECT id, title, url, page FROM items
+                 WHERE category = ? AND page BETWEEN ? AND ? AND (state != 'done' '''
+        params = [category, first_page, last_page]
+        if since is not None:
+            sql += ' OR updated_at < ?'
+            params.append(since)
+        sql += ') ORDER BY page, listed_at, rowid'
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [{'id': item_id, 'title': title, 'url': url, 'page': page} for item_id, title, url, page in rows]
+
+    def done_items(self):
+        """Every finished item as a dict with its folder and {name: (sha256, size)} files"""
+        with self._lock:
+            items = self._db.execute('''SELECT id, category, title, url, folder FROM items
+                                        WHERE state = 'done' ORDER BY id''').fetchall()
+            files = self._db.execute('''SELECT f.item_id, f.name, f.sha256, f.size FROM files f
+                                        JOIN items i ON i.id = f.item_id WHERE i.state = 'done' ''').fetchall()
+        by_item = {}
+        for item_id, name, sha256, size in files:
+            by_item.setdefault(item_id, {})[name] = (sha256, size)
+        return [{'id': item_id, 'category': category, 'title': title, 'url': url, 'folder': folder,
+                 'files': by_item.get(item_id, {})}
+                for item_id, category, title, url, folder in items]
+
+    def dedup_report(self, top=10):
+        """How much identical content is shared between item folders, with the most wasteful duplicates"""
+        with self._lock:
+            files, logical = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files').fetchone()
+            unique, physical = self._db.execute('''SELECT COUNT(*), COALESCE(SUM(size), 0)
+                                                   FROM (SELECT MAX(size) AS size FROM files GROUP BY sha256)''').fetchone()
+            duplicates = self._db.execute('''SELECT sha256, MAX(size), COUNT(*), COUNT(DISTINCT item_id), MIN(name)
+                                             FROM files GROUP BY sha256 HAVING COUNT(*) > 1
+                                             ORDER BY (COUNT(*) - 1) * MAX(size) DESC LIMIT ?''', (top,)).fetchall()
+        return {
+            'files': files,
+            'unique_files': unique,
+            'logical_bytes': logical,
+            'unique_bytes': physical,
+            'saved_bytes': logical - physical,
+            'top_duplicates': [{'sha256': sha256, 'size': size, 'copies': copies, 'items': items, 'name': name}
+                               for sha256, size, copies, items, name in duplicates],
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,342 @@
+import os
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .ratelimit import THROTTLE_STATUSES
+
+# Request latency buckets in seconds: a fast page, a slow ZIP, a server that is struggling
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Parse and extraction time per page in seconds
+PARSE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# What a request fetched, in crawl order
+REQUEST_KINDS = ('listing', 'detail', 'zip', 'source')
+
+# Why bytes did not have to be received: smaller on the wire, answered by a 304, or skipped for their size
+SAVING_REASONS = ('compression', 'not_modified', 'skipped')
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense; not thread-safe on its own"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound, observations <= bound) pairs, ending with ('+Inf', count)"""
+        total = 0
+        pairs = []
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (None without observations)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+        return '+Inf'
+
+
+def _series(name, labels):
+    """name{label="value",...} as Prometheus writes a series"""
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class CrawlMetrics:
+    """Counters, histograms and gauges describing a crawl, readable while it runs
+
+    Request latency, bytes and status codes per request kind (listing, detail, zip, source), time spent
+    sleeping for the rate limiter versus requesting and parsing, parse time per page and queue depths.
+    Rendered as Prometheus text (MetricsServer) or a JSON snapshot (MetricsDumper).
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.latency = {kind: Histogram(LATENCY_BUCKETS) for kind in REQUEST_KINDS}
+        self.parse_time = {kind: Histogram(PARSE_BUCKETS) for kind in ('listing', 'detail')}
+        self.bytes = {kind: 0 for kind in REQUEST_KINDS}
+        self.statuses = {}  # (kind, status) -> responses
+        self.errors = {kind: 0 for kind in REQUEST_KINDS}  # Requests that got no response at all
+        self.retries = {}  # (kind, error class) -> requests retried
+        self.bytes_saved = {reason: 0 for reason in SAVING_REASONS}
+        self.time_spent = {'sleep': 0.0, 'request': 0.0, 'parse': 0.0}
+        self.gauges = {}  # (name, ((label, value), ...)) -> function returning the current value
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def observe_request(self, kind, seconds, status, size=0):
+        """One response: latency to its headers (or whole body when not streamed), status and bytes on the wire"""
+        with self._lock:
+            self.latency[kind].observe(seconds)
+            self.statuses[(kind, status)] = self.statuses.get((kind, status), 0) + 1
+            self.bytes[kind] += size
+            self.time_spent['request'] += seconds
+        self._add_io(seconds)
+
+    def observe_error(self, kind, seconds):
+        with self._lock:
+            self.errors[kind] += 1
+            self.time_spent['request'] += seconds
+        self._add_io(seconds)
+
+    def observe_retry(self, kind, error_class):
+        """A request about to be retried after a throttle, server error, timeout, connection error or cut-off body"""
+        with self._lock:
+            self.retries[(kind, error_class)] = self.retries.get((kind, error_class), 0) + 1
+
+    def add_bytes(self, kind, size):
+        """Body bytes read after the response was recorded (streamed downloads)"""
+        with self._lock:
+            self.bytes[kind] += size
+
+    def add_sleep(self, seconds):
+        """Time a worker waited for the rate limiter"""
+        with self._lock:
+            self.time_spent['sleep'] += seconds
+        self._add_io(seconds)
+
+    def observe_parse(self, kind, seconds):
+        """Time one page spent in parsing and extraction, network and rate-limit waits excluded"""
+        with self._lock:
+            self.parse_time[kind].observe(seconds)
+            self.time_spent['parse'] += seconds
+
+    def _add_io(self, seconds):
+        self._local.io = getattr(self._local, 'io', 0.0) + seconds
+
+    def io_time(self):
+        """Seconds this thread has spent waiting on requests and the rate limiter so far
+
+        Subtracting two readings around a detail stage leaves the time it spent parsing and extracting.
+        """
+        return getattr(self._local, 'io', 0.0)
+
+    def add_saved(self, reason, size):
+        """Bytes that did not have to be received: compressed away, answered by a 304, or in a skipped asset"""
+        with self._lock:
+            self.bytes_saved[reason] += size
+
+    def set_gauge(self, name, function, **labels):
+        """Report function() as gauge `name` with the given labels whenever metrics are read"""
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = function
+
+    def remove_gauge(self, name, **labels):
+        with self._lock:
+            self.gauges.pop((name, tuple(sorted(labels.items()))), None)
+
+    def _gauge_values(self):
+        values = {}
+        for key, function in list(self.gauges.items()):
+            try:
+                values[key] = function()
+            except Exception:
+                continue
+        return values
+
+    def snapshot(self):
+        """Everything as a JSON-serialisable dict, with the derived rates precomputed"""
+        with self._lock:
+            responses = sum(self.statuses.values())
+            throttled = sum(count for (_, status), count in self.statuses.items() if status in THROTTLE_STATUSES)
+            elapsed = max(time.time() - self.started, 1e-6)
+            snapshot = {
+                'timestamp': time.time(),
+                'elapsed_seconds': elapsed,
+                'responses': responses,
+                'responses_per_minute': responses / elapsed * 60,
+                'throttled_rate': throttled / responses if responses else 0.0,
+                'status_counts': {f"{kind} {status}": count for (kind, status), count in sorted(self.statuses.items())},
+                'errors': dict(self.errors),
+                'retries': {f"{kind} {error_class}": count for (kind, error_class), count in sorted(self.retries.items())},
+                'bytes': dict(self.bytes),
+                'bytes_saved': dict(self.bytes_saved),
+                'time_seconds': dict(self.time_spent),
+                'latency_seconds': {kind: self._summary(histogram) for kind, histogram in self.latency.items()},
+                'parse_seconds': {kind: self._summary(histogram) for kind, histogram in self.parse_time.items()},
+            }
+        snapshot['gauges'] = {_series(name, labels): value for (name, labels), value in self._gauge_values().items()}
+        return snapshot
+
+    def _summary(self, histogram):
+        return {
+            'count': histogram.count,
+            'mean': histogram.sum / histogram.count if histogram.count else None,
+            'p50': histogram.quantile(0.5),
+            'p95': histogram.quantile(0.95),
+            'p99': histogram.quantile(0.99),
+        }
+
+    def prometheus(self):
+        """The metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram_lines(name, label, histograms):
+            for value, histogram in histograms.items():
+                for bound, total in histogram.cumulative():
+                    lines.append(f'{name}_bucket{{{label}="{value}",le="{bound}"}} {total}')
+                lines.append(f'{name}_sum{{{label}="{value}"}} {histogram.sum}')
+                lines.append(f'{name}_count{{{label}="{value}"}} {histogram.count}')
+
+        with self._lock:
+            header('mql5_request_duration_seconds', 'histogram', 'Request latency by request kind')
+            histogram_lines('mql5_request_duration_seconds', 'kind', self.latency)
+            header('mql5_responses_total', 'counter', 'Responses by request kind and status code')
+            for (kind, status), count in sorted(self.statuses.items()):
+                lines.append(f'mql5_responses_total{{kind="{kind}",status="{status}"}} {count}')
+            header('mql5_request_errors_total', 'counter', 'Requests that failed without a response')
+            for kind, count in self.errors.items():
+                lines.append(f'mql5_request_errors_total{{kind="{kind}"}} {count}')
+            header('mql5_retries_total', 'counter', 'Requests retried by request kind and error class')
+            for (kind, error_class), count in sorted(self.retries.items()):
+                lines.append(f'mql5_retries_total{{kind="{kind}",reason="{error_class}"}} {count}')
+            header('mql5_response_bytes_total', 'counter', 'Bytes received by request kind')
+            for kind, size in self.bytes.items():
+                lines.append(f'mql5_response_bytes_total{{kind="{kind}"}} {size}')
+            header('mql5_bytes_saved_total', 'counter', 'Bytes not received thanks to compression, 304s and skipped assets')
+            for reason, size in self.bytes_saved.items():
+                lines.append(f'mql5_bytes_saved_total{{reason="{reason}"}} {size}')
+            header('mql5_time_seconds_total', 'counter', 'Worker time spent sleeping for the rate limiter, requesting and parsing')
+            for activity, seconds in self.time_spent.items():
+                lines.append(f'mql5_time_seconds_total{{activity="{activity}"}} {seconds}')
+            header('mql5_parse_duration_seconds', 'histogram', 'Parse and extraction time per page')
+            histogram_lines('mql5_parse_duration_seconds', 'kind', self.parse_time)
+
+        gauges = self._gauge_values()
+        for name in sorted({name for name, _ in gauges}):
+            header(f"mql5_{name}", 'gauge', name.replace('_', ' ').capitalize())
+            for (gauge_name, labels), value in sorted(gauges.items()):
+                if gauge_name == name:
+                    lines.append(f"mql5_{_series(name, labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """One line for the end of a crawl"""
+        snapshot = self.snapshot()
+        times = snapshot['time_seconds']
+        return (f"Metrics: {snapshot['responses']} responses ({snapshot['throttled_rate']:.1%} throttled by 429/503), "
+                f"{sum(snapshot['retries'].values())} retries, "
+                f"{sum(snapshot['bytes'].values()) / 1024 / 1024:.1f} MB received, worker time "
+                f"{times['sleep']:.0f}s sleeping / {times['request']:.0f}s requesting / {times['parse']:.0f}s parsing")
+
+    def bandwidth_report(self):
+        """One line on the bytes received and the bytes compression, 304s and skipped assets saved"""
+        with self._lock:
+            received = sum(self.bytes.values())
+            saved = dict(self.bytes_saved)
+        mb = 1024 * 1024
+        total_saved = sum(saved.values())
+        share = total_saved / (received + total_saved) if received + total_saved else 0.0
+        return (f"Bandwidth: {received / mb:.1f} MB received, {total_saved / mb:.1f} MB saved ({share:.0%}): "
+                f"{saved['compression'] / mb:.1f} MB by compression, "
+                f"{saved['not_modified'] / mb:.1f} MB by not-modified responses, "
+                f"{saved['skipped'] / mb:.1f} MB by skipping oversized assets")
+
+
+class MetricsServer:
+    """Serve /metrics (Prometheus text) and /metrics.json from a background thread"""
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        self.metrics = metrics
+        metrics_ref = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path == '/metrics':
+                    body = metrics_ref.prometheus().encode()
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif path == '/metrics.json':
+                    body = json.dumps(metrics_ref.snapshot(), indent=2).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class MetricsDumper:
+    """Write a JSON snapshot of the metrics to a file every `interval` seconds (and once more on stop)"""
+
+    def __init__(self, metrics, path, interval=30.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.metrics.snapshot(), f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not write metrics to {self.path}: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self.dump()
@@ -0,0 +1,156 @@
+import os
+import signal
+import threading
+import contextlib
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from .categories import load_scraper
+from .parsing import HTMLDocument
+
+# Pages waiting for a batch are sent anyway after this many seconds
+BATCH_LINGER = 0.01
+
+# Per worker process: the parser backend and one extraction-only scraper per category
+_worker = {}
+
+
+class PageEngine:
+    """The part of CrawlEngine a scraper's extraction methods touch, for use in worker processes
+
+    It has no session, budget or manifest: a scraper built on it can parse and extract but never fetch.
+    """
+    session = None
+    download_assets = None
+
+    def __init__(self, base_url, parser):
+        self.base_url = base_url
+        self.parser = parser
+
+    def parse(self, content):
+        return HTMLDocument(content, self.parser)
+
+
+def _start_method():
+    """forkserver where the platform has it, else spawn; never fork"""
+    # The pool is started from a process already running threads (HTTP/2 loop, timers, heartbeats):
+    # a forked child would inherit whatever locks those threads held at that moment
+    return 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def _init_worker(base_url, parser):
+    # Ctrl+C is handled by the crawling process, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker['engine'] = PageEngine(base_url, parser)
+    _worker['scrapers'] = {}
+
+
+def _scraper(category):
+    scrapers = _worker['scrapers']
+    if category not in scrapers:
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            scrapers[category] = load_scraper(category, _worker['engine'])
+    return scrapers[category]
+
+
+def extract_batch(pages):
+    """Worker side: parse and extract a batch of (category, content) pages
+
+    Returns one (record, None) or (None, exception) per page, so one bad page does not fail its batch.
+    """
+    results = []
+    for category, content in pages:
+        try:
+            adapter = _scraper(category).adapter
+            results.append((adapter.extract(_worker['engine'].parse(content)), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+
+class ExtractionPool:
+    """Parse and extract detail pages in worker processes, off the crawl's threads and their shared GIL
+
+    Detail workers hand over the raw page bytes and block for the plain record their category's
+    extract() returns. Pages arriving together are sent to a process as one batch of up to
+    `batch_size`, so the per-task pickling and IPC cost is paid once per batch; a page never waits
+    more than BATCH_LINGER for others to join it.
+    """
+
+    def __init__(self, base_url, parser, workers=None, batch_size=8):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = max(1, batch_size)
+        self.batches = 0
+        self.pages = 0
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(base_url, parser),
+                                             mp_context=multiprocessing.get_context(_start_method()))
+        self._pending = []  # (category, content, Future) not yet sent
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def extract(self, category, content):
+        """The record for one page; raises whatever extraction raised in the worker"""
+        return self.submit(category, content).result()
+
+    def submit(self, category, content):
+        future = Future()
+        with self._lock:
+            self._pending.append((category, content, future))
+            batch = self._take() if len(self._pending) >= self.batch_size else None
+            if batch is None and self._timer is None:
+                self._timer = threading.Timer(BATCH_LINGER, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._dispatch(batch)
+        return future
+
+    def _take(self):
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush(self):
+        with self._lock:
+            self._timer = None
+            batch, self._pending = self._pending, []
+        if batch:
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        with self._lock:
+            self.batches += 1
+            self.pages += len(batch)
+        try:
+            task = self._executor.submit(extract_batch, [(category, content) for category, content, _ in batch])
+        except RuntimeError as e:
+            # The pool was shut down under us (the crawl is stopping)
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        def resolve(task):
+            try:
+                results = task.result()
+            except Exception as e:
+                # A worker died (or the batch could not be pickled): every page in it fails
+                for _, _, future in batch:
+                    future.set_exception(e)
+                return
+            for (_, _, future), (record, error) in zip(batch, results):
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(record)
+
+        task.add_done_callback(resolve)
+
+    def shutdown(self):
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._dispatch(batch)
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,184 @@
+import importlib.util
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Parser backends, fastest first. 'auto' picks the first one that is installed.
+BACKENDS = ('selectolax', 'lxml', 'html.parser')
+
+
+def available_backends():
+    """Backends whose parser library is installed"""
+    return [name for name in BACKENDS
+            if name == 'html.parser' or importlib.util.find_spec(name) is not None]
+
+
+def resolve_backend(backend='auto'):
+    """Turn 'auto' (or None) into the fastest installed backend and reject ones that are missing"""
+    installed = available_backends()
+    if backend in (None, 'auto'):
+        return installed[0]
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown parser backend {backend!r}, choose from auto, {', '.join(BACKENDS)}")
+    if backend not in installed:
+        raise ValueError(f"Parser backend {backend!r} is not installed (pip install {backend})")
+    return backend
+
+
+def parse_links(content, href_pattern, backend='html.parser'):
+    """(href, text) of every <a> whose href matches, without building a tree for the rest of the page
+
+    The listing-page fast path: BeautifulSoup backends only build the matching anchors (SoupStrainer)
+    and selectolax only visits anchors. Gives the same answer as HTMLDocument(content, backend).links().
+    """
+    if backend == 'selectolax':
+        return HTMLDocument(content, backend).links(href_pattern)
+
+    features = 'html.parser' if backend == 'html.parser' else 'lxml'
+    soup = BeautifulSoup(content, features, parse_only=SoupStrainer('a', href=href_pattern))
+    return [(link.get('href'), link.get_text(strip=True)) for link in soup.find_all('a', href=href_pattern)]
+
+
+def _own_string(node):
+    """BeautifulSoup's .string for a selectolax node"""
+    while True:
+        child = node.child
+        if child is None or child.next is not None:
+            return None
+        if child.tag == '-text':
+            return child.text_content
+        if child.tag.startswith(('_', '!', '-')):
+            return None
+        node = child
+
+
+class HTMLDocument:
+    """A parsed page that gives the same answers whichever parser backend built it
+
+    Link, text and meta lookups run on the backend's own tree. Code that needs the full BeautifulSoup API uses
+    `soup`, which is built on first use with lxml when the backend is lxml or selectolax.
+    """
+
+    def __init__(self, content, backend='html.parser'):
+        self.content = content
+        self.backend = backend
+        self._soup = None
+        self._tree = None
+        self._text = None
+        if backend == 'selectolax':
+            from selectolax.lexbor import LexborHTMLParser
+            self._tree = LexborHTMLParser(content)
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            if self.backend == 'html.parser':
+                features = 'html.parser'
+            else:
+                features = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+            self._soup = BeautifulSoup(self.content, features)
+        return self._soup
+
+    def links(self, href_pattern):
+        """(href, text) of every <a> whose href matches a compiled regex, in document order
+
+        The text is that of get_text(strip=True): each text node stripped, then joined.
+        """
+        if self._tree is None or self._soup is not None:
+            # The soup is needed anyway (or already built), so searching it costs no second parse
+            return [(link.get('href'), link.get_text(strip=True))
+                    for link in self.soup.find_all('a', href=href_pattern)]
+
+        matches = []
+        for link in self._tree.css('a[href]'):
+            href = link.attributes.get('href')
+            if href and href_pattern.search(href):
+                matches.append((href, link.text(deep=True, separator='', strip=True)))
+        return matches
+
+    def texts(self, tags, class_pattern=None):
+        """get_text(strip=True) of every element with one of the tag names, in document order
+
+        With class_pattern, only elements whose class attribute (or one of its classes) matches the regex.
+        """
+        if self._tree is None or self._soup is not None:
+            if class_pattern is None:
+                elements = self.soup.find_all(tags)
+            else:
+                elements = self.soup.find_all(tags, class_=class_pattern)
+            return [element.get_text(strip=True) for element in elements]
+
+        texts = []
+        for element in self._tree.css(', '.join(tags)):
+            if class_pattern is not None:
+                classes = element.attributes.get('class')
+                if classes is None:
+                    continue
+                if not (class_pattern.search(classes) or any(class_pattern.search(c) for c in classes.split())):
+                    continue
+            texts.append(element.text(deep=True, separator='', strip=True))
+        return texts
+
+    def texts_in(self, tag, class_name, inner_tag):
+        """get_text(strip=True) of every inner_tag inside the first <tag class="class_name">
+
+        None when the page has no such element, [] when it has one without matching children.
+        """
+        if self._tree is None or self._soup is not None:
+            container = self.soup.find(tag, class_=class_name)
+            if not container:
+                return None
+            return [element.get_text(strip=True) for element in container.find_all(inner_tag)]
+
+        container = self._tree.css_first(f"{tag}.{class_name}")
+        if container is None:
+            return None
+        return [element.text(deep=True, separator='', strip=True) for element in container.css(inner_tag)]
+
+    def sibling_texts(self, tags, string_pattern):
+        """For each element with one of the tag names whose own string matches the regex, the
+        get_text(strip=True) of its next sibling element (None when there is none), in document order
+
+        "Own string" is BeautifulSoup's .string: the text of an element whose only child is a string,
+        or whose only child element has one.
+        """
+        if self._tree is None or self._soup is not None:
+            texts = []
+            for element in self.soup.find_all(tags, string=string_pattern):
+                sibling = element.find_next_sibling()
+                texts.append(sibling.get_text(strip=True) if sibling else None)
+            return texts
+
+        texts = []
+        for element in self._tree.css(', '.join(tags)):
+            string = _own_string(element)
+            if string is None or not string_pattern.search(string):
+                continue
+            sibling = element.next
+            while sibling is not None and sibling.tag.startswith(('-', '_', '!')):
+                sibling = sibling.next
+            texts.append(sibling.text(deep=True, separator='', strip=True) if sibling is not None else None)
+        return texts
+
+    def text(self):
+        """All text on the page, as soup.get_text() returns it (script and style contents excluded)
+
+        Computed once per page, however many extractors ask for it.
+        """
+        if self._text is None:
+            if self._tree is None or self._soup is not None:
+                self._text = self.soup.get_text()
+            else:
+                root = self._tree.root
+                root.strip_tags(['script', 'style'])
+                self._text = root.text(deep=True, separator='', strip=False)
+        return self._text
+
+    def meta(self, name):
+        """Content of <meta name="..."> or None"""
+        if self._tree is None or self._soup is not None:
+            tag = self.soup.find('meta', attrs={'name': name})
+            return tag.get('content') if tag else None
+        for tag in self._tree.css('meta[name]'):
+            if tag.attributes.get('name') == name:
+                return tag.attributes.get('content')
+        return None
@@ -0,0 +1,203 @@
+"""Find how many listing pages each category has, and plan (and shard) the crawl of all of them
+
+Usage:
+    python -m mql5_codebase.planner                          # last listing page of every category
+    python -m mql5_codebase.planner experts --shards 4       # and how the pages split over 4 shards
+    python -m mql5_codebase.planner --save plan.json
+    python -m mql5_codebase --plan plan.json --shard 1/4    # crawl one shard of it (one per machine)
+
+The last page is read from the listing's pagination links where there are any, and otherwise found
+by probing: doubling the page number until a page is empty, then a binary search between the last
+full and the first empty page. A paginator that only shows the pages near the current one speeds the
+probing up. Either way it costs a handful of listing requests instead of walking every page.
+"""
+import re
+import sys
+import json
+import argparse
+
+from .categories import CATEGORIES, load_scraper
+from .parsing import parse_links
+
+# Probing never looks past this page (the largest codebase category has a few hundred pages)
+MAX_LISTING_PAGES = 4096
+
+
+def pagination_pattern(adapter):
+    """Links from a listing page to other pages of the same listing: <listing path>/page<N>"""
+    return re.compile(re.escape(adapter.listing_path) + r'/page(\d+)/?$')
+
+
+def linked_pages(content, adapter, parser):
+    """Page numbers a listing page's paginator links to"""
+    pattern = pagination_pattern(adapter)
+    return {int(pattern.search(href).group(1)) for href, _ in parse_links(content, pattern, parser)}
+
+
+class ListingPlanner:
+    """Find each category's last listing page with as few listing requests as possible
+
+    Every probe is an ordinary listing request through the engine (rate limiter, budget, cache).
+    """
+
+    def __init__(self, engine, max_page=MAX_LISTING_PAGES):
+        self.engine = engine
+        self.max_page = max_page
+        self.probes = {}  # category -> listing pages requested
+
+    def probe(self, adapter, page):
+        """(items on the page, pages its paginator links to); None if the page could not be fetched
+
+        A page past the end of the listing has no items, whether the site answers 200 or 404.
+        """
+        self.probes[adapter.name] = self.probes.get(adapter.name, 0) + 1
+        response = self.engine.safe_request(adapter.listing_url(self.engine.base_url, page), is_page_request=True)
+        if response is None:
+            return None
+        if response.status_code == 404:
+            return 0, set()
+        if response.status_code != 200:
+            return None
+        items = len(self.engine.parse_listing(adapter, response.content))
+        return items, linked_pages(response.content, adapter, self.engine.parser)
+
+    def last_page(self, adapter):
+        """(last page with items, how it was found); (0, ...) for an empty listing, (None, ...) if it failed
+
+        Each probe jumps to the furthest page a paginator has shown so far, or to twice the last page
+        known to have items, whichever is further. A page with items whose paginator links to nothing
+        beyond it is the last page; a page without items bounds a binary search.
+        """
+        result = self.probe(adapter, 1)
+        if result is None:
+            return None, 'failed'
+        items, linked = result
+        if not items:
+            return 0, 'empty'
+
+        full, empty = 1, None
+        method = 'pagination' if linked else 'binary search'
+        while empty is None:
+            if linked and max(linked) <= full:
+                return full, method
+            page = min(max(max(linked, default=0), 2 * full), self.max_page)
+            if page <= full:
+                return full, f"{method} (stopped at page {self.max_page})"
+            result = self.probe(adapter, page)
+            if result is None:
+                return None, 'failed'
+            items, linked = result
+            if items:
+                full = page
+            else:
+                empty = page
+
+        last = self._bisect(adapter, full, empty)
+        if method == 'pagination':
+            # The paginator promised more pages than there are (items were removed since)
+            method = 'pagination + binary search'
+        return last, method if last is not None else 'failed'
+
+    def _bisect(self, adapter, full, empty):
+        """Last page with items, given that page `full` has items and page `empty` has none"""
+        while empty - full > 1:
+            middle = (full + empty) // 2
+            result = self.probe(adapter, middle)
+            if result is None:
+                return None
+            if result[0]:
+                full = middle
+            else:
+                empty = middle
+        return full
+
+    def plan(self, adapters):
+        """{category: (last page, method)} for every adapter"""
+        plan = {}
+        for adapter in adapters:
+            last, method = self.last_page(adapter)
+            plan[adapter.name] = (last, method)
+            if last is None:
+                print(f"Could not find the last {adapter.label} page")
+            else:
+                print(f"{adapter.label}: {last} listing pages (found by {method}, "
+                      f"{self.probes.get(adapter.name, 0)} requests)")
+        return plan
+
+
+def listing_pages(last_pages, start_page=1, shard=None):
+    """(category, page) for every listing page of every category, interleaved by page number
+
+    Page 1 of every category comes first, then page 2, and so on, so the newest items of each category
+    are near the front. With shard=(index, count), only that shard's pages (see in_shard).
+    """
+    longest = max(last_pages.values(), default=0)
+    return [(category, page) for page in range(start_page, longest + 1)
+            for category, last in last_pages.items()
+            if page <= last and (shard is None or in_shard(page, shard, start_page))]
+
+
+def in_shard(page, shard, start_page=1):
+    """Whether shard (index, count), index 0-based, lists this page: every count-th page from start_page
+
+    Consecutive pages go to different shards, so every shard gets some of the newest items and the
+    shards stay even whatever the page counts are.
+    """
+    index, count = shard
+    return (page - start_page) % count == index
+
+
+def parse_shard(value):
+    """'2/4' (the second of four shards, 1-based as people count them) -> (1, 4)"""
+    match = re.fullmatch(r'(\d+)/(\d+)', value)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"expected I/N with 1 <= I <= N, got {value!r}")
+    return int(match.group(1)) - 1, int(match.group(2))
+
+
+def format_shard(shard):
+    """(1, 4) -> '2/4'"""
+    index, count = shard
+    return f"{index + 1}/{count}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find the last listing page of each category and plan the crawl')
+    parser.add_argument('categories', nargs='*', default=list(CATEGORIES))
+    parser.add_argument('--start-page', type=int, default=1)
+    parser.add_argument('--shards', type=int, default=1, help='Split the listing pages into this many shards')
+    parser.add_argument('--max-rate', type=float, default=1.0)
+    parser.add_argument('--save', metavar='FILE', help='Write the plan (last pages and shards) as JSON')
+    parser.add_argument('--base-url', default='https://www.mql5.com')
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.categories if name not in CATEGORIES]
+    if unknown:
+        parser.error(f"unknown categories: {', '.join(unknown)}")
+
+    from .engine import CrawlEngine  # The engine shards its listing with in_shard() from here
+
+    engine = CrawlEngine(args.base_url, max_rate=args.max_rate, catalog=False, search_index=False)
+    adapters = [load_scraper(name, engine).adapter for name in args.categories]
+    plan = ListingPlanner(engine).plan(adapters)
+    last_pages = {name: last for name, (last, _) in plan.items() if last}
+    shards = [listing_pages(last_pages, args.start_page, (i, args.shards)) for i in range(args.shards)]
+
+    print()
+    print(f"{sum(map(len, shards))} listing pages to crawl, planned with {engine.request_count} requests")
+    if args.shards > 1:
+        for i, pages in enumerate(shards, 1):
+            print(f"  shard {i}/{args.shards}: {len(pages)} pages "
+                  f"(python -m mql5_codebase --plan PLAN --shard {i}/{args.shards})")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'base_url': args.base_url, 'start_page': args.start_page,
+                       'last_pages': {name: last for name, (last, _) in plan.items()},
+                       'methods': {name: method for name, (_, method) in plan.items()},
+                       'shards': [[list(page) for page in pages] for pages in shards]}, f, indent=2)
+    return 0 if all(last is not None for last, _ in plan.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
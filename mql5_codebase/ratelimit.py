@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import threading
+from email.utils import parsedate_to_datetime
+
+# Responses that mean "slow down"
+THROTTLE_STATUSES = (429, 503)
+
+
+def parse_retry_after(value):
+    """Turn a Retry-After header (seconds or HTTP date) into seconds to wait, or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose refill rate follows AIMD: creep up while healthy, cut back on 429/503
+
+    The rate is cut once per throttling episode: the 429s that come back for requests sent before the
+    last cut answer the same congestion, as TCP cuts its window at most once per round trip. The floor
+    and the increase step scale with max_rate, so the rate climbs back in about a hundred responses.
+    """
+
+    def __init__(self, rate=0.3, min_rate=None, max_rate=1.0, burst=1.0, increase=0.01, decrease=0.5,
+                 default_retry_after=30.0, state_path=None):
+        self.max_rate = max_rate  # Requests per second never climbs above this, however healthy the server looks
+        self.min_rate = min_rate if min_rate is not None else max_rate / 20  # ...and never drops below this
+        self.burst = burst  # Tokens that may pile up while idle
+        self.increase = increase * max_rate  # Additive increase (req/s) per healthy response, a share of max_rate
+        self.decrease = decrease  # Multiplicative decrease per throttling episode
+        self.default_retry_after = default_retry_after  # Pause when a 429/503 carries no Retry-After
+        self.state_path = state_path
+        self.rate = min(self.max_rate, max(self.min_rate, rate))
+        self.throttled = 0
+        self._load()
+
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0  # Set from Retry-After; every worker waits it out
+        self._last_cut = float('-inf')  # When the rate was last cut; throttles of requests sent before it are ignored
+        self._last_save = self._updated
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # Threads that find a save due at once take turns
+
+    def _load(self):
+        """Start from the rate learned on the previous run, if there is one"""
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.rate = min(self.max_rate, max(self.min_rate, float(state['rate'])))
+            print(f"Rate limiting: resuming at learned rate {self.rate:.3f} req/s")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not load rate limiter state: {e}")
+
+    def save(self):
+        """Persist the learned rate so the next run starts from it"""
+        if not self.state_path:
+            return
+        with self._save_lock:
+            try:
+                os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+                tmp_path = f"{self.state_path}.{os.getpid()}.tmp"  # Workers sharing a state dir never share it
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'rate': self.rate, 'saved': time.strftime('%Y-%m-%d %H:%M:%S')}, f)
+                os.replace(tmp_path, self.state_path)
+                self._last_save = time.monotonic()
+            except OSError as e:
+                print(f"Could not save rate limiter state: {e}")
+
+    def _refill(self, now):
+        # Nothing accrues while a Retry-After pause is in force
+        accrual_start = max(self._updated, self._paused_until)
+        if now > accrual_start:
+            self.tokens = min(self.burst, self.tokens + (now - accrual_start) * self.rate)
+        self._updated = now
+
+    def reserve(self, cost=1.0):
+        """Take `cost` tokens now and return how long the caller must wait before sending"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Tokens may go negative: later callers queue up behind the debt, after any pause
+            self.tokens -= cost
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return wait + max(0.0, self._paused_until - now)
+
+    def acquire(self, cost=1.0):
+        """Block until `cost` tokens are available; returns the seconds waited"""
+        wait = self.reserve(cost)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def on_response(self, status_code, retry_after=None, sent_at=None):
+        """Adjust the rate from a response: additive increase when healthy, multiplicative decrease when throttled
+
+        sent_at is the time.monotonic() the request was sent at; a throttled request sent before the last
+        cut still pauses for Retry-After but does not cut the rate again. Without it every throttle cuts.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if status_code in THROTTLE_STATUSES:
+                self._refill(now)
+                self.throttled += 1
+                cut = sent_at is None or sent_at >= self._last_cut
+                if cut:
+                    self.rate = max(self.min_rate, self.rate * self.decrease)
+                    self._last_cut = now
+                pause = parse_retry_after(retry_after)
+                if pause is None:
+                    pause = self.default_retry_after
+                self._paused_until = max(self._paused_until, now + pause)
+                self.tokens = min(self.tokens, 0.0)  # No burst straight after being throttled
+                print(f"Rate limiting: throttled ({status_code}), pausing {pause:.0f}s and "
+                      f"{'slowing to' if cut else 'already slowed to'} {self.rate:.3f} req/s")
+            elif status_code < 500:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+            save_due = now - self._last_save > 60
+        if save_due:
+            self.save()
+        return self.rate
+
+    def pause_remaining(self):
+        """Seconds left on the current Retry-After pause"""
+        return max(0.0, self._paused_until - time.monotonic())
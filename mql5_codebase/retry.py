@@ -0,0 +1,199 @@
+import time
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+import requests
+
+from .ratelimit import THROTTLE_STATUSES
+
+# Statuses a request is retried on besides 429 and 503 (throttling): the server, or a proxy in front of it, is struggling
+SERVER_ERROR_STATUSES = (500, 502, 504)
+
+
+@dataclass(frozen=True)
+class Backoff:
+    """How often and how patiently one class of error is retried"""
+    retries: int  # Retries after the first attempt
+    base: float  # Seconds; the n-th retry waits up to base * 2**n...
+    cap: float  # ...but never more than this
+
+
+# Error classes and their backoff. A 429 or 503 also pauses the rate limiter for Retry-After; the
+# jittered backoff on top of that keeps every worker from retrying at the same instant.
+RETRY_BACKOFFS = {
+    'throttled': Backoff(retries=4, base=2.0, cap=120.0),  # 429, 503
+    'server_error': Backoff(retries=4, base=2.0, cap=60.0),  # 500, 502, 504
+    'timeout': Backoff(retries=3, base=5.0, cap=60.0),  # No response, or the body stalled, in time
+    'connection': Backoff(retries=4, base=1.0, cap=30.0),  # Refused, reset or DNS failure
+    'truncated': Backoff(retries=3, base=0.5, cap=10.0),  # The body was cut off before Content-Length
+}
+
+# Error classes that count as failures for the circuit breaker (throttling is the rate limiter's job)
+FAILURE_CLASSES = ('server_error', 'timeout', 'connection', 'truncated')
+
+
+def classify_status(status_code):
+    """Error class of a response status, or None if it is not worth retrying"""
+    if status_code in THROTTLE_STATUSES:
+        return 'throttled'
+    if status_code in SERVER_ERROR_STATUSES:
+        return 'server_error'
+    return None
+
+
+def classify_exception(error):
+    """Error class of a requests exception, or None if it is not worth retrying (bad URL, redirect loop)"""
+    if isinstance(error, (requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError)):
+        return 'truncated'
+    if isinstance(error, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return 'connection'
+    return None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, configured per error class"""
+
+    def __init__(self, backoffs=None, seed=None):
+        self.backoffs = dict(RETRY_BACKOFFS, **(backoffs or {}))
+        self._random = random.Random(seed)
+
+    @classmethod
+    def with_retries(cls, retries, **kwargs):
+        """The default policy with the same number of retries for every error class (0: never retry)"""
+        return cls({name: Backoff(retries, backoff.base, backoff.cap) for name, backoff in RETRY_BACKOFFS.items()},
+                   **kwargs)
+
+    def delay(self, error_class, attempt):
+        """Seconds to wait before retry number attempt + 1 (attempt 0 is the first retry), or None to give up"""
+        backoff = self.backoffs.get(error_class)
+        if backoff is None or attempt >= backoff.retries:
+            return None
+        return self._random.uniform(0, min(backoff.cap, backoff.base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Pause every request when too many recent ones failed, then let a single probe test the server
+
+    Closed: requests flow and their outcomes fill a sliding window. When at least `min_requests` are in
+    it and `failure_rate` of them failed, the circuit opens and every caller of wait() blocks for the
+    cooldown. After it, one caller is let through as a probe (half-open): success closes the circuit,
+    failure opens it again with twice the cooldown, up to max_cooldown. The probe carries a number from
+    wait() to record(), so a request sent before the circuit opened cannot answer for it.
+    """
+
+    def __init__(self, failure_rate=0.5, window=20, min_requests=10, cooldown=30.0, max_cooldown=600.0):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.trips = 0
+        self._outcomes = deque(maxlen=window)  # True for a success
+        self._open_until = 0.0
+        self._probe_started = None
+        self._probe = 0  # Number of the current probe; outcomes without it are ignored while half-open
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.state != 'closed'
+
+    def wait(self):
+        """Block while the circuit is open; returns (seconds waited, probe number or None) for record()"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if self.state == 'closed':
+                    return waited, None
+                if self.state == 'open' and now >= self._open_until:
+                    self.state = 'half_open'
+                    self._probe_started = None
+                if self.state == 'half_open' and (self._probe_started is None
+                                                  or now - self._probe_started > self.cooldown):
+                    # This caller is the probe (or replaces one that never reported back)
+                    self._probe_started = now
+                    self._probe += 1
+                    return waited, self._probe
+                pause = max(0.1, min(1.0, self._open_until - now))
+            time.sleep(pause)
+            waited += pause
+
+    def record(self, success, probe=None):
+        """The outcome of a request that wait() let through, with the probe number wait() gave it"""
+        with self._lock:
+            if self.state == 'half_open':
+                if probe != self._probe:
+                    return  # Sent before the circuit opened, or a probe that was given up on
+                if success:
+                    print("Circuit breaker: probe request succeeded, resuming")
+                    self.state = 'closed'
+                    self.cooldown = self.base_cooldown
+                    self._outcomes.clear()
+                else:
+                    self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                    self._open("probe request failed")
+                return
+            if self.state == 'open':
+                return  # A request sent before the circuit opened
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_requests and failures >= self.failure_rate * len(self._outcomes):
+                self._open(f"{failures} of the last {len(self._outcomes)} requests failed")
+
+    def _open(self, reason):
+        self.state = 'open'
+        self.trips += 1
+        self._open_until = time.monotonic() + self.cooldown
+        print(f"Circuit breaker: {reason}, pausing all requests for {self.cooldown:.0f}s")
+
+
+class LatencyTimeouts:
+    """Request timeouts from the latencies seen so far for each kind of request
+
+    The read timeout (for the response headers, and for any gap between body chunks) is `multiplier`
+    times the recent 99th percentile latency of that kind of request, within [minimum, maximum]; until
+    enough requests have been seen it is `default`. A download also gets a deadline for its whole body
+    from its size: the read timeout plus the time it takes at `min_throughput` bytes per second.
+    """
+
+    def __init__(self, default=30.0, minimum=5.0, maximum=120.0, connect=10.0, multiplier=4.0, percentile=0.99,
+                 window=200, min_samples=20, min_throughput=32 * 1024):
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.connect = connect
+        self.multiplier = multiplier
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_throughput = min_throughput
+        self._window = window
+        self._latencies = {}  # kind -> recent latencies in seconds
+        self._lock = threading.Lock()
+
+    def observe(self, kind, seconds):
+        with self._lock:
+            self._latencies.setdefault(kind, deque(maxlen=self._window)).append(seconds)
+
+    def read_timeout(self, kind):
+        with self._lock:
+            samples = sorted(self._latencies.get(kind, ()))
+        if len(samples) < self.min_samples:
+            return self.default
+        observed = samples[min(len(samples) - 1, int(self.percentile * len(samples)))]
+        return min(self.maximum, max(self.minimum, self.multiplier * observed))
+
+    def timeout(self, kind):
+        """(connect, read) timeout for the next request of this kind, as requests takes it"""
+        return self.connect, self.read_timeout(kind)
+
+    def deadline(self, kind, size):
+        """Seconds the whole body of a `size`-byte response may take; None if the size is unknown"""
+        if not size:
+            return None
+        return self.read_timeout(kind) + size / self.min_throughput
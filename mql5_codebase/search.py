@@ -0,0 +1,71 @@
+"""Full-text search over the mirrored codebase: titles, authors, descriptions and MQL5 source
+
+Usage:
+    python -m mql5_codebase.search "iMA trailing stop"
+    python -m mql5_codebase.search "author:john AND grid" --category experts --limit 5
+    python -m mql5_codebase.search --sync          # index items finished before the index existed
+
+Queries use the SQLite FTS5 syntax (AND, OR, NOT, "phrases", prefix*, column:term); a query that is
+not valid FTS5 syntax is searched as plain words. Results are ranked by BM25, with title matches
+weighted above author, description and source matches.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+from .categories import CATEGORIES
+from .engine import DEFAULT_STATE_DIR
+from .index import SearchIndex, catalog_authors
+from .manifest import CrawlManifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Search the mirrored MQL5 codebase',
+                                     epilog='Queries use SQLite FTS5 syntax: AND, OR, NOT, "a phrase", prefix*, '
+                                            'title:word (columns: title, author, description, source)')
+    parser.add_argument('query', nargs='*', help='Words to search for')
+    parser.add_argument('--category', choices=list(CATEGORIES))
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--sync', action='store_true',
+                        help='Index finished items that are missing or changed, and drop removed ones, first')
+    parser.add_argument('--rebuild', action='store_true', help='Index every finished item again from scratch')
+    parser.add_argument('--state-dir', default=DEFAULT_STATE_DIR)
+    args = parser.parse_args(argv)
+
+    index = SearchIndex(os.path.join(args.state_dir, 'search.sqlite'))
+    if args.rebuild:
+        index.rebuild()
+    if args.sync or args.rebuild:
+        start = time.perf_counter()
+        manifest = CrawlManifest(os.path.join(args.state_dir, 'manifest.sqlite'))
+        indexed, unchanged, removed = index.sync(manifest, catalog_authors(os.path.join(args.state_dir, 'catalog')))
+        if indexed:
+            index.optimize()
+        print(f"Search index: {indexed} items indexed, {unchanged} unchanged, {removed} removed "
+              f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    if not args.query:
+        if not (args.sync or args.rebuild):
+            parser.error('give a query, --sync or --rebuild')
+        return 0
+
+    start = time.perf_counter()
+    results = index.search(' '.join(args.query), args.limit, args.category)
+    elapsed = time.perf_counter() - start
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return 0
+    for rank, result in enumerate(results, 1):
+        print(f"{rank:>3}. [{result['category']}] {result['title']} (ID {result['id']}, score {result['score']:.2f})")
+        print(f"     {result['url']}")
+        print(f"     {result['folder']}")
+        print(f"     {' '.join(result['snippet'].split())}")
+    print(f"{len(results)} results from {index.count()} items in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import signal
+import threading
+import contextlib
+
+# Signals that ask a crawl to stop: Ctrl+C, and what `docker stop` or Kubernetes send a container
+SHUTDOWN_SIGNALS = tuple(getattr(signal, name) for name in ('SIGINT', 'SIGTERM') if hasattr(signal, name))
+
+
+@contextlib.contextmanager
+def drain_on_signal(stop):
+    """Call stop(signal_name) on the first SIGINT/SIGTERM; a second one raises KeyboardInterrupt
+
+    The first signal lets the work in progress finish while nothing new is started; the second
+    stops at once, as Ctrl+C always did. Signal handlers can only be installed from the main thread,
+    so anywhere else this does nothing.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    received = []
+
+    def handler(signum, frame):
+        if received:
+            raise KeyboardInterrupt
+        received.append(signum)
+        stop(signal.Signals(signum).name)
+
+    previous = {signum: signal.signal(signum, handler) for signum in SHUTDOWN_SIGNALS}
+    try:
+        yield
+    finally:
+        for signum, previous_handler in previous.items():
+            signal.signal(signum, previous_handler)